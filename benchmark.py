@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Banc d'essai de performance et de précision des solveurs solaires.
+
+Génère des relevés synthétiques à partir de positions connues réparties sur
+le globe et sur l'année, avec un modèle direct indépendant de la table
+d'éphémérides (série évaluée directement), puis les soumet à chaque solveur.
+Mesure le débit, les percentiles de latence, les itérations et l'erreur de
+position en kilomètres, et écrit le tout en JSON.
+
+Exemple :
+    python3 benchmark.py --samples 5000 --output bench.json
+    python3 benchmark.py --baseline bench.json   # code de sortie 1 si régression
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import ephemeris
+from solar_calculator import SolarGeolocationCalculator, EARTH_RADIUS_KM
+
+SOLVERS = ('calculate_position', 'calculate_positions', 'fit_observations', 'global_search')
+
+
+def forward_sun(latitude, longitude, timestamps):
+    """Élévation et azimut du soleil (degrés) par la série d'éphémérides, sans table"""
+    declination, equation_of_time = ephemeris.solar_position(ephemeris.julian_day(timestamps))
+    days = timestamps.astype('datetime64[D]')
+    utc_hours = (timestamps - days) / np.timedelta64(1, 'h')
+    hour_angle = np.radians(15 * (utc_hours + equation_of_time / 60 - 12) + longitude)
+    lat = np.radians(latitude)
+    dec = np.radians(declination)
+    elevation = np.arcsin(np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(hour_angle))
+    azimuth = np.arctan2(-np.cos(dec) * np.sin(hour_angle),
+                         np.sin(dec) * np.cos(lat) - np.cos(dec) * np.sin(lat) * np.cos(hour_angle))
+    return np.degrees(elevation), np.degrees(azimuth) % 360
+
+
+def generate_observations(samples, seed, min_elevation=10.0, readings=1, spacing_minutes=20,
+                          length_noise=0.0, azimuth_noise=0.0):
+    """Relevés synthétiques (bâton de 1 m) pour des positions et dates aléatoires.
+
+    Retourne les positions vraies et des tableaux (samples, readings) de
+    longueurs d'ombre, d'azimuts et d'horodatages ; seuls les tirages où le
+    soleil reste au-dessus de min_elevation pour tous les relevés sont gardés.
+    """
+    rng = np.random.default_rng(seed)
+    latitudes, longitudes, lengths, azimuths, stamps = [], [], [], [], []
+    kept = 0
+    while kept < samples:
+        count = (samples - kept) * 4
+        latitude = np.degrees(np.arcsin(rng.uniform(-np.sin(np.radians(65)), np.sin(np.radians(65)), count)))
+        longitude = rng.uniform(-180, 180, count)
+        start = (np.datetime64('2000-01-01T00:00', 'ms')
+                 + rng.integers(0, 60 * 365 * 86400, count).astype('timedelta64[s]'))
+        offsets = (np.arange(readings) * spacing_minutes * 60).astype('timedelta64[s]')
+        timestamps = start[:, None] + offsets[None, :]
+
+        elevation, azimuth = forward_sun(latitude[:, None], longitude[:, None], timestamps)
+        visible = np.all(elevation > min_elevation, axis=1)
+        shadow = 1.0 / np.tan(np.radians(elevation[visible]))
+        shadow = shadow + rng.normal(0, length_noise, shadow.shape) if length_noise else shadow
+        shadow_azimuth = (azimuth[visible] - 180) % 360
+        if azimuth_noise:
+            shadow_azimuth = shadow_azimuth + rng.normal(0, azimuth_noise, shadow_azimuth.shape)
+
+        latitudes.append(latitude[visible])
+        longitudes.append(longitude[visible])
+        lengths.append(shadow)
+        azimuths.append(shadow_azimuth)
+        stamps.append(timestamps[visible])
+        kept += int(visible.sum())
+
+    def take(parts):
+        return np.concatenate(parts)[:samples]
+    return take(latitudes), take(longitudes), take(lengths), take(azimuths), take(stamps)
+
+
+def distance_km(latitude, longitude, true_latitude, true_longitude):
+    lat1, lat2 = np.radians(latitude), np.radians(true_latitude)
+    delta = np.radians(longitude - true_longitude)
+    cosine = np.sin(lat1) * np.sin(lat2) + np.cos(lat1) * np.cos(lat2) * np.cos(delta)
+    return EARTH_RADIUS_KM * np.arccos(np.clip(cosine, -1, 1))
+
+
+def summarize(latencies, errors, iterations=None, converged=None, solves=None, elapsed=None):
+    latencies = np.asarray(latencies) * 1000
+    errors = np.asarray(errors)
+    errors = errors[np.isfinite(errors)]
+    summary = {
+        'solves': int(solves if solves is not None else latencies.size),
+        'throughput_per_s': float((solves or latencies.size) / elapsed) if elapsed else None,
+        'latency_ms': {p: float(np.percentile(latencies, q)) for p, q in
+                       (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))},
+        'error_km': {p: float(np.percentile(errors, q)) if errors.size else None for p, q in
+                     (('p50', 50), ('p95', 95), ('max', 100))},
+        'within_1km': float(np.mean(errors < 1)) if errors.size else 0.0,
+    }
+    if iterations is not None:
+        iterations = np.asarray(iterations)
+        summary['iterations'] = {'mean': float(iterations.mean()), 'max': int(iterations.max())}
+    if converged is not None:
+        summary['converged_ratio'] = float(np.mean(converged))
+    return summary
+
+
+def bench_calculate_position(data, args):
+    latitudes, longitudes, lengths, azimuths, stamps = data
+    moments = stamps[:, 0].astype('datetime64[us]').astype(datetime)
+    latencies, errors, iterations, converged = [], [], [], []
+    start = time.perf_counter()
+    for i, moment in enumerate(moments):
+        tick = time.perf_counter()
+        fix = SolarGeolocationCalculator.calculate_position(
+            1.0, lengths[i, 0], azimuths[i, 0], moment.time(), moment.date(), 0.0
+        )
+        latencies.append(time.perf_counter() - tick)
+        errors.append(distance_km(fix['latitude'], fix['longitude'], latitudes[i], longitudes[i]))
+        iterations.append(fix['iterations'])
+        converged.append(fix['converged'])
+    return summarize(latencies, errors, iterations, converged, elapsed=time.perf_counter() - start)
+
+
+def bench_calculate_positions(data, args):
+    latitudes, longitudes, lengths, azimuths, stamps = data
+    latencies, fixes = [], []
+    start = time.perf_counter()
+    for chunk in range(0, len(latitudes), args.batch_size):
+        rows = slice(chunk, chunk + args.batch_size)
+        tick = time.perf_counter()
+        fixes.append(SolarGeolocationCalculator.calculate_positions(
+            1.0, lengths[rows, 0], azimuths[rows, 0], stamps[rows, 0], 0.0
+        ))
+        latencies.append(time.perf_counter() - tick)
+    elapsed = time.perf_counter() - start
+    fixes = np.concatenate(fixes)
+    errors = distance_km(fixes['latitude'], fixes['longitude'], latitudes, longitudes)
+    summary = summarize(latencies, errors, fixes['iterations'], fixes['converged'],
+                        solves=len(fixes), elapsed=elapsed)
+    summary['batch_size'] = args.batch_size
+    # Readings with a second exact solution, flagged rather than resolved
+    summary['ambiguous_ratio'] = float(np.mean(np.isfinite(fixes['alternative_latitude'])))
+    return summary
+
+
+def bench_fit_observations(data, args):
+    latitudes, longitudes, lengths, azimuths, stamps = data
+    count = min(len(latitudes), args.fit_samples)
+    latencies, errors, iterations = [], [], []
+    start = time.perf_counter()
+    for i in range(count):
+        tick = time.perf_counter()
+        fix = SolarGeolocationCalculator.fit_observations(1.0, lengths[i], azimuths[i], stamps[i], 0.0)
+        latencies.append(time.perf_counter() - tick)
+        errors.append(distance_km(fix['latitude'], fix['longitude'], latitudes[i], longitudes[i]))
+        iterations.append(fix['iterations'])
+    summary = summarize(latencies, errors, iterations, elapsed=time.perf_counter() - start)
+    summary['readings'] = int(lengths.shape[1])
+    return summary
+
+
+def bench_global_search(data, args):
+    latitudes, longitudes, lengths, azimuths, stamps = data
+    count = min(len(latitudes), args.global_samples)
+    latencies, errors, candidates = [], [], []
+    start = time.perf_counter()
+    for i in range(count):
+        tick = time.perf_counter()
+        search = SolarGeolocationCalculator.global_search(
+            1.0, lengths[i, :1], azimuths[i, :1], stamps[i, :1], 0.0, resolution=args.resolution
+        )
+        latencies.append(time.perf_counter() - tick)
+        # Best error over all candidates: the true position must be among them
+        errors.append(min(distance_km(c['latitude'], c['longitude'], latitudes[i], longitudes[i])
+                          for c in search['candidates']))
+        candidates.append(len(search['candidates']))
+    summary = summarize(latencies, errors, elapsed=time.perf_counter() - start)
+    summary['resolution'] = args.resolution
+    summary['mean_candidates'] = float(np.mean(candidates))
+    return summary
+
+
+def compare(results, baseline, max_slowdown, max_error_increase):
+    """Liste des régressions de débit ou de précision par rapport à une exécution de référence"""
+    regressions = []
+    for solver, current in results.items():
+        previous = baseline.get('results', {}).get(solver)
+        if not previous:
+            continue
+        if previous.get('throughput_per_s') and current.get('throughput_per_s'):
+            if current['throughput_per_s'] * max_slowdown < previous['throughput_per_s']:
+                regressions.append(f"{solver}: débit {current['throughput_per_s']:.0f}/s "
+                                   f"contre {previous['throughput_per_s']:.0f}/s")
+        before = previous.get('error_km', {}).get('p95')
+        after = current.get('error_km', {}).get('p95')
+        if before is not None and after is not None and after > before + max_error_increase:
+            regressions.append(f"{solver}: erreur p95 {after:.3f} km contre {before:.3f} km")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai des solveurs de géolocalisation solaire")
+    parser.add_argument('--samples', type=int, default=2000, help="nombre de positions synthétiques")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--solvers', nargs='+', choices=SOLVERS, default=list(SOLVERS))
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--readings', type=int, default=4, help="relevés par position pour fit_observations")
+    parser.add_argument('--fit-samples', type=int, default=200)
+    parser.add_argument('--global-samples', type=int, default=3)
+    parser.add_argument('--resolution', type=float, default=0.1, help="pas de la grille globale (degrés)")
+    parser.add_argument('--length-noise', type=float, default=0.0, help="bruit sur l'ombre (m)")
+    parser.add_argument('--azimuth-noise', type=float, default=0.0, help="bruit sur l'azimut (degrés)")
+    parser.add_argument('--output', default='-', help="fichier JSON, '-' pour la sortie standard")
+    parser.add_argument('--baseline', help="résultats JSON de référence à comparer")
+    parser.add_argument('--max-slowdown', type=float, default=1.25)
+    parser.add_argument('--max-error-increase', type=float, default=0.5, help="en km, sur le p95")
+    args = parser.parse_args(argv)
+
+    data = generate_observations(args.samples, args.seed, readings=args.readings,
+                                 length_noise=args.length_noise, azimuth_noise=args.azimuth_noise)
+    benches = {
+        'calculate_position': bench_calculate_position,
+        'calculate_positions': bench_calculate_positions,
+        'fit_observations': bench_fit_observations,
+        'global_search': bench_global_search,
+    }
+
+    # Warm up the ephemeris table and, for the global search, start its
+    # process pool with a coarse search, so neither is inside the timings
+    ephemeris.load_table()
+    if 'global_search' in args.solvers:
+        _, _, lengths, azimuths, stamps = data
+        SolarGeolocationCalculator.global_search(1.0, lengths[0, :1], azimuths[0, :1], stamps[0, :1], 0.0,
+                                                 resolution=10.0)
+    SolarGeolocationCalculator.statistics.reset()
+
+    results = {solver: benches[solver](data, args) for solver in args.solvers}
+    report = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'node': platform.node(),
+            'samples': args.samples,
+            'seed': args.seed,
+            'length_noise': args.length_noise,
+            'azimuth_noise': args.azimuth_noise,
+        },
+        'results': results,
+        'solver_statistics': SolarGeolocationCalculator.statistics.summary(),
+    }
+    text = json.dumps(report, indent=2, default=str)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as handle:
+            handle.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare(results, json.load(handle), args.max_slowdown, args.max_error_increase)
+        for regression in regressions:
+            print(f"RÉGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Table des commandes du socket de l'overlay, indépendante de Qt.
+
+Une ligne reçue par control_server est découpée en un nom de commande et
+ses arguments, vérifiés contre la signature du gestionnaire avant l'appel.
+La réponse tient sur une ligne : « OK » suivi d'un éventuel résultat, ou
+« ERR » suivi du message d'erreur.
+"""
+
+import inspect
+import logging
+
+logger = logging.getLogger('kt2maps.control')
+
+
+class CommandError(Exception):
+    """Commande refusée ; le message est renvoyé au client"""
+
+
+class CommandTable:
+    def __init__(self):
+        self.commands = {'help': (self.help, "liste des commandes")}
+
+    def register(self, name, handler, description=""):
+        """handler(*arguments) -> texte de la réponse (ou None), CommandError en cas de refus"""
+        self.commands[name] = (handler, description)
+
+    def help(self):
+        return " ; ".join(f"{name}: {description}" if description else name
+                          for name, (_, description) in sorted(self.commands.items()))
+
+    def execute(self, line):
+        """Réponse à une ligne de commande"""
+        words = line.split()
+        if not words:
+            return "ERR commande vide"
+        name, *arguments = words
+        if name not in self.commands:
+            return f"ERR commande inconnue : {name} (voir help)"
+        handler, _ = self.commands[name]
+        try:
+            inspect.signature(handler).bind(*arguments)
+        except TypeError:
+            return f"ERR arguments invalides pour {name}"
+        try:
+            result = handler(*arguments)
+        except CommandError as error:
+            return f"ERR {error}"
+        except Exception as error:
+            logger.exception("commande %s en échec", name)
+            return f"ERR {error}"
+        logger.info("commande %s", line.strip())
+        return "OK" if result is None else f"OK {result}"
@@ -0,0 +1,76 @@
+"""Commandes de l'overlay par socket Unix.
+
+L'overlay tourne en permanence : les raccourcis i3 et les scripts lui
+envoient des commandes sur un socket local au lieu de lancer un nouvel
+interpréteur Python à chaque action. Le protocole est en lignes de texte,
+utilisable directement avec socat :
+
+    echo keyboard | socat - UNIX-CONNECT:~/.cache/kt2maps/control.sock
+
+Chaque ligne reçue est une commande suivie de ses arguments séparés par des
+espaces ; la réponse tient sur une ligne, « OK » suivi d'un éventuel
+résultat, ou « ERR » suivi du message d'erreur (voir control_commands).
+Plusieurs commandes peuvent se suivre sur la même connexion.
+"""
+
+import os
+import logging
+from PyQt5.QtCore import QObject, pyqtSlot
+from PyQt5.QtNetwork import QLocalServer
+from control_commands import CommandError, CommandTable
+from storage import DATA_DIR
+
+SOCKET_PATH = os.path.join(DATA_DIR, 'control.sock')
+
+# Longest accepted command line; longer input is a protocol error
+MAX_LINE = 4096
+
+logger = logging.getLogger('kt2maps.control')
+
+
+class ControlServer(QObject):
+    def __init__(self, path=SOCKET_PATH, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.commands = CommandTable()
+        self.server = QLocalServer(self)
+        # Only the kiosk user may send commands
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.accept_connections)
+
+    def register(self, name, handler, description=""):
+        """handler(*arguments) -> texte de la réponse (ou None), CommandError en cas de refus"""
+        self.commands.register(name, handler, description)
+
+    def listen(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # A socket left by a previous instance would make listen() fail
+        QLocalServer.removeServer(self.path)
+        if not self.server.listen(self.path):
+            logger.warning("socket de commande indisponible (%s) : %s", self.path, self.server.errorString())
+            return False
+        logger.info("commandes acceptées sur %s", self.path)
+        return True
+
+    def close(self):
+        self.server.close()
+
+    @pyqtSlot()
+    def accept_connections(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            connection.readyRead.connect(lambda connection=connection: self.read_commands(connection))
+            connection.disconnected.connect(connection.deleteLater)
+
+    def read_commands(self, connection):
+        while connection.canReadLine():
+            line = bytes(connection.readLine()).decode('utf-8', 'replace')
+            self.reply(connection, self.commands.execute(line))
+        if connection.bytesAvailable() > MAX_LINE:
+            self.reply(connection, "ERR ligne trop longue")
+            connection.disconnectFromServer()
+
+    def reply(self, connection, text):
+        connection.write((text + "\n").encode())
+        # Sent right away, before socat gives up waiting for the answer
+        connection.flush()
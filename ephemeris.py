@@ -0,0 +1,211 @@
+"""Éphémérides solaires précises pour la géolocalisation par ombre.
+
+Position apparente du soleil à partir d'une version réduite de la théorie
+VSOP87 (termes principaux de Meeus, « Astronomical Algorithms », annexe III),
+avec nutation, aberration et obliquité de l'écliptique. Seules la déclinaison
+et l'équation du temps sont utilisées par le solveur.
+
+Le calcul de la série étant coûteux sur un Raspberry Pi, ses résultats sont
+précalculés une fois par jour sur plusieurs décennies dans une table binaire
+compacte, projetée en mémoire (mmap) et interpolée linéairement à la lecture.
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+from storage import DATA_DIR, atomic_path
+
+# Period covered by the precomputed table, one row per day at 0h UTC
+TABLE_START = np.datetime64('1990-01-01')
+TABLE_END = np.datetime64('2061-01-01')
+TABLE_VERSION = 1
+
+# TT - UT (seconds), close enough over the table range for solar work
+DELTA_T = 69.0
+
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+
+# Reduced VSOP87 series for the Earth: (amplitude, phase, frequency) per term,
+# amplitudes in 1e-8 rad (L, B) or 1e-8 AU (R), time in Julian millennia TT
+EARTH_L = [
+    [(175347046, 0, 0), (3341656, 4.6692568, 6283.07585), (34894, 4.6261, 12566.1517),
+     (3497, 2.7441, 5753.3849), (3418, 2.8289, 3.5231), (3136, 3.6277, 77713.7715),
+     (2676, 4.4181, 7860.4194), (2343, 6.1352, 3930.2097), (1324, 0.7425, 11506.7698),
+     (1273, 2.0371, 529.691), (1199, 1.1096, 1577.3435), (990, 5.233, 5884.927),
+     (902, 2.045, 26.298), (857, 3.508, 398.149), (780, 1.179, 5223.694),
+     (753, 2.533, 5507.553), (505, 4.583, 18849.228), (492, 4.205, 775.523),
+     (357, 2.92, 0.067), (317, 5.849, 11790.629), (284, 1.899, 796.298),
+     (271, 0.315, 10977.079), (243, 0.345, 5486.778), (206, 4.806, 2544.314),
+     (205, 1.869, 5573.143), (202, 2.458, 6069.777), (156, 0.833, 213.299),
+     (132, 3.411, 2942.463), (126, 1.083, 20.775), (115, 0.645, 0.98),
+     (103, 0.636, 4694.003), (102, 0.976, 15720.839), (102, 4.267, 7.114),
+     (99, 6.21, 2146.17), (98, 0.68, 155.42), (86, 5.98, 161000.69),
+     (85, 1.3, 6275.96), (85, 3.67, 71430.7), (80, 1.81, 17260.15)],
+    [(628331966747, 0, 0), (206059, 2.678235, 6283.07585), (4303, 2.6351, 12566.1517),
+     (425, 1.59, 3.523), (119, 5.796, 26.298), (109, 2.966, 1577.344),
+     (93, 2.59, 18849.23), (72, 1.14, 529.69), (68, 1.87, 398.15),
+     (67, 4.41, 5507.55), (59, 2.89, 5223.69), (56, 2.17, 155.42),
+     (45, 0.4, 796.3), (36, 0.47, 775.52), (29, 2.65, 7.11)],
+    [(52919, 0, 0), (8720, 1.0721, 6283.0758), (309, 0.867, 12566.152),
+     (27, 0.05, 3.52), (16, 5.19, 26.3), (16, 3.68, 155.42), (10, 0.76, 18849.23)],
+    [(289, 5.844, 6283.076), (35, 0, 0), (17, 5.49, 12566.15)],
+    [(114, 3.142, 0), (8, 4.13, 6283.08), (1, 3.84, 12566.15)],
+    [(1, 3.14, 0)],
+]
+
+EARTH_B = [
+    [(280, 3.199, 84334.662), (102, 5.422, 5507.553), (80, 3.88, 5223.69),
+     (44, 3.7, 2352.87), (32, 4.0, 1577.34)],
+    [(9, 3.9, 5507.55), (6, 1.73, 5223.69)],
+]
+
+EARTH_R = [
+    [(100013989, 0, 0), (1670700, 3.0984635, 6283.07585), (13956, 3.05525, 12566.1517),
+     (3084, 5.1985, 77713.7715), (1628, 1.1739, 5753.3849), (1576, 2.8469, 7860.4194),
+     (925, 5.453, 11506.77), (542, 4.564, 3930.21), (472, 3.661, 5884.927),
+     (346, 0.964, 5507.553), (329, 5.9, 5223.694), (307, 0.299, 5573.143),
+     (243, 4.273, 11790.629), (212, 5.847, 1577.344), (186, 5.022, 10977.079)],
+    [(103019, 1.10749, 6283.07585), (1721, 1.0644, 12566.1517), (702, 3.142, 0),
+     (32, 1.02, 18849.23), (31, 2.84, 5507.55), (25, 1.32, 5223.69)],
+    [(4359, 5.7846, 6283.0758), (124, 5.579, 12566.152), (12, 3.14, 0)],
+    [(145, 4.273, 6283.076), (7, 3.92, 12566.15)],
+    [(4, 2.56, 6283.08)],
+]
+
+
+def _series(terms, tau):
+    total = 0.0
+    for power, rows in enumerate(terms):
+        amplitudes, phases, frequencies = np.array(rows, dtype=np.float64).T
+        values = amplitudes * np.cos(phases + frequencies * tau[..., None])
+        total = total + values.sum(axis=-1) * tau ** power
+    return total / 1e8
+
+
+def julian_day(timestamps):
+    """Jour julien (UT) d'un tableau de datetime64"""
+    timestamps = np.asarray(timestamps, dtype='datetime64[ms]')
+    return (timestamps - np.datetime64('1970-01-01', 'ms')) / np.timedelta64(1, 'D') + UNIX_EPOCH_JD
+
+
+def solar_position(jd):
+    """Déclinaison apparente (degrés) et équation du temps (minutes) au jour julien UT.
+
+    Évalue directement la série ; préférer lookup() pour les appels répétés.
+    """
+    jd = np.asarray(jd, dtype=np.float64)
+    tau = (jd + DELTA_T / 86400.0 - J2000_JD) / 365250.0
+    t = tau * 10
+
+    # Heliocentric Earth coordinates, then geocentric Sun
+    earth_longitude = _series(EARTH_L, tau)
+    earth_latitude = _series(EARTH_B, tau)
+    radius = _series(EARTH_R, tau)
+    sun_longitude = np.degrees(earth_longitude) % 360 + 180
+    sun_latitude = -np.degrees(earth_latitude)
+
+    # Conversion to the FK5 frame
+    shifted = np.radians(sun_longitude - 1.397 * t - 0.00031 * t * t)
+    sun_longitude = sun_longitude - 0.09033 / 3600
+    sun_latitude = sun_latitude + 0.03916 / 3600 * (np.cos(shifted) - np.sin(shifted))
+
+    # Nutation (reduced IAU 1980) and obliquity of the ecliptic
+    node = np.radians(125.04452 - 1934.136261 * t)
+    mean_sun = np.radians(280.4665 + 36000.7698 * t)
+    mean_moon = np.radians(218.3165 + 481267.8813 * t)
+    nutation_longitude = (-17.20 * np.sin(node) - 1.32 * np.sin(2 * mean_sun)
+                          - 0.23 * np.sin(2 * mean_moon) + 0.21 * np.sin(2 * node)) / 3600
+    nutation_obliquity = (9.20 * np.cos(node) + 0.57 * np.cos(2 * mean_sun)
+                          + 0.10 * np.cos(2 * mean_moon) - 0.09 * np.cos(2 * node)) / 3600
+    mean_obliquity = 23.4392911 - (46.8150 * t + 0.00059 * t ** 2 - 0.001813 * t ** 3) / 3600
+    obliquity = np.radians(mean_obliquity + nutation_obliquity)
+
+    # Apparent longitude: nutation and aberration
+    apparent_longitude = np.radians(sun_longitude + nutation_longitude - 20.4898 / 3600 / radius)
+    beta = np.radians(sun_latitude)
+
+    declination = np.degrees(np.arcsin(
+        np.sin(beta) * np.cos(obliquity) + np.cos(beta) * np.sin(obliquity) * np.sin(apparent_longitude)
+    ))
+    right_ascension = np.degrees(np.arctan2(
+        np.sin(apparent_longitude) * np.cos(obliquity) - np.tan(beta) * np.sin(obliquity),
+        np.cos(apparent_longitude)
+    ))
+
+    # Equation of time from the Sun's mean longitude
+    mean_longitude = (280.4664567 + 360007.6982779 * tau + 0.03032028 * tau ** 2
+                      + tau ** 3 / 49931 - tau ** 4 / 15300 - tau ** 5 / 2000000)
+    equation = mean_longitude - 0.0057183 - right_ascension + nutation_longitude * np.cos(obliquity)
+    equation = (equation + 180) % 360 - 180
+
+    return declination, equation * 4
+
+
+def table_path():
+    start = TABLE_START.astype(object).year
+    end = TABLE_END.astype(object).year
+    return os.path.join(DATA_DIR, f"solar_ephemeris_{start}_{end}_v{TABLE_VERSION}.npy")
+
+
+def build_table(path=None):
+    """Précalcule la table journalière (déclinaison, équation du temps) en float32"""
+    path = path or table_path()
+    days = np.arange(TABLE_START, TABLE_END + 1, dtype='datetime64[D]')
+    declination, equation = solar_position(julian_day(days))
+    table = np.column_stack((declination, equation)).astype(np.float32)
+
+    with atomic_path(path) as temporary:
+        with open(temporary, 'wb') as handle:
+            np.save(handle, table)
+    return path
+
+
+_table = None
+
+
+def load_table():
+    """Table projetée en mémoire, construite au premier appel si nécessaire"""
+    global _table
+    if _table is None:
+        path = table_path()
+        if not os.path.exists(path):
+            build_table(path)
+        _table = np.load(path, mmap_mode='r')
+    return _table
+
+
+def lookup(timestamps):
+    """Déclinaison (degrés) et équation du temps (minutes) pour des datetime64 UTC.
+
+    Interpolation linéaire dans la table journalière ; les dates hors de la
+    table sont calculées directement par la série.
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[ms]')
+    table = load_table()
+    position = (timestamps - TABLE_START.astype('datetime64[ms]')) / np.timedelta64(1, 'D')
+    inside = (position >= 0) & (position < len(table) - 1)
+
+    index = np.where(inside, np.floor(position), 0).astype(np.intp)
+    fraction = np.where(inside, position - index, 0)
+    before = table[index]
+    after = table[index + 1]
+    values = before + (after - before) * fraction[..., None]
+    declination = values[..., 0].astype(np.float64)
+    equation = values[..., 1].astype(np.float64)
+
+    if not np.all(inside):
+        outside = ~inside
+        direct = solar_position(julian_day(timestamps[outside]))
+        declination[outside] = direct[0]
+        equation[outside] = direct[1]
+
+    return declination, equation
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Précalcule la table d'éphémérides solaires")
+    parser.add_argument('--output', help="chemin de la table (défaut : %(default)s)", default=table_path())
+    args = parser.parse_args()
+    print(build_table(args.output), file=sys.stderr)
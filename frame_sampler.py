@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Mesure du coût de l'overlay : temps de trame et charge CPU.
+
+Un minuteur à la cadence d'affichage (16 ms) relève l'écart réel entre deux
+passages dans la boucle d'événements (retard de la boucle) et, en option, la
+durée d'un repaint() synchrone de la fenêtre de l'overlay. La charge CPU de
+l'overlay et celle des processus surveillés (Pure Maps par défaut) sont lues
+dans /proc. Un résumé est écrit dans le journal à intervalle régulier.
+
+Pour comparer, faire défiler la carte avec l'overlay lancé avec
+--sample-frames (dans chacun des modes de rendu), puis sans overlay :
+    python3 frame_sampler.py --duration 30
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+from PyQt5.QtCore import QObject, QTimer, QCoreApplication
+
+FRAME_INTERVAL_MS = 16
+REPORT_INTERVAL = 10.0
+
+# Samples kept for each statistic (about 16 s at 60 Hz)
+WINDOW = 1024
+
+WATCHED_PROCESSES = ('PureMaps', 'harbour-pure-maps')
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+logger = logging.getLogger('kt2maps.frames')
+
+
+def find_processes(names):
+    """PID des processus dont la ligne de commande contient l'un des noms"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as handle:
+                command = handle.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+        except OSError:
+            continue
+        if any(name in command for name in names):
+            pids.append(int(entry))
+    return pids
+
+
+def process_cpu_seconds(pid):
+    """Temps CPU (utilisateur + système) consommé par un processus, ou None s'il a disparu"""
+    try:
+        with open(f'/proc/{pid}/stat') as handle:
+            # The command name may contain spaces: fields start after ')'
+            fields = handle.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+class RingBuffer:
+    def __init__(self, size=WINDOW):
+        self.values = np.zeros(size)
+        self.count = 0
+
+    def append(self, value):
+        self.values[self.count % self.values.size] = value
+        self.count += 1
+
+    def percentiles(self, *quantiles):
+        values = self.values[:min(self.count, self.values.size)]
+        if not values.size:
+            return [float('nan')] * len(quantiles)
+        return np.percentile(values, quantiles).tolist()
+
+    def maximum(self):
+        values = self.values[:min(self.count, self.values.size)]
+        return float(values.max()) if values.size else float('nan')
+
+
+class CpuMeter:
+    """Charge CPU (en % d'un cœur) d'un ensemble de processus entre deux lectures"""
+
+    def __init__(self, pids):
+        self.pids = list(pids)
+        self.last_wall = time.monotonic()
+        self.last_cpu = self._total()
+
+    def _total(self):
+        return sum(filter(None, (process_cpu_seconds(pid) for pid in self.pids)))
+
+    def sample(self):
+        wall = time.monotonic()
+        cpu = self._total()
+        percent = 100 * (cpu - self.last_cpu) / max(wall - self.last_wall, 1e-6)
+        self.last_wall, self.last_cpu = wall, cpu
+        return percent
+
+
+class FrameSampler(QObject):
+    def __init__(self, widget=None, repaint=False, watched=WATCHED_PROCESSES,
+                 report_interval=REPORT_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.widget = widget
+        self.repaint = repaint and widget is not None
+        self.intervals = RingBuffer()
+        self.paint_times = RingBuffer()
+        self.own_cpu = CpuMeter([os.getpid()])
+        self.watched_cpu = CpuMeter(find_processes(watched))
+        self.last_tick = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(FRAME_INTERVAL_MS)
+        self.timer.timeout.connect(self.tick)
+        self.report_timer = QTimer(self)
+        self.report_timer.setInterval(int(report_interval * 1000))
+        self.report_timer.timeout.connect(self.report)
+
+    def start(self):
+        self.last_tick = time.perf_counter()
+        self.timer.start()
+        self.report_timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.report_timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.intervals.append((now - self.last_tick) * 1000)
+        self.last_tick = now
+        if self.repaint:
+            self.widget.repaint()
+            self.paint_times.append((time.perf_counter() - now) * 1000)
+
+    def summary(self):
+        interval_50, interval_95 = self.intervals.percentiles(50, 95)
+        summary = {
+            'frame_interval_p50': interval_50,
+            'frame_interval_p95': interval_95,
+            'frame_interval_max': self.intervals.maximum(),
+            'overlay_cpu': self.own_cpu.sample(),
+            'watched_cpu': self.watched_cpu.sample(),
+            'watched_processes': len(self.watched_cpu.pids)
+        }
+        if self.repaint:
+            summary['repaint_p50'], summary['repaint_p95'] = self.paint_times.percentiles(50, 95)
+        return summary
+
+    def report(self):
+        summary = self.summary()
+        message = ("trame %.1f/%.1f/%.1f ms (p50/p95/max), CPU overlay %.1f %%, carte %.1f %% (%d processus)"
+                   % (summary['frame_interval_p50'], summary['frame_interval_p95'],
+                      summary['frame_interval_max'], summary['overlay_cpu'],
+                      summary['watched_cpu'], summary['watched_processes']))
+        if self.repaint:
+            message += " ; repaint %.2f/%.2f ms" % (summary['repaint_p50'], summary['repaint_p95'])
+        logger.info(message)
+        return summary
+
+
+if __name__ == '__main__':
+    # Reference run without the overlay: only the CPU load of the map is relevant
+    parser = argparse.ArgumentParser(description="Charge CPU de la carte, sans overlay")
+    parser.add_argument('--duration', type=float, default=30.0, help="durée de la mesure (s)")
+    parser.add_argument('--interval', type=float, default=REPORT_INTERVAL, help="période des résumés (s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    app = QCoreApplication(sys.argv[:1])
+    sampler = FrameSampler(report_interval=args.interval)
+    sampler.start()
+    QTimer.singleShot(int(args.duration * 1000), app.quit)
+    app.exec_()
+    sampler.report()
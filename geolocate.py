@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Géolocalisation par ombre solaire en ligne de commande, sans Qt ni affichage.
+
+Lit des relevés JSONL ou CSV (fichier ou entrée standard) et écrit une
+position par ligne au fur et à mesure. Les relevés sont résolus par paquets
+avec SolarGeolocationCalculator.calculate_positions, si bien que la mémoire
+reste bornée quelle que soit la taille du fichier.
+
+Champs d'entrée : stick_height, shadow_length, shadow_azimuth, timestamp
+(ISO 8601, UTC si aucun fuseau n'est indiqué), magnetic_declination
+(optionnel) et id (optionnel, recopié en sortie). En sortie,
+alternative_latitude et alternative_longitude donnent l'autre position qui
+explique exactement le relevé, quand il y en a une (vides sinon).
+
+Exemple :
+    python3 geolocate.py releves.csv --output positions.jsonl
+"""
+
+import sys
+import csv
+import json
+import argparse
+from datetime import datetime, timezone
+from itertools import islice
+import numpy as np
+from solar_calculator import SolarGeolocationCalculator
+
+INPUT_FIELDS = ('stick_height', 'shadow_length', 'shadow_azimuth', 'timestamp')
+OUTPUT_FIELDS = ('latitude', 'longitude', 'elevation', 'sun_azimuth',
+                 'iterations', 'residual', 'converged', 'alternative_latitude', 'alternative_longitude')
+
+
+def parse_timestamp(value):
+    moment = datetime.fromisoformat(value.strip())
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(moment, 'ms')
+
+
+def read_records(stream, input_format):
+    """Itère sur (numéro de ligne, relevé) sans charger le fichier en mémoire"""
+    if input_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if line:
+                yield line_number, line
+
+
+def decode_record(record, input_format, default_declination):
+    if input_format != 'csv':
+        record = json.loads(record)
+    missing = [field for field in INPUT_FIELDS if record.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"champs manquants : {', '.join(missing)}")
+    declination = record.get('magnetic_declination')
+    stick_height = float(record['stick_height'])
+    shadow_length = float(record['shadow_length'])
+    shadow_azimuth = float(record['shadow_azimuth'])
+    declination = default_declination if declination in (None, '') else float(declination)
+    for name, value in (('stick_height', stick_height), ('shadow_length', shadow_length)):
+        if not (np.isfinite(value) and value > 0):
+            raise ValueError(f"{name} doit être un nombre positif ({value:g})")
+    for name, value in (('shadow_azimuth', shadow_azimuth), ('magnetic_declination', declination)):
+        if not np.isfinite(value):
+            raise ValueError(f"{name} n'est pas un nombre fini ({value:g})")
+    return (
+        stick_height,
+        shadow_length,
+        shadow_azimuth,
+        parse_timestamp(str(record['timestamp'])),
+        declination,
+        record.get('id')
+    )
+
+
+def solve_chunk(records, input_format, default_declination):
+    """Décode et résout un paquet ; les lignes invalides sont signalées sur stderr"""
+    rows = []
+    for line_number, record in records:
+        try:
+            rows.append((line_number,) + decode_record(record, input_format, default_declination))
+        except (ValueError, TypeError, KeyError, AttributeError) as error:
+            print(f"ligne {line_number} ignorée : {error}", file=sys.stderr)
+    if not rows:
+        return rows, None
+
+    line_numbers, heights, lengths, azimuths, timestamps, declinations, ids = zip(*rows)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fixes = SolarGeolocationCalculator.calculate_positions(
+            np.array(heights), np.array(lengths), np.array(azimuths),
+            np.array(timestamps, dtype='datetime64[ms]'), np.array(declinations)
+        )
+    return rows, fixes
+
+
+def fix_records(rows, fixes):
+    # Convert whole columns at once rather than element by element
+    # Missing values (no second solution) are written as null, not NaN
+    columns = [
+        np.where(np.isnan(fixes[field]), None, np.round(fixes[field], 6)).tolist()
+        if fixes[field].dtype.kind == 'f' else fixes[field].tolist()
+        for field in OUTPUT_FIELDS
+    ]
+    timestamps = np.datetime_as_string(np.array([row[4] for row in rows], dtype='datetime64[ms]')).tolist()
+    for row, timestamp, values in zip(rows, timestamps, zip(*columns)):
+        record = {'line': row[0]}
+        if row[6] is not None:
+            record['id'] = row[6]
+        record['timestamp'] = timestamp
+        record.update(zip(OUTPUT_FIELDS, values))
+        yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcule des positions à partir de relevés d'ombre")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="fichier JSONL ou CSV, '-' pour l'entrée standard (défaut)")
+    parser.add_argument('--output', default='-', help="fichier de sortie, '-' pour la sortie standard")
+    parser.add_argument('--input-format', choices=('jsonl', 'csv'),
+                        help="format d'entrée (déduit de l'extension, JSONL par défaut)")
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'),
+                        help="format de sortie (identique à l'entrée par défaut)")
+    parser.add_argument('--declination', type=float, default=0.0,
+                        help="déclinaison magnétique par défaut, en degrés")
+    parser.add_argument('--chunk-size', type=int, default=4096,
+                        help="relevés résolus par paquet (1 pour un flux en direct)")
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or ('csv' if args.input.endswith('.csv') else 'jsonl')
+    output_format = args.output_format or input_format
+
+    source = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        records = read_records(source, input_format)
+        writer = None
+        while True:
+            chunk = list(islice(records, max(args.chunk_size, 1)))
+            if not chunk:
+                break
+            rows, fixes = solve_chunk(chunk, input_format, args.declination)
+            if fixes is None:
+                continue
+            for record in fix_records(rows, fixes):
+                if output_format == 'csv':
+                    if writer is None:
+                        writer = csv.DictWriter(target, fieldnames=('line', 'id', 'timestamp') + OUTPUT_FIELDS)
+                        writer.writeheader()
+                    writer.writerow(record)
+                else:
+                    target.write(json.dumps(record) + '\n')
+            target.flush()
+    except BrokenPipeError:
+        # Downstream consumer closed early (e.g. piped into head)
+        return 0
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
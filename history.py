@@ -0,0 +1,283 @@
+"""Historique local des mesures et des positions calculées (SQLite).
+
+Les mesures brutes, les positions et les diagnostics du solveur sont
+conservés dans une base SQLite en mode WAL, avec des index sur le temps et
+la position. L'interface ne touche jamais le disque : les écritures passent
+par une file bornée et sont regroupées en transactions par un thread
+d'arrière-plan (une seule synchronisation par paquet, ce qui ménage les
+cartes SD). Une transaction validée survit à une coupure de courant
+(synchronous=FULL) ; au pire, le dernier paquet non encore écrit est perdu.
+
+Les sessions peuvent être relues pour être recalculées avec un solveur plus
+récent, chaque mesure avec la déclinaison enregistrée pour elle :
+
+    store = HistoryStore()
+    for session in store.sessions(limit=10):
+        data = store.load_observations(session['id'])
+        SolarGeolocationCalculator.fit_observations(
+            data['stick_heights'], data['shadow_lengths'], data['shadow_azimuths'],
+            data['timestamps'], data['magnetic_declinations'])
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import sqlite3
+import threading
+import numpy as np
+from storage import DATA_DIR
+
+DATABASE_PATH = os.path.join(DATA_DIR, 'history.sqlite3')
+
+SCHEMA_VERSION = 1
+
+# Pending writes kept in memory; beyond this, new records are dropped
+QUEUE_SIZE = 1024
+
+# Records per transaction, and longest wait before a partial batch is written
+BATCH_SIZE = 128
+FLUSH_INTERVAL = 2.0
+
+# Upper bound of the WAL file once checkpointed (bytes)
+JOURNAL_SIZE_LIMIT = 4 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(id),
+    recorded_at REAL NOT NULL,
+    timestamp INTEGER NOT NULL,
+    stick_height REAL NOT NULL,
+    shadow_length REAL NOT NULL,
+    shadow_azimuth REAL NOT NULL,
+    magnetic_declination REAL NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS fixes (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(id),
+    recorded_at REAL NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    solver TEXT NOT NULL,
+    converged INTEGER,
+    semi_major REAL,
+    semi_minor REAL,
+    diagnostics TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_started_at ON sessions(started_at);
+CREATE INDEX IF NOT EXISTS observations_session ON observations(session_id, timestamp);
+CREATE INDEX IF NOT EXISTS observations_timestamp ON observations(timestamp);
+CREATE INDEX IF NOT EXISTS fixes_recorded_at ON fixes(recorded_at);
+CREATE INDEX IF NOT EXISTS fixes_position ON fixes(latitude, longitude);
+CREATE INDEX IF NOT EXISTS fixes_session ON fixes(session_id);
+"""
+
+# Diagnostics stored as JSON next to each fix
+DIAGNOSTIC_FIELDS = ('elevation', 'declination', 'equation_of_time', 'sun_azimuth', 'iterations',
+                     'residual', 'solve_time', 'chi2', 'magnetic_declination', 'radius_50', 'radius_95')
+
+logger = logging.getLogger('kt2maps.history')
+
+
+class HistoryError(RuntimeError):
+    """Base d'historique inaccessible"""
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    # FULL makes every committed batch durable across a power cut; one fsync
+    # per batch keeps the cost low on SD cards
+    connection.execute('PRAGMA synchronous=FULL')
+    connection.execute(f'PRAGMA journal_size_limit={JOURNAL_SIZE_LIMIT}')
+    return connection
+
+
+def _milliseconds(timestamp):
+    return int(np.datetime64(timestamp, 'ms').astype(np.int64))
+
+
+def _json_value(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    return value if isinstance(value, (int, float, bool, str)) or value is None else str(value)
+
+
+class HistoryStore:
+    def __init__(self, path=DATABASE_PATH, queue_size=QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.connection = _connect(path)
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+            self.connection.commit()
+            # Separate connection for queries, so reads never see a batch in progress
+            self.reader = _connect(path)
+        except (OSError, sqlite3.Error) as error:
+            raise HistoryError(f"Historique inaccessible : {error}") from error
+        self.read_lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.writer = threading.Thread(target=self._write_loop, name='history-writer', daemon=True)
+        self.writer.start()
+
+    # Writes (non-blocking, from the UI thread)
+
+    def _enqueue(self, statement, values):
+        try:
+            self.pending.put_nowait((statement, values))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning("historique saturé, enregistrement ignoré (%d au total)", self.dropped)
+
+    def start_session(self, label=None):
+        """Nouvelle session ; retourne son identifiant"""
+        session_id = uuid.uuid4().hex
+        self._enqueue('INSERT INTO sessions (id, started_at, label) VALUES (?, ?, ?)',
+                      (session_id, time.time(), label))
+        return session_id
+
+    def record_observation(self, session_id, stick_height, shadow_length, shadow_azimuth,
+                           timestamp, magnetic_declination, source=None):
+        self._enqueue(
+            'INSERT INTO observations (session_id, recorded_at, timestamp, stick_height, shadow_length, '
+            'shadow_azimuth, magnetic_declination, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (session_id, time.time(), _milliseconds(timestamp), float(stick_height),
+             float(shadow_length), float(shadow_azimuth), float(magnetic_declination), source)
+        )
+
+    def record_fix(self, session_id, results, solver, uncertainty=None, magnetic_declination=None):
+        """Position calculée avec les diagnostics du solveur (et l'ellipse si disponible).
+
+        magnetic_declination est la déclinaison réellement utilisée par le
+        calcul ; elle remplace celle des résultats, absente après un ajustement.
+        """
+        uncertainty = uncertainty or {}
+        merged = dict(results, **uncertainty)
+        diagnostics = {field: _json_value(merged[field]) for field in DIAGNOSTIC_FIELDS if field in merged}
+        if magnetic_declination is not None:
+            diagnostics['magnetic_declination'] = float(magnetic_declination)
+        if 'inliers' in results:
+            diagnostics['inliers'] = np.asarray(results['inliers']).tolist()
+        self._enqueue(
+            'INSERT INTO fixes (session_id, recorded_at, latitude, longitude, solver, converged, '
+            'semi_major, semi_minor, diagnostics) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (session_id, time.time(), float(results['latitude']), float(results['longitude']), solver,
+             None if 'converged' not in results else int(bool(results['converged'])),
+             _json_value(merged.get('semi_major')), _json_value(merged.get('semi_minor')),
+             json.dumps(diagnostics))
+        )
+
+    def _write_loop(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                self.pending.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            # Gather more records until the batch is full or the interval is over
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.pending.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            for _ in range(len(batch) + stop):
+                self.pending.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        try:
+            with self.connection:
+                for statement, values in batch:
+                    self.connection.execute(statement, values)
+            self.written += len(batch)
+        except sqlite3.Error as error:
+            logger.error("écriture de l'historique impossible (%d enregistrements perdus) : %s",
+                         len(batch), error)
+
+    def flush(self):
+        """Attend que toutes les écritures en file soient validées"""
+        self.pending.join()
+
+    def close(self):
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+        self.connection.close()
+        with self.read_lock:
+            self.reader.close()
+
+    # Queries (reads see every committed batch, WAL lets them run beside the writer)
+
+    def _query(self, statement, values=()):
+        with self.read_lock:
+            return [dict(row) for row in self.reader.execute(statement, values)]
+
+    def sessions(self, since=None, until=None, limit=100):
+        """Sessions les plus récentes d'abord, avec leur nombre de mesures et de positions"""
+        return self._query(
+            'SELECT s.id, s.started_at, s.label, '
+            '(SELECT COUNT(*) FROM observations o WHERE o.session_id = s.id) AS observations, '
+            '(SELECT COUNT(*) FROM fixes f WHERE f.session_id = s.id) AS fixes '
+            'FROM sessions s WHERE s.started_at >= ? AND s.started_at < ? '
+            'ORDER BY s.started_at DESC LIMIT ?',
+            (since or 0.0, until or float('inf'), limit)
+        )
+
+    def load_observations(self, session_id):
+        """Mesures d'une session sous forme de tableaux, prêtes pour le solveur"""
+        rows = self._query(
+            'SELECT timestamp, stick_height, shadow_length, shadow_azimuth, magnetic_declination, source '
+            'FROM observations WHERE session_id = ? ORDER BY timestamp, id', (session_id,)
+        )
+        column = lambda name, dtype: np.array([row[name] for row in rows], dtype=dtype)
+        return {
+            'timestamps': column('timestamp', np.int64).astype('datetime64[ms]'),
+            'stick_heights': column('stick_height', np.float64),
+            'shadow_lengths': column('shadow_length', np.float64),
+            'shadow_azimuths': column('shadow_azimuth', np.float64),
+            'magnetic_declinations': column('magnetic_declination', np.float64),
+            'sources': [row['source'] for row in rows]
+        }
+
+    def fixes(self, session_id=None, since=None, until=None, bounds=None, limit=1000):
+        """Positions enregistrées, filtrées par session, période ou rectangle (sud, ouest, nord, est)"""
+        conditions = ['recorded_at >= ?', 'recorded_at < ?']
+        values = [since or 0.0, until or float('inf')]
+        if session_id is not None:
+            conditions.append('session_id = ?')
+            values.append(session_id)
+        if bounds is not None:
+            conditions.append('latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?')
+            south, west, north, east = bounds
+            values += [south, north, west, east]
+        rows = self._query(
+            f"SELECT * FROM fixes WHERE {' AND '.join(conditions)} ORDER BY recorded_at DESC LIMIT ?",
+            values + [limit]
+        )
+        for row in rows:
+            row['diagnostics'] = json.loads(row['diagnostics']) if row['diagnostics'] else {}
+        return rows
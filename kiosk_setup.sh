@@ -8,9 +8,13 @@ pkill -f PureMaps
 # Hide cursor after inactivity
 unclutter -idle 1 -root &
 
+# Generated files and the overlay's command socket; exported so that the
+# supervisor, the overlay and the i3 bindings all use the same directory
+export KT2MAPS_DATA_DIR="${KT2MAPS_DATA_DIR:-$HOME/.cache/kt2maps}"
 
-# Configure i3 for kiosk mode
-cat > ~/.config/i3/config << 'EOF'
+
+# Configure i3 for kiosk mode (unquoted EOF: the socket path is expanded here)
+cat > ~/.config/i3/config << EOF
 # i3 config for kiosk mode
 font pango:DejaVu Sans Mono 8
 
@@ -34,36 +38,16 @@ bindsym Mod4+Tab exec true
 # Emergency exit (Ctrl+Alt+Escape)
 bindsym Control+Mod1+Escape exit
 
-# Manual keyboard toggle (Ctrl+Alt+K)
-bindsym Control+Mod1+k exec "python3 /home/user/kiosk/toggle_keyboard.py"
+# Manual keyboard toggle (Ctrl+Alt+K), sent to the running overlay
+bindsym Control+Mod1+k exec "echo keyboard | socat - UNIX-CONNECT:$KT2MAPS_DATA_DIR/control.sock"
 EOF
 
-sleep 2
-
-i3 &
-sleep 2
-
-# Start Pure Maps backend
-flatpak run --command=osmscout-server io.github.rinigus.OSMScoutServer --listen &
-sleep 2
-
-
-# Start Pure Maps
-flatpak run io.github.rinigus.PureMaps &
-
-sleep 5
-
 # Copy the overlay script and make it executable
 cp /home/user/overlay.py /home/user/kiosk/native_overlay.py
 chmod +x /home/user/kiosk/native_overlay.py
+cp /home/user/ephemeris.py /home/user/solar_calculator.py /home/user/shadow_camera.py /home/user/map_server.py /home/user/places_index.py /home/user/wmm.py /home/user/history.py /home/user/workers.py /home/user/frame_sampler.py /home/user/telemetry.py /home/user/kiosk_supervisor.py /home/user/tile_prefetch.py /home/user/control_server.py /home/user/control_commands.py /home/user/storage.py /home/user/WMM.COF /home/user/kiosk/
 
-# Start the native transparent overlay
-python3 /home/user/kiosk/native_overlay.py &
-
-sleep 2
-
-onboard
-
-
-# Keep the session alive
-wait
\ No newline at end of file
+# Start i3, osmscout-server, Pure Maps, telemetry, the overlay and onboard as
+# soon as their dependencies are ready, and restart them if they crash;
+# the session ends with i3
+exec python3 /home/user/kiosk/kiosk_supervisor.py
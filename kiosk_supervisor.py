@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""Démarrage et surveillance des composants du kiosque.
+
+Remplace les pauses fixes de kiosk_setup.sh : chaque composant démarre dès
+que ceux dont il dépend sont prêts, et « prêt » correspond à un signal réel :
+le port d'osmscout-server accepte les connexions, la fenêtre de Pure Maps ou
+d'onboard est gérée par i3 (événements window de l'IPC i3), le socket IPC
+d'i3 répond. Les composants indépendants démarrent en parallèle.
+
+Un composant qui s'arrête est relancé avec une attente croissante (1 s, 2 s,
+4 s… jusqu'à une minute), remise à zéro après une minute de fonctionnement
+stable. La fin d'i3 (Ctrl+Alt+Échap) termine la session.
+
+La chronologie du démarrage est écrite dans le journal et ajoutée, une ligne
+JSON par démarrage, à ~/.cache/kt2maps/startup.jsonl : le temps jusqu'à une
+carte utilisable se compare ainsi d'un démarrage à l'autre.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import logging
+import argparse
+import threading
+import subprocess
+from storage import DATA_DIR
+
+TIMELINE_PATH = os.path.join(DATA_DIR, 'startup.jsonl')
+
+KIOSK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+OSMSCOUT_HOST = '127.0.0.1'
+OSMSCOUT_PORT = 8553
+
+# Longest wait for a readiness signal; dependents then start anyway
+READY_TIMEOUT = 90.0
+
+# Period of the checks that have no event to wait on (port, i3 socket)
+POLL_INTERVAL = 0.1
+
+# Restart delays: doubled after each crash, reset after a stable run
+RESTART_DELAY = 1.0
+RESTART_DELAY_MAX = 60.0
+STABLE_RUN = 60.0
+
+# Grace period between SIGTERM and SIGKILL at shutdown
+STOP_TIMEOUT = 5.0
+
+# i3 IPC message and event types
+I3_MAGIC = b'i3-ipc'
+I3_HEADER = struct.Struct('<II')
+I3_SUBSCRIBE = 2
+I3_GET_TREE = 4
+I3_EVENT_WINDOW = 0x80000003
+
+PUREMAPS_CLASS = 'io.github.rinigus.PureMaps'
+ONBOARD_CLASS = 'Onboard'
+
+logger = logging.getLogger('kt2maps.supervisor')
+
+
+class SupervisorError(RuntimeError):
+    """Composant impossible à lancer ou IPC i3 injoignable"""
+
+
+def uptime():
+    """Secondes écoulées depuis le démarrage du système (None hors Linux)"""
+    try:
+        with open('/proc/uptime') as handle:
+            return float(handle.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class I3Connection:
+    """Client minimal de l'IPC i3 (sans dépendance externe)"""
+
+    def __init__(self, path, timeout=None):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+
+    def close(self):
+        self.socket.close()
+
+    def _receive(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if not chunk:
+                raise SupervisorError("IPC i3 fermée")
+            data += chunk
+        return data
+
+    def send(self, message_type, payload=''):
+        payload = payload.encode()
+        self.socket.sendall(I3_MAGIC + I3_HEADER.pack(len(payload), message_type) + payload)
+
+    def read(self):
+        """(type, contenu JSON) du prochain message ou événement"""
+        header = self._receive(len(I3_MAGIC) + I3_HEADER.size)
+        length, message_type = I3_HEADER.unpack(header[len(I3_MAGIC):])
+        return message_type, json.loads(self._receive(length))
+
+    def request(self, message_type, payload=''):
+        self.send(message_type, payload)
+        return self.read()[1]
+
+    def subscribe(self, events):
+        reply = self.request(I3_SUBSCRIBE, json.dumps(events))
+        if not reply.get('success'):
+            raise SupervisorError(f"abonnement i3 refusé : {events}")
+
+
+def i3_socket_path():
+    """Chemin du socket IPC d'i3, ou None s'il n'est pas encore publié"""
+    path = os.environ.get('I3SOCK')
+    if path:
+        return path
+    try:
+        output = subprocess.run(['i3', '--get-socketpath'], capture_output=True,
+                                text=True, timeout=2).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output or None
+
+
+def tree_has_class(node, window_class):
+    properties = node.get('window_properties') or {}
+    if properties.get('class') == window_class:
+        return True
+    return any(tree_has_class(child, window_class)
+               for child in node.get('nodes', []) + node.get('floating_nodes', []))
+
+
+# Readiness checks: each returns True once ready, False on timeout
+
+def wait_until(check, timeout, stop):
+    deadline = time.monotonic() + timeout
+    while not stop.is_set():
+        if check():
+            return True
+        if time.monotonic() > deadline:
+            return False
+        stop.wait(POLL_INTERVAL)
+    return False
+
+
+def port_open(host, port):
+    try:
+        socket.create_connection((host, port), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+def i3_ready():
+    path = i3_socket_path()
+    if path is None:
+        return False
+    try:
+        I3Connection(path, timeout=1.0).close()
+    except OSError:
+        return False
+    os.environ['I3SOCK'] = path
+    return True
+
+
+def wait_for_window(window_class, timeout, stop):
+    """Attend qu'i3 gère une fenêtre de cette classe (déjà présente ou nouvelle)"""
+    path = i3_socket_path()
+    if path is None:
+        return False
+    deadline = time.monotonic() + timeout
+    events = I3Connection(path)
+    try:
+        # Subscribe before reading the tree, so a window mapped in between is not missed
+        events.subscribe(['window'])
+        tree = I3Connection(path, timeout=2.0)
+        try:
+            if tree_has_class(tree.request(I3_GET_TREE), window_class):
+                return True
+        finally:
+            tree.close()
+        while not stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Short timeouts so a shutdown request is noticed
+            events.socket.settimeout(min(remaining, 1.0))
+            try:
+                message_type, event = events.read()
+            except socket.timeout:
+                continue
+            container = event.get('container') or {}
+            if (message_type == I3_EVENT_WINDOW and event.get('change') in ('new', 'focus')
+                    and (container.get('window_properties') or {}).get('class') == window_class):
+                return True
+        return False
+    finally:
+        events.close()
+
+
+class Component:
+    """Processus surveillé : commande, dépendances, signal de disponibilité"""
+
+    def __init__(self, name, command, after=(), ready=None, essential=False, restart=True):
+        self.name = name
+        self.command = command
+        self.after = tuple(after)
+        # ready(stop) -> bool; None means ready as soon as the process is started
+        self.ready = ready
+        self.essential = essential
+        self.restart = restart
+        self.ready_event = threading.Event()
+        self.process = None
+        self.started_at = None
+        self.ready_at = None
+        # Last launch error, until the component starts and becomes ready
+        self.failed = None
+        self.restarts = 0
+
+
+def kiosk_components(kiosk_dir=KIOSK_DIR):
+    python = sys.executable or 'python3'
+    return [
+        Component('i3', ['i3'], ready=lambda stop: wait_until(i3_ready, READY_TIMEOUT, stop),
+                  essential=True),
+        Component('osmscout', ['flatpak', 'run', '--command=osmscout-server',
+                               'io.github.rinigus.OSMScoutServer', '--listen'],
+                  ready=lambda stop: wait_until(lambda: port_open(OSMSCOUT_HOST, OSMSCOUT_PORT),
+                                                READY_TIMEOUT, stop)),
+        Component('telemetry', ['nice', '-n', '19', python, os.path.join(kiosk_dir, 'telemetry.py'), 'run']),
+        # The window rules (fullscreen, floating keyboard) need i3 to be running
+        Component('puremaps', ['flatpak', 'run', 'io.github.rinigus.PureMaps'], after=('i3',),
+                  ready=lambda stop: wait_for_window(PUREMAPS_CLASS, READY_TIMEOUT, stop)),
+        Component('onboard', ['onboard'], after=('i3',),
+                  ready=lambda stop: wait_for_window(ONBOARD_CLASS, READY_TIMEOUT, stop)),
+        # The overlay bypasses the window manager: i3 sees no window, it is
+        # only started once the map is up so that it stays above it
+        Component('overlay', [python, os.path.join(kiosk_dir, 'native_overlay.py')],
+                  after=('i3', 'puremaps')),
+    ]
+
+
+class Supervisor:
+    # Milestone of the timeline: the map is shown and can find places
+    USABLE = ('osmscout', 'puremaps')
+
+    def __init__(self, components, timeline_path=TIMELINE_PATH):
+        self.components = {component.name: component for component in components}
+        for component in components:
+            unknown = set(component.after) - set(self.components)
+            if unknown:
+                raise SupervisorError(f"{component.name} dépend de composants inconnus : {sorted(unknown)}")
+        self.timeline_path = timeline_path
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.start_time = None
+        self.start_uptime = None
+        self.usable_at = None
+        self.timeline_written = False
+        self.threads = []
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def run(self):
+        self.start_time = time.monotonic()
+        self.start_uptime = uptime()
+        logger.info("démarrage du kiosque (%s s après le démarrage du système)",
+                    "?" if self.start_uptime is None else f"{self.start_uptime:.1f}")
+        for component in self.components.values():
+            thread = threading.Thread(target=self._supervise, args=(component,),
+                                      name=f'supervise-{component.name}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        try:
+            # Timed waits keep the main thread responsive to SIGTERM
+            while not self.stop_event.wait(1.0):
+                pass
+        finally:
+            self.shutdown()
+
+    def request_stop(self, *_):
+        self.stop_event.set()
+
+    def _supervise(self, component):
+        for name in component.after:
+            while not self.components[name].ready_event.wait(1.0):
+                if self.stop_event.is_set():
+                    return
+        delay = RESTART_DELAY
+        while not self.stop_event.is_set():
+            launched = time.monotonic()
+            try:
+                self._launch(component)
+            except OSError as error:
+                logger.error("%s : lancement impossible (%s)", component.name, error)
+                self._mark_failed(component, error)
+            else:
+                if not component.ready_event.is_set() or component.failed is not None:
+                    self._wait_ready(component)
+                code = component.process.wait()
+                if self.stop_event.is_set():
+                    return
+                logger.warning("%s s'est arrêté (code %s)", component.name, code)
+            if component.essential:
+                logger.info("%s terminé : fin de la session", component.name)
+                self.stop_event.set()
+                return
+            if not component.restart:
+                return
+            if time.monotonic() - launched > STABLE_RUN:
+                delay = RESTART_DELAY
+            logger.info("%s relancé dans %.0f s", component.name, delay)
+            if self.stop_event.wait(delay):
+                return
+            delay = min(delay * 2, RESTART_DELAY_MAX)
+            component.restarts += 1
+
+    def _launch(self, component):
+        # Own process group, so flatpak's children are stopped along with it
+        component.process = subprocess.Popen(component.command, start_new_session=True)
+        if component.started_at is None:
+            component.started_at = self.elapsed()
+            logger.info("%6.2f s  %s lancé (pid %d)", component.started_at, component.name,
+                        component.process.pid)
+
+    def _wait_ready(self, component):
+        ready = True
+        if component.ready is not None:
+            try:
+                ready = component.ready(self.stop_event)
+            except (OSError, SupervisorError, ValueError) as error:
+                logger.warning("%s : attente de disponibilité en échec (%s)", component.name, error)
+                ready = False
+        if self.stop_event.is_set():
+            return
+        component.ready_at = self.elapsed()
+        component.failed = None
+        if ready:
+            logger.info("%6.2f s  %s prêt", component.ready_at, component.name)
+        else:
+            logger.warning("%6.2f s  %s toujours pas prêt, la suite démarre quand même",
+                           component.ready_at, component.name)
+        component.ready_event.set()
+        self._check_milestones()
+
+    def _mark_failed(self, component, error):
+        """Composant impossible à lancer : ceux qui en dépendent démarrent quand même"""
+        component.failed = str(error)
+        if not component.ready_event.is_set():
+            component.ready_event.set()
+            self._check_milestones()
+
+    def _check_milestones(self):
+        with self.lock:
+            usable = [self.components[name] for name in self.USABLE if name in self.components]
+            if self.usable_at is None and all(component.ready_event.is_set() and component.failed is None
+                                              for component in usable):
+                self.usable_at = self.elapsed()
+                logger.info("%6.2f s  carte utilisable", self.usable_at)
+            if not self.timeline_written and all(component.ready_event.is_set()
+                                                 for component in self.components.values()):
+                self.timeline_written = True
+                self._write_timeline()
+
+    def timeline(self):
+        return {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'uptime_at_start': self.start_uptime,
+            'usable': self.usable_at,
+            'components': {name: {'started': component.started_at, 'ready': component.ready_at,
+                                  'failed': component.failed}
+                           for name, component in self.components.items()},
+        }
+
+    def _write_timeline(self):
+        timeline = self.timeline()
+        for name, times in timeline['components'].items():
+            if times['failed'] is not None:
+                logger.info("chronologie  %-10s en échec : %s", name, times['failed'])
+                continue
+            logger.info("chronologie  %-10s lancé %6.2f s  prêt %6.2f s", name,
+                        times['started'] or 0.0, times['ready'] or 0.0)
+        try:
+            os.makedirs(os.path.dirname(self.timeline_path), exist_ok=True)
+            with open(self.timeline_path, 'a') as handle:
+                handle.write(json.dumps(timeline) + '\n')
+        except OSError as error:
+            logger.warning("chronologie non enregistrée : %s", error)
+
+    def shutdown(self):
+        # Reverse start order: the overlay and the map go before i3
+        running = [component.process for component in reversed(list(self.components.values()))
+                   if component.process is not None and component.process.poll() is None]
+        for process in running:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except OSError:
+                pass
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for process in running:
+            try:
+                process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        logger.info("kiosque arrêté")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Démarrage et surveillance des composants du kiosque")
+    parser.add_argument('--kiosk-dir', default=KIOSK_DIR, help="scripts de l'overlay (défaut : %(default)s)")
+    parser.add_argument('--without', nargs='+', default=[], metavar='COMPOSANT',
+                        help="composants à ne pas lancer (ex. telemetry)")
+    parser.add_argument('--timeline', default=TIMELINE_PATH, help="historique des démarrages (défaut : %(default)s)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    components = [component for component in kiosk_components(args.kiosk_dir)
+                  if component.name not in args.without]
+    # Dependencies on components left out are dropped rather than waited for
+    names = {component.name for component in components}
+    for component in components:
+        component.after = tuple(name for name in component.after if name in names)
+    supervisor = Supervisor(components, args.timeline)
+    signal.signal(signal.SIGTERM, supervisor.request_stop)
+    signal.signal(signal.SIGINT, supervisor.request_stop)
+    supervisor.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
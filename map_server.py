@@ -0,0 +1,126 @@
+"""Envoi d'une position vers la carte locale (OSM Scout Server et Pure Maps).
+
+kiosk_setup.sh lance osmscout-server avec --listen : il répond en HTTP sur
+localhost. Le client garde une seule connexion keep-alive ouverte et un cache
+LRU borné des lieux déjà trouvés, si bien qu'un nouveau calcul au même
+endroit ne paie ni l'établissement de la connexion ni la recherche.
+"""
+
+import json
+import threading
+import subprocess
+import http.client
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8553
+
+# Nearby-place lookup of osmscout-server (POI guide around a point)
+GUIDE_PATH = '/v1/guide'
+
+# Coordinates are rounded to ~100 m to build cache keys
+CACHE_PRECISION = 3
+
+PUREMAPS_COMMAND = ['flatpak', 'run', 'io.github.rinigus.PureMaps']
+
+
+class MapServerError(RuntimeError):
+    """Serveur de carte injoignable ou réponse invalide"""
+
+
+class OSMScoutClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=2.0,
+                 cache_size=256, radius=20000, poitype='city'):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.radius = radius
+        self.poitype = poitype
+        self.connection = None
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self.connection
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def get_json(self, path, params):
+        """GET sur la connexion persistante, avec une reconnexion si le serveur l'a fermée"""
+        url = f"{path}?{urlencode(params)}"
+        with self.lock:
+            for attempt in range(2):
+                connection = self._connect()
+                try:
+                    connection.request('GET', url, headers={'Connection': 'keep-alive'})
+                    response = connection.getresponse()
+                    body = response.read()
+                except (http.client.HTTPException, ConnectionError, OSError) as error:
+                    connection.close()
+                    self.connection = None
+                    if attempt:
+                        raise MapServerError(f"Serveur de carte injoignable : {error}") from error
+                    continue
+                if response.will_close:
+                    connection.close()
+                    self.connection = None
+                if response.status != 200:
+                    raise MapServerError(f"Réponse {response.status} du serveur de carte")
+                try:
+                    return json.loads(body)
+                except ValueError as error:
+                    raise MapServerError("Réponse illisible du serveur de carte") from error
+
+    def reverse_geocode(self, latitude, longitude):
+        """Lieu habité le plus proche : dictionnaire (name, latitude, longitude, distance) ou None"""
+        key = (round(latitude, CACHE_PRECISION), round(longitude, CACHE_PRECISION))
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+
+        reply = self.get_json(GUIDE_PATH, {
+            'lat': f"{latitude:.6f}",
+            'lng': f"{longitude:.6f}",
+            'radius': self.radius,
+            'poitype': self.poitype,
+            'limit': 1
+        })
+        results = reply.get('results', []) if isinstance(reply, dict) else []
+        place = None
+        if results:
+            first = results[0]
+            place = {
+                'name': first.get('title') or first.get('name', ''),
+                'latitude': first.get('lat'),
+                'longitude': first.get('lng'),
+                'distance': first.get('distance')
+            }
+
+        with self.lock:
+            self.cache[key] = place
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return place
+
+
+def center_map(latitude, longitude):
+    """Centre Pure Maps sur la position (URI geo: transmise à l'instance en cours)"""
+    try:
+        subprocess.Popen(PUREMAPS_COMMAND + [f"geo:{latitude:.6f},{longitude:.6f}"],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as error:
+        raise MapServerError(f"Impossible de joindre Pure Maps : {error}") from error
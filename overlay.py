@@ -1,95 +1,358 @@
 import sys
-import math
+import os
+import time
+import json
+import logging
+import argparse
 from datetime import datetime, timezone
+from collections import OrderedDict
+import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QLabel, QLineEdit, 
                             QFormLayout, QTextEdit, QScrollArea, QDialog,
                             QDoubleSpinBox, QSpinBox, QTimeEdit, QDateEdit,
                             QMessageBox, QFrame, QGroupBox, QGridLayout,
-                            QTabWidget)
-from PyQt5.QtCore import Qt, QTime, QDate, pyqtSlot, QTimer
-from PyQt5.QtGui import QFont, QPalette, QColor, QPixmap, QPainter, QBrush, QLinearGradient
+                            QTabWidget, QCheckBox, QFileDialog, QProgressBar)
+from PyQt5.QtCore import Qt, QTime, QDate, pyqtSlot, pyqtSignal, QTimer, QRectF
+from PyQt5.QtDBus import QDBusConnection, QDBusMessage
+from PyQt5.QtGui import (QFont, QPalette, QColor, QPixmap, QPainter, QBrush, QLinearGradient, QImage,
+                         QPainterPath, QRegion)
+from solar_calculator import SolarGeolocationCalculator
+import shadow_camera
+import map_server
+import places_index
+import wmm
+import history
+import telemetry
+import tile_prefetch
+from workers import CalculationRunner, scaled_progress
+from frame_sampler import FrameSampler
+from control_server import ControlServer, CommandError, SOCKET_PATH
 
-class SolarGeolocationCalculator:
-    @staticmethod
-    def to_radians(degrees):
-        return degrees * math.pi / 180
+logger = logging.getLogger('kt2maps.overlay')
+
+# Live mode: delay after the last change before recalculating (ms)
+LIVE_DELAY_MS = 300
+
+# Inputs used by the uncertainty estimate only
+UNCERTAINTY_INPUTS = ('length_error', 'azimuth_error', 'time_error')
+
+# Results kept per set of inputs, so going back to earlier values is instant
+RESULT_CACHE_SIZE = 32
+
+# Global search winner closer than this to the solver's fix is the same position (degrees)
+SAME_POSITION_DEGREES = 0.01
+
+# Solver results that only describe the solver's own position
+SOLVER_DIAGNOSTICS = ('converged', 'iterations', 'residual', 'solve_time', 'declination_passes',
+                      'chi2', 'reduced_chi2', 'covariance', 'semi_major', 'semi_minor', 'orientation',
+                      'residuals', 'inliers', 'alternative', 'ambiguous')
+
+# Rendering of the floating button over the map, cheapest first
+RENDER_MODES = ('opaque', 'mask', 'translucent')
+
+# D-Bus interface of the onboard virtual keyboard
+ONBOARD_SERVICE = 'org.onboard.Onboard'
+ONBOARD_PATH = '/org/onboard/Onboard/Keyboard'
+ONBOARD_INTERFACE = 'org.onboard.Onboard.Keyboard'
+
+# Feuille de style unique, analysée une fois pour toute l'application
+APP_STYLESHEET = """
+    QDialog {
+        background-color: #f8f9fa;
+    }
+    QGroupBox {
+        font-weight: bold;
+        border: 2px solid #dee2e6;
+        border-radius: 10px;
+        margin-top: 1ex;
+        padding-top: 15px;
+        background-color: white;
+        font-size: 14px;
+    }
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        left: 15px;
+        padding: 0 10px 0 10px;
+        color: #495057;
+        font-size: 15px;
+    }
+    QFormLayout QLabel {
+        font-weight: 600;
+        color: #444;
+        font-size: 14px;
+    }
+    QDoubleSpinBox, QSpinBox, QTimeEdit, QDateEdit {
+        padding: 8px;
+        border: 2px solid #ddd;
+        border-radius: 5px;
+        font-size: 14px;
+        background-color: white;
+        min-height: 20px;
+    }
+    QDoubleSpinBox:focus, QSpinBox:focus, QTimeEdit:focus, QDateEdit:focus {
+        border-color: #667eea;
+    }
+    QTextEdit {
+        border: 2px solid #ddd;
+        border-radius: 5px;
+        background-color: #f8f9fa;
+        font-family: 'Courier New', monospace;
+        font-size: 13px;
+    }
+    QScrollArea {
+        border: none;
+        background-color: transparent;
+    }
+    QLabel#title {
+        font-size: 24px;
+        font-weight: bold;
+        padding: 15px;
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
+                                  stop:0 #667eea, stop:1 #764ba2);
+        color: white;
+        border-radius: 10px;
+        margin-bottom: 10px;
+    }
+    QLabel[role="material"] {
+        padding: 5px;
+        font-size: 14px;
+    }
+    QLabel[role="step"] {
+        padding: 10px;
+        font-size: 14px;
+    }
+    QLabel[role="tip"] {
+        padding: 3px;
+        font-size: 14px;
+    }
+    QPushButton#calculate {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
+                                  stop:0 #667eea, stop:1 #764ba2);
+        color: white;
+        border: none;
+        padding: 15px;
+        border-radius: 8px;
+        font-size: 16px;
+        font-weight: bold;
+        min-height: 20px;
+    }
+    QPushButton#calculate:hover {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
+                                  stop:0 #5a6fd8, stop:1 #6a4190);
+    }
+    QPushButton[role="result"] {
+        background-color: #28a745;
+        color: white;
+        border: none;
+        padding: 10px;
+        border-radius: 5px;
+        font-weight: bold;
+        min-height: 15px;
+    }
+    QPushButton[role="result"]:hover {
+        background-color: #218838;
+    }
+    QPushButton[role="result"]:disabled {
+        background-color: #cccccc;
+    }
+    QPushButton#close {
+        background-color: #6c757d;
+        color: white;
+        border: none;
+        padding: 12px 30px;
+        border-radius: 5px;
+        font-weight: bold;
+        min-height: 15px;
+    }
+    QPushButton#close:hover {
+        background-color: #545b62;
+    }
+    QMainWindow, QWidget#overlay {
+        background: transparent;
+        border: none;
+    }
+    QPushButton#tutorial {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
+                                  stop:0 #667eea, stop:1 #764ba2);
+        color: white;
+        padding: 8px 16px;
+        font-size: 14px;
+        font-weight: bold;
+        min-height: 25px;
+        margin: 0px;
+        border: 0px;
+    }
+    QPushButton#tutorial:hover {
+        background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
+                                  stop:0 #5a6fd8, stop:1 #6a4190);
+    }
+"""
+
+
+def process_rss():
+    """Mémoire résidente du processus, en octets (0 si /proc est indisponible)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def toggle_keyboard():
+    """Affiche ou masque onboard par D-Bus, sans attendre sa réponse"""
+    bus = QDBusConnection.sessionBus()
+    if not bus.isConnected():
+        raise CommandError("bus D-Bus de session indisponible")
+    message = QDBusMessage.createMethodCall(ONBOARD_SERVICE, ONBOARD_PATH, ONBOARD_INTERFACE, 'ToggleVisible')
+    if not bus.send(message):
+        raise CommandError(f"onboard injoignable : {bus.lastError().message()}")
+
+
+def qimage_to_array(image):
+    """Copie d'une QImage en tableau RGB (hauteur, largeur, 3)"""
+    image = image.convertToFormat(QImage.Format_RGB888)
+    width, height = image.width(), image.height()
+    pointer = image.constBits()
+    pointer.setsize(image.byteCount())
+    rows = np.frombuffer(pointer, dtype=np.uint8).reshape(height, image.bytesPerLine())
+    return rows[:, :width * 3].reshape(height, width, 3).copy()
+
+
+def best_candidate(results, search):
+    """Remplace la position par le meilleur candidat de la recherche globale.
+
+    Si le candidat est une autre position que celle du solveur, les
+    diagnostics du solveur (convergence, résidus, ellipse) ne la décrivent
+    pas : ils sont remplacés par ceux de l'affinage du candidat.
+    """
+    if not search['candidates']:
+        return results
+    best = search['candidates'][0]
+    if (abs(best['latitude'] - results['latitude']) < SAME_POSITION_DEGREES
+            and abs((best['longitude'] - results['longitude'] + 180) % 360 - 180) < SAME_POSITION_DEGREES):
+        return results
+    results = {name: value for name, value in results.items() if name not in SOLVER_DIAGNOSTICS}
+    results.update(latitude=best['latitude'], longitude=best['longitude'],
+                   misfit=best['misfit'], iterations=best['iterations'])
+    return results
+
+
+def run_global_search(inputs, heights, lengths, azimuths, timestamps, magnetic_declination, progress):
+    return SolarGeolocationCalculator.global_search(
+        heights, lengths, azimuths, np.array(timestamps), magnetic_declination,
+        length_error=max(inputs['length_error'], 1e-4),
+        azimuth_error=max(inputs['azimuth_error'], 0.1),
+        progress=progress
+    )
+
+
+def solve_single(inputs, progress):
+    """Calcul d'une mesure unique, exécuté hors du thread de l'interface"""
+    results = SolarGeolocationCalculator.calculate_position(
+        inputs['stick_height'], inputs['shadow_length'], inputs['shadow_azimuth'],
+        inputs['utc_time'], inputs['date'], inputs['magnetic_declination'],
+        refine_declination=inputs['auto_declination']
+    )
+    magnetic_declination = results['magnetic_declination']
+    progress(0.05)
     
-    @staticmethod
-    def to_degrees(radians):
-        return radians * 180 / math.pi
+    # Share of the progress bar: Monte Carlo first, then the global search
+    search_start = 0.5 if inputs['uncertainty'] else 0.05
+    uncertainty = None
+    if inputs['uncertainty']:
+        uncertainty = SolarGeolocationCalculator.estimate_uncertainty(
+            inputs['stick_height'], inputs['shadow_length'], inputs['shadow_azimuth'],
+            inputs['timestamp'], magnetic_declination,
+            length_error=inputs['length_error'],
+            azimuth_error=inputs['azimuth_error'],
+            time_error=inputs['time_error'],
+            progress=scaled_progress(progress, 0.05, search_start if inputs['global_search'] else 1.0)
+        )
     
-    @staticmethod
-    def calculate_position(stick_height, shadow_length, shadow_azimuth, 
-                          utc_time, date, magnetic_declination):
-        
-        # Convert UTC time to decimal hours
-        utc_decimal = utc_time.hour() + utc_time.minute() / 60.0
-        
-        # Calculate day of year
-        day_of_year = date.dayOfYear()
-        
-        # Solar declination
-        declination = 23.45 * math.sin(SolarGeolocationCalculator.to_radians(360 * (284 + day_of_year) / 365))
-        
-        # Sun elevation angle
-        elevation = math.atan(stick_height / shadow_length)
-        elevation_deg = SolarGeolocationCalculator.to_degrees(elevation)
-        
-        # Correct azimuth for magnetic declination
-        true_azimuth = shadow_azimuth + magnetic_declination
-        # Shadow azimuth is opposite to sun azimuth
-        sun_azimuth = (true_azimuth + 180) % 360
-        
-        # Initial estimates
-        longitude = 0
-        latitude = 0
-        
-        # Iterative method to solve for latitude and longitude
-        for i in range(5):
-            # Hour angle
-            hour_angle = 15 * (utc_decimal - 12 + longitude / 15)
-            
-            # Calculate latitude
-            sin_elevation = math.sin(elevation)
-            sin_declination = math.sin(SolarGeolocationCalculator.to_radians(declination))
-            cos_declination = math.cos(SolarGeolocationCalculator.to_radians(declination))
-            cos_hour_angle = math.cos(SolarGeolocationCalculator.to_radians(hour_angle))
-            
-            sin_latitude = (sin_elevation - cos_declination * cos_hour_angle) / sin_declination
-            sin_latitude = max(-1, min(1, sin_latitude))  # Clamp to [-1, 1]
-            latitude = SolarGeolocationCalculator.to_degrees(math.asin(sin_latitude))
-            
-            # Calculate theoretical sun azimuth
-            cos_elevation = math.cos(elevation)
-            cos_latitude = math.cos(SolarGeolocationCalculator.to_radians(latitude))
-            sin_latitude2 = math.sin(SolarGeolocationCalculator.to_radians(latitude))
-            
-            cos_azimuth = (sin_declination - sin_elevation * sin_latitude2) / (cos_elevation * cos_latitude)
-            cos_azimuth = max(-1, min(1, cos_azimuth))  # Clamp to [-1, 1]
-            theoretical_azimuth = SolarGeolocationCalculator.to_degrees(math.acos(cos_azimuth))
-            
-            # Adjust for correct quadrant
-            if hour_angle > 0:
-                theoretical_azimuth = 360 - theoretical_azimuth
-            
-            # Longitude correction based on azimuth error
-            azimuth_error = sun_azimuth - theoretical_azimuth
-            longitude += azimuth_error / 4  # Convergence factor
-        
-        return {
-            'latitude': latitude,
-            'longitude': longitude,
-            'elevation': elevation_deg,
-            'declination': declination,
-            'sun_azimuth': sun_azimuth,
-            'day_of_year': day_of_year
-        }
+    search = None
+    if inputs['global_search']:
+        search = run_global_search(
+            inputs, [inputs['stick_height']], [inputs['shadow_length']], [inputs['shadow_azimuth']],
+            [inputs['timestamp']], magnetic_declination, scaled_progress(progress, search_start, 1.0)
+        )
+        results = best_candidate(results, search)
+    
+    return {'results': results, 'uncertainty': uncertainty, 'search': search,
+            'solver': 'newton_solve', 'magnetic_declination': magnetic_declination}
+
+
+def solve_combined(inputs, progress):
+    """Ajustement de plusieurs mesures, exécuté hors du thread de l'interface"""
+    heights, lengths, azimuths, timestamps = zip(*inputs['observations'])
+    magnetic_declination = inputs['magnetic_declination']
+    
+    def fit(magnetic_declination):
+        return SolarGeolocationCalculator.fit_observations(
+            heights, lengths, azimuths, np.array(timestamps), magnetic_declination,
+            length_error=max(inputs['length_error'], 1e-4),
+            azimuth_error=max(inputs['azimuth_error'], 0.1)
+        )
+    
+    results = fit(magnetic_declination)
+    if inputs['auto_declination']:
+        # Declination at the first fit, then one more fit with it
+        magnetic_declination = float(wmm.declination(
+            results['latitude'], results['longitude'], timestamps[0]
+        ))
+        results = fit(magnetic_declination)
+    progress(0.1)
+    
+    search = None
+    if inputs['global_search']:
+        search = run_global_search(inputs, heights, lengths, azimuths, timestamps,
+                                   magnetic_declination, scaled_progress(progress, 0.1, 1.0))
+        results = best_candidate(results, search)
+    
+    # The fit's ellipse is only shown while the fit's position is kept
+    uncertainty = results if 'semi_major' in results else None
+    return {'results': results, 'uncertainty': uncertainty, 'search': search,
+            'solver': 'fit_observations', 'magnetic_declination': magnetic_declination}
+
+
+def calculation_key(inputs):
+    """Clé du cache des résultats : les entrées qui changent le calcul demandé"""
+    # With the automatic declination, the value shown is only a starting
+    # point that the solve overwrites; the measurement errors only matter
+    # to the uncertainty estimate
+    return tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in sorted(inputs.items())
+        if not (name == 'magnetic_declination' and inputs['auto_declination'])
+        and not (name in UNCERTAINTY_INPUTS and not inputs['uncertainty'])
+    )
+
+
+def live_inputs(inputs):
+    """Aperçu en direct : la position seule, l'incertitude et la recherche globale attendent « Calculer »"""
+    return dict(inputs, uncertainty=False, global_search=False)
+
+
+def nearest_place(client, latitude, longitude, progress):
+    """Lieu le plus proche (ou None), cherché hors du thread de l'interface"""
+    try:
+        return client.reverse_geocode(latitude, longitude)
+    except map_server.MapServerError as error:
+        logger.info("lieu le plus proche indisponible : %s", error)
+        return None
+
 
 class TutorialDialog(QDialog):
-    def __init__(self, parent=None):
+    # Dernière position affichée (latitude, longitude, rayon, solveur, date)
+    fix_computed = pyqtSignal(object)
+    
+    def __init__(self, parent=None, history_store=None):
         super().__init__(parent)
         
+        # Historique des mesures (None si la base est inaccessible)
+        self.history_store = history_store
+        self.session_id = None
+        
         self.setFixedSize(650, 350)
         
         self.setWindowFlags(Qt.WindowType.Window | Qt.WindowType.WindowCloseButtonHint)
@@ -104,7 +367,44 @@ class TutorialDialog(QDialog):
         
         self.center_on_screen()
         
+        # Calculs en arrière-plan : l'interface reste fluide pendant le calcul
+        self.runner = CalculationRunner(self)
+        # Rafale de la caméra, annulable indépendamment du calcul
+        self.camera_runner = CalculationRunner(self)
+        # Recherche du lieu le plus proche sur osmscout-server
+        self.geocode_runner = CalculationRunner(self)
+        
         self.setup_ui()
+        
+        self.runner.progress.connect(self.show_progress)
+        self.runner.finished.connect(self.show_calculation)
+        self.runner.failed.connect(self.show_calculation_error)
+        self.runner.cancelled.connect(self.hide_progress)
+        self.finished.connect(self.runner.cancel)
+        
+        self.camera_runner.progress.connect(self.show_camera_progress)
+        self.camera_runner.finished.connect(self.finish_camera_measurement)
+        self.camera_runner.failed.connect(self.camera_measurement_failed)
+        self.camera_runner.cancelled.connect(self.hide_camera_progress)
+        self.finished.connect(self.camera_runner.cancel)
+        
+        self.geocode_runner.finished.connect(self.show_nearest_place)
+        self.finished.connect(self.geocode_runner.cancel)
+        
+        # Mode direct : recalcul peu après la dernière modification
+        self.result_cache = OrderedDict()
+        self.calculation_live = False
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(LIVE_DELAY_MS)
+        self.live_timer.timeout.connect(self.calculate_live)
+        
+        # Un calcul lancé avec des valeurs modifiées depuis est abandonné
+        for signal in (self.stick_height.valueChanged, self.shadow_length.valueChanged,
+                       self.shadow_azimuth.valueChanged, self.utc_time.timeChanged,
+                       self.date_edit.dateChanged, self.magnetic_declination.valueChanged):
+            signal.connect(self.runner.cancel)
+            signal.connect(self.schedule_live_calculation)
     
     def center_on_screen(self):
         """Centre la fenêtre sur l'écran principal"""
@@ -128,19 +428,7 @@ class TutorialDialog(QDialog):
         
         # Title
         title_label = QLabel("Géolocalisation par Ombre Solaire")
-        title_label.setStyleSheet("""
-            QLabel {
-                font-size: 24px;
-                font-weight: bold;
-                color: #2c3e50;
-                padding: 15px;
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
-                                          stop:0 #667eea, stop:1 #764ba2);
-                color: white;
-                border-radius: 10px;
-                margin-bottom: 10px;
-            }
-        """)
+        title_label.setObjectName("title")
         title_label.setAlignment(Qt.AlignCenter)
         scroll_layout.addWidget(title_label)
         
@@ -158,7 +446,7 @@ class TutorialDialog(QDialog):
         
         for material in materials:
             label = QLabel(material)
-            label.setStyleSheet("QLabel { padding: 5px; font-size: 14px; }")
+            label.setProperty("role", "material")
             material_layout.addWidget(label)
         
         scroll_layout.addWidget(material_group)
@@ -186,8 +474,10 @@ class TutorialDialog(QDialog):
              "Date : Notez la date exacte car la position du soleil varie."),
             
             ("Déclinaison magnétique (optionnel)",
-             "Recherchez la déclinaison magnétique de votre région.\n\n"
-             "En France métropolitaine : généralement entre 0° et 2° Est."),
+             "Cochez « Déclinaison automatique » : elle est calculée par le modèle "
+             "magnétique mondial (WMM) à la position trouvée.\n\n"
+             "Sinon, saisissez celle de votre région (France métropolitaine : "
+             "généralement entre 0° et 2° Est)."),
             
             ("Calcul",
              "Saisissez toutes vos mesures dans le formulaire ci-dessous et cliquez sur "
@@ -201,7 +491,7 @@ class TutorialDialog(QDialog):
             
             desc_label = QLabel(desc)
             desc_label.setWordWrap(True)
-            desc_label.setStyleSheet("QLabel { padding: 10px; font-size: 14px; line-height: 1.4; }")
+            desc_label.setProperty("role", "step")
             step_layout.addWidget(desc_label)
             
             scroll_layout.addWidget(step_group)
@@ -220,7 +510,7 @@ class TutorialDialog(QDialog):
         
         for tip in tips:
             label = QLabel(tip)
-            label.setStyleSheet("QLabel { padding: 3px; font-size: 14px; }")
+            label.setProperty("role", "tip")
             tips_layout.addWidget(label)
         
         scroll_layout.addWidget(tips_group)
@@ -251,6 +541,29 @@ class TutorialDialog(QDialog):
         self.shadow_azimuth.setSuffix("°")
         form_layout.addRow("Azimut de l'ombre:", self.shadow_azimuth)
         
+        # Automatic shadow measurement from a photo or the Pi camera
+        measure_layout = QHBoxLayout()
+        photo_btn = QPushButton("Mesurer depuis une photo")
+        photo_btn.clicked.connect(self.measure_from_photo)
+        measure_layout.addWidget(photo_btn)
+        self.camera_btn = QPushButton("Mesurer avec la caméra")
+        self.camera_btn.clicked.connect(self.measure_from_camera)
+        self.camera_btn.setEnabled(shadow_camera.camera_available())
+        measure_layout.addWidget(self.camera_btn)
+        form_layout.addRow(measure_layout)
+        
+        # Progress of the camera burst
+        camera_progress_layout = QHBoxLayout()
+        self.camera_progress = QProgressBar()
+        self.camera_progress.setRange(0, 100)
+        camera_progress_layout.addWidget(self.camera_progress)
+        self.camera_cancel_btn = QPushButton("Annuler")
+        self.camera_cancel_btn.clicked.connect(self.camera_runner.cancel)
+        camera_progress_layout.addWidget(self.camera_cancel_btn)
+        form_layout.addRow(camera_progress_layout)
+        self.camera_progress.hide()
+        self.camera_cancel_btn.hide()
+        
         # UTC time
         self.utc_time = QTimeEdit()
         self.utc_time.setDisplayFormat("HH:mm")
@@ -272,30 +585,84 @@ class TutorialDialog(QDialog):
         self.magnetic_declination.setSuffix("°")
         form_layout.addRow("Déclinaison magnétique:", self.magnetic_declination)
         
+        # Declination from the World Magnetic Model, refined with the fix
+        self.auto_declination = QCheckBox("Déclinaison automatique (modèle WMM)")
+        if wmm.default_model() is None:
+            self.auto_declination.setEnabled(False)
+            self.auto_declination.setToolTip(f"Fichier {wmm.COEFFICIENTS_NAME} introuvable")
+        else:
+            self.auto_declination.setChecked(True)
+            self.magnetic_declination.setEnabled(False)
+        self.auto_declination.toggled.connect(
+            lambda checked: self.magnetic_declination.setEnabled(not checked)
+        )
+        form_layout.addRow(self.auto_declination)
+        
+        # Whole-Earth search, to detect several possible positions
+        self.global_search_enabled = QCheckBox("Recherche globale (toutes les positions possibles)")
+        form_layout.addRow(self.global_search_enabled)
+        
+        # Recalculate while the values are being adjusted
+        self.live_enabled = QCheckBox("Calcul en direct")
+        self.live_enabled.setChecked(True)
+        form_layout.addRow(self.live_enabled)
+        
         scroll_layout.addWidget(form_group)
         
+        # Measurement errors for the uncertainty mode
+        uncertainty_group = QGroupBox("Précision des mesures")
+        uncertainty_layout = QFormLayout(uncertainty_group)
+        uncertainty_layout.setSpacing(10)
+        
+        self.uncertainty_enabled = QCheckBox("Estimer l'incertitude de la position")
+        self.uncertainty_enabled.setChecked(True)
+        uncertainty_layout.addRow(self.uncertainty_enabled)
+        
+        self.length_error = QDoubleSpinBox()
+        self.length_error.setDecimals(1)
+        self.length_error.setRange(0, 50)
+        self.length_error.setValue(1.0)
+        self.length_error.setPrefix("± ")
+        self.length_error.setSuffix(" cm")
+        uncertainty_layout.addRow("Mètre ruban:", self.length_error)
+        
+        self.azimuth_error = QDoubleSpinBox()
+        self.azimuth_error.setDecimals(1)
+        self.azimuth_error.setRange(0, 45)
+        self.azimuth_error.setValue(2.0)
+        self.azimuth_error.setPrefix("± ")
+        self.azimuth_error.setSuffix("°")
+        uncertainty_layout.addRow("Boussole:", self.azimuth_error)
+        
+        self.time_error = QSpinBox()
+        self.time_error.setRange(0, 600)
+        self.time_error.setValue(30)
+        self.time_error.setPrefix("± ")
+        self.time_error.setSuffix(" s")
+        uncertainty_layout.addRow("Montre:", self.time_error)
+        
+        scroll_layout.addWidget(uncertainty_group)
+        
         # Calculate button
         calc_btn = QPushButton("Calculer ma position")
         calc_btn.clicked.connect(self.calculate_position)
-        calc_btn.setStyleSheet("""
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
-                                          stop:0 #667eea, stop:1 #764ba2);
-                color: white;
-                border: none;
-                padding: 15px;
-                border-radius: 8px;
-                font-size: 16px;
-                font-weight: bold;
-                min-height: 20px;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
-                                          stop:0 #5a6fd8, stop:1 #6a4190);
-            }
-        """)
+        calc_btn.setObjectName("calculate")
         scroll_layout.addWidget(calc_btn)
         
+        # Several readings a few minutes apart are fitted together
+        self.observations = []
+        observations_layout = QHBoxLayout()
+        add_observation_btn = QPushButton("Ajouter cette mesure")
+        add_observation_btn.clicked.connect(self.add_observation)
+        observations_layout.addWidget(add_observation_btn)
+        clear_observations_btn = QPushButton("Effacer les mesures")
+        clear_observations_btn.clicked.connect(self.clear_observations)
+        observations_layout.addWidget(clear_observations_btn)
+        self.observations_label = QLabel()
+        observations_layout.addWidget(self.observations_label)
+        scroll_layout.addLayout(observations_layout)
+        self.update_observations_label()
+        
         # Results area
         self.results_group = QGroupBox("Résultats")
         results_layout = QVBoxLayout(self.results_group)
@@ -305,29 +672,33 @@ class TutorialDialog(QDialog):
         self.results_text.setMaximumHeight(150)
         results_layout.addWidget(self.results_text)
         
+        # Progress of the background calculation
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        progress_layout.addWidget(self.progress_bar)
+        self.cancel_btn = QPushButton("Annuler")
+        self.cancel_btn.clicked.connect(self.runner.cancel)
+        progress_layout.addWidget(self.cancel_btn)
+        results_layout.addLayout(progress_layout)
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+        
         # Copy button
         self.copy_btn = QPushButton("Copier les coordonnées")
         self.copy_btn.clicked.connect(self.copy_coordinates)
         self.copy_btn.setEnabled(False)
-        self.copy_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #28a745;
-                color: white;
-                border: none;
-                padding: 10px;
-                border-radius: 5px;
-                font-weight: bold;
-                min-height: 15px;
-            }
-            QPushButton:hover {
-                background-color: #218838;
-            }
-            QPushButton:disabled {
-                background-color: #cccccc;
-            }
-        """)
+        self.copy_btn.setProperty("role", "result")
         results_layout.addWidget(self.copy_btn)
         
+        # Send the fix to the local map server and center Pure Maps on it
+        self.map_client = None
+        self.map_btn = QPushButton("Afficher sur la carte")
+        self.map_btn.clicked.connect(self.send_to_map)
+        self.map_btn.setEnabled(False)
+        self.map_btn.setProperty("role", "result")
+        results_layout.addWidget(self.map_btn)
+        
         scroll_layout.addWidget(self.results_group)
         self.results_group.hide()
         
@@ -335,74 +706,144 @@ class TutorialDialog(QDialog):
         scroll.setWidget(scroll_widget)
         layout.addWidget(scroll)
         
+        # Ressources du kiosque relevées par le démon de télémétrie
+        self.system_label = QLabel()
+        self.system_label.setProperty("role", "tip")
+        self.system_label.setWordWrap(True)
+        self.system_label.hide()
+        layout.addWidget(self.system_label)
+        
         # Close button
         close_btn = QPushButton("Fermer")
         close_btn.clicked.connect(self.accept)
-        close_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #6c757d;
-                color: white;
-                border: none;
-                padding: 12px 30px;
-                border-radius: 5px;
-                font-weight: bold;
-                min-height: 15px;
-            }
-            QPushButton:hover {
-                background-color: #545b62;
-            }
-        """)
+        close_btn.setObjectName("close")
         layout.addWidget(close_btn, alignment=Qt.AlignCenter)
-        
-        # Apply styles
-        self.setStyleSheet("""
-            QDialog {
-                background-color: #f8f9fa;
-            }
-            QGroupBox {
-                font-weight: bold;
-                border: 2px solid #dee2e6;
-                border-radius: 10px;
-                margin-top: 1ex;
-                padding-top: 15px;
-                background-color: white;
-                font-size: 14px;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 15px;
-                padding: 0 10px 0 10px;
-                color: #495057;
-                font-size: 15px;
-            }
-            QFormLayout QLabel {
-                font-weight: 600;
-                color: #444;
-                font-size: 14px;
-            }
-            QDoubleSpinBox, QTimeEdit, QDateEdit {
-                padding: 8px;
-                border: 2px solid #ddd;
-                border-radius: 5px;
-                font-size: 14px;
-                background-color: white;
-                min-height: 20px;
-            }
-            QDoubleSpinBox:focus, QTimeEdit:focus, QDateEdit:focus {
-                border-color: #667eea;
-            }
-            QTextEdit {
-                border: 2px solid #ddd;
-                border-radius: 5px;
-                background-color: #f8f9fa;
-                font-family: 'Courier New', monospace;
-                font-size: 13px;
-            }
-            QScrollArea {
-                border: none;
-                background-color: transparent;
-            }
-        """)
+    
+    def update_system_status(self):
+        """Résumé des cinq dernières minutes de télémétrie, masqué si le démon ne tourne pas"""
+        reader = telemetry.default_reader()
+        summary = reader.summary() if reader is not None else None
+        if summary is None or summary['age'] > 60:
+            self.system_label.hide()
+            return
+        self.system_label.setText("Système : " + telemetry.status_line(summary))
+        self.system_label.show()
+    
+    def apply_shadow_measurement(self, measurement):
+        self.shadow_length.setValue(measurement['shadow_length'])
+        self.shadow_azimuth.setValue(measurement['shadow_azimuth'])
+    
+    @pyqtSlot()
+    def measure_from_photo(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Photo du bâton", "", "Images (*.jpg *.jpeg *.png)")
+        if not path:
+            return
+        image = QImage(path)
+        if image.isNull():
+            QMessageBox.warning(self, "Erreur", "Impossible de lire cette image.")
+            return
+        try:
+            self.apply_shadow_measurement(shadow_camera.measure_shadow(qimage_to_array(image)))
+        except shadow_camera.ShadowMeasurementError as e:
+            QMessageBox.warning(self, "Mesure impossible", str(e))
+    
+    @pyqtSlot()
+    def measure_from_camera(self):
+        # A short burst smoothed by a running median, captured in the background
+        self.camera_btn.setEnabled(False)
+        self.camera_progress.setValue(0)
+        self.camera_progress.show()
+        self.camera_cancel_btn.show()
+        self.camera_runner.submit(shadow_camera.capture_measurement)
+    
+    @pyqtSlot(float)
+    def show_camera_progress(self, fraction):
+        self.camera_progress.setValue(int(fraction * 100))
+    
+    @pyqtSlot()
+    def hide_camera_progress(self):
+        self.camera_progress.hide()
+        self.camera_cancel_btn.hide()
+        self.camera_btn.setEnabled(shadow_camera.camera_available())
+    
+    @pyqtSlot(object)
+    def finish_camera_measurement(self, measurement):
+        self.hide_camera_progress()
+        self.apply_shadow_measurement(measurement)
+    
+    @pyqtSlot(str)
+    def camera_measurement_failed(self, message):
+        self.hide_camera_progress()
+        QMessageBox.warning(self, "Mesure impossible", message)
+    
+    def current_timestamp(self):
+        """Date et heure UTC saisies, au format datetime64"""
+        return np.datetime64(
+            f"{self.date_edit.date().toString('yyyy-MM-dd')}T{self.utc_time.time().toString('HH:mm')}"
+        )
+    
+    def update_observations_label(self):
+        count = len(self.observations)
+        if count < 2:
+            self.observations_label.setText(f"{count} mesure(s) enregistrée(s)")
+        else:
+            self.observations_label.setText(f"{count} mesures, calcul combiné")
+    
+    @pyqtSlot()
+    def add_observation(self):
+        self.observations.append((
+            self.stick_height.value(),
+            self.shadow_length.value(),
+            self.shadow_azimuth.value(),
+            self.current_timestamp()
+        ))
+        self.record_observation(*self.observations[-1], self.magnetic_declination.value(), source='combinée')
+        self.update_observations_label()
+    
+    @pyqtSlot()
+    def clear_observations(self):
+        self.observations = []
+        # Les mesures suivantes forment une nouvelle session
+        self.session_id = None
+        self.update_observations_label()
+    
+    def current_session(self):
+        if self.session_id is None:
+            self.session_id = self.history_store.start_session()
+        return self.session_id
+    
+    def record_observation(self, stick_height, shadow_length, shadow_azimuth, timestamp,
+                           magnetic_declination, source):
+        """Ajoute la mesure à l'historique, sans attendre l'écriture sur disque"""
+        if self.history_store is not None:
+            self.history_store.record_observation(
+                self.current_session(), stick_height, shadow_length, shadow_azimuth,
+                timestamp, magnetic_declination, source
+            )
+    
+    def record_fix(self, results, solver, magnetic_declination, uncertainty=None):
+        if self.history_store is not None:
+            self.history_store.record_fix(self.current_session(), results, solver, uncertainty,
+                                          magnetic_declination)
+    
+    def read_inputs(self):
+        """Valeurs du formulaire, lues dans le thread de l'interface avant le calcul"""
+        return {
+            'stick_height': self.stick_height.value(),
+            'shadow_length': self.shadow_length.value(),
+            'shadow_azimuth': self.shadow_azimuth.value(),
+            'utc_time': self.utc_time.time().toPyTime(),
+            'date': self.date_edit.date().toPyDate(),
+            'timestamp': self.current_timestamp(),
+            'magnetic_declination': self.magnetic_declination.value(),
+            'auto_declination': self.auto_declination.isChecked(),
+            'uncertainty': self.uncertainty_enabled.isChecked(),
+            'global_search': self.global_search_enabled.isChecked(),
+            'length_error': self.length_error.value() / 100,
+            'azimuth_error': self.azimuth_error.value(),
+            'time_error': self.time_error.value(),
+            'observations': list(self.observations)
+        }
     
     @pyqtSlot()
     def calculate_position(self):
@@ -412,28 +853,117 @@ class TutorialDialog(QDialog):
                               "Veuillez remplir tous les champs obligatoires.")
             return
         
-        try:
-            # Get values
-            stick_height = self.stick_height.value()
-            shadow_length = self.shadow_length.value()
-            shadow_azimuth = self.shadow_azimuth.value()
-            utc_time = self.utc_time.time()
-            date = self.date_edit.date()
-            magnetic_declination = self.magnetic_declination.value()
-            
-            # Calculate position
-            results = SolarGeolocationCalculator.calculate_position(
-                stick_height, shadow_length, shadow_azimuth,
-                utc_time, date, magnetic_declination
-            )
-            
-            self.display_results(results)
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Erreur de calcul", 
-                               f"Une erreur s'est produite lors du calcul:\n{str(e)}")
+        self.live_timer.stop()
+        self.start_calculation(live=False)
+    
+    @pyqtSlot()
+    def schedule_live_calculation(self):
+        if self.live_enabled.isChecked():
+            self.live_timer.start()
+    
+    @pyqtSlot()
+    def calculate_live(self):
+        if self.shadow_length.value() > 0:
+            self.start_calculation(live=True)
+    
+    def start_calculation(self, live):
+        """Lance le calcul en arrière-plan, ou affiche directement un résultat déjà calculé"""
+        inputs = self.read_inputs()
+        self.calculation_inputs = inputs
+        # A place still being looked up belongs to the previous fix
+        self.geocode_runner.cancel()
+        self.calculation_live = live
+        
+        # A full result of the same inputs is a valid live preview too
+        keys = [calculation_key(inputs)]
+        if live:
+            inputs = live_inputs(inputs)
+            self.calculation_inputs = inputs
+            keys.insert(0, calculation_key(inputs))
+        self.calculation_key = keys[0]
+        for key in keys:
+            if key in self.result_cache:
+                self.result_cache.move_to_end(key)
+                self.runner.cancel()
+                self.show_calculation(self.result_cache[key])
+                return
+        
+        job = solve_combined if len(inputs['observations']) >= 2 else solve_single
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_btn.show()
+        self.results_group.show()
+        self.runner.submit(job, inputs)
     
-    def display_results(self, results):
+    @pyqtSlot(float)
+    def show_progress(self, fraction):
+        self.progress_bar.setValue(int(fraction * 100))
+    
+    @pyqtSlot()
+    def hide_progress(self):
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+    
+    @pyqtSlot(object)
+    def show_calculation(self, output):
+        self.hide_progress()
+        inputs = self.calculation_inputs
+        self.result_cache[self.calculation_key] = output
+        while len(self.result_cache) > RESULT_CACHE_SIZE:
+            self.result_cache.popitem(last=False)
+        if inputs['auto_declination']:
+            # Valeur du modèle affichée sans déclencher l'abandon du calcul
+            self.magnetic_declination.blockSignals(True)
+            self.magnetic_declination.setValue(output['magnetic_declination'])
+            self.magnetic_declination.blockSignals(False)
+        
+        # Seuls les calculs demandés sont gardés dans l'historique
+        if not self.calculation_live:
+            self.record_calculation(inputs, output)
+            self.prefetch_tiles(output['results'], output['uncertainty'])
+        self.display_results(output['results'], output['uncertainty'], output['search'])
+        if (self.calculation_live and output['uncertainty'] is None and output['search'] is None
+                and (self.uncertainty_enabled.isChecked() or self.global_search_enabled.isChecked())):
+            self.results_text.append("Aperçu en direct : incertitude et recherche globale "
+                                     "avec « Calculer ma position »")
+        uncertainty = output['uncertainty'] or {}
+        self.fix_computed.emit({
+            'latitude': float(output['results']['latitude']),
+            'longitude': float(output['results']['longitude']),
+            'radius_95': uncertainty.get('radius_95', uncertainty.get('semi_major')),
+            'solver': output['solver'],
+            'live': self.calculation_live,
+            'computed_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        })
+    
+    def record_calculation(self, inputs, output):
+        # The declination the solve used, not the rounded value shown in the form
+        magnetic_declination = output['magnetic_declination']
+        if output['solver'] == 'newton_solve':
+            self.record_observation(inputs['stick_height'], inputs['shadow_length'],
+                                    inputs['shadow_azimuth'], inputs['timestamp'],
+                                    magnetic_declination, source='simple')
+            self.record_fix(output['results'], output['solver'], magnetic_declination, output['uncertainty'])
+        else:
+            self.record_fix(output['results'], output['solver'], magnetic_declination)
+    
+    def prefetch_tiles(self, results, uncertainty):
+        """Tuiles autour de la position demandées au serveur avant que la carte s'y rende"""
+        uncertainty = uncertainty or {}
+        radius = uncertainty.get('radius_95', uncertainty.get('semi_major', tile_prefetch.MIN_RADIUS_KM))
+        tile_prefetch.default_prefetcher().prefetch(results['latitude'], results['longitude'], radius)
+    
+    @pyqtSlot(str)
+    def show_calculation_error(self, message):
+        self.hide_progress()
+        if self.calculation_live:
+            # Pas de boîte modale pendant que l'utilisateur ajuste les valeurs
+            self.results_text.setPlainText(f"Calcul impossible : {message}")
+            return
+        QMessageBox.critical(self, "Erreur de calcul", 
+                           f"Une erreur s'est produite lors du calcul:\n{message}")
+    
+    def display_results(self, results, uncertainty=None, search=None):
         results_text = f"""Position estimée:
 Latitude: {results['latitude']:.4f}°
 Longitude: {results['longitude']:.4f}°
@@ -441,12 +971,64 @@ Longitude: {results['longitude']:.4f}°
 Coordonnées pour copie: {results['latitude']:.4f}, {results['longitude']:.4f}
 """
         
+        # Index local des lieux : immédiat et sans réseau
+        places = places_index.default_index()
+        if places is not None:
+            nearby = places.describe(results['latitude'], results['longitude'])
+            if nearby:
+                results_text += f"{nearby}\n"
+        
+        if 'converged' in results:
+            status = "convergé" if results['converged'] else "NON convergé"
+            results_text += (f"\nSolveur: {status} en {results['iterations']} itération(s), "
+                             f"résidu {results['residual']:.2e}°, {results['solve_time'] * 1000:.1f} ms\n")
+            if results.get('declination_passes', 1) > 1:
+                results_text += (f"Déclinaison WMM: {results['magnetic_declination']:+.1f}° "
+                                 f"({results['declination_passes']} passes)\n")
+            if results.get('alternative') is not None:
+                alternative = results['alternative']
+                results_text += (f"\n⚠ Solution ambiguë : {alternative['latitude']:.4f}, "
+                                 f"{alternative['longitude']:.4f} explique aussi la mesure ; "
+                                 f"une seconde mesure à une autre heure les départage\n")
+        elif 'misfit' in results:
+            results_text += (f"\nSolveur: meilleur candidat de la recherche globale, écart "
+                             f"{results['misfit']:.2f} ({results['iterations']} itération(s))\n")
+        
+        if 'inliers' in results:
+            inliers = results['inliers']
+            results_text += f"\nMesures retenues: {int(inliers.sum())}/{inliers.size}\n"
+            for i, (residual, kept) in enumerate(zip(results['residuals'], inliers), 1):
+                status = "" if kept else " (rejetée)"
+                results_text += (f"  Mesure {i}: élévation {residual['elevation']:+.2f}°, "
+                                 f"azimut {residual['azimuth']:+.1f}°{status}\n")
+        
+        if uncertainty is not None:
+            if 'samples' in uncertainty:
+                results_text += f"\nIncertitude ({uncertainty['samples']} tirages):\n"
+            else:
+                results_text += "\nIncertitude (ajustement combiné):\n"
+            results_text += (f"Ellipse 95 %: {uncertainty['semi_major']:.1f} km × "
+                             f"{uncertainty['semi_minor']:.1f} km, orientée à {uncertainty['orientation']:.0f}°\n")
+            if 'radius_50' in uncertainty:
+                results_text += f"Rayon 50 %: {uncertainty['radius_50']:.1f} km\n"
+                results_text += f"Rayon 95 %: {uncertainty['radius_95']:.1f} km\n"
+        
+        if search is not None:
+            if search['ambiguous']:
+                results_text += "\n⚠ Solution ambiguë : plusieurs positions expliquent les mesures\n"
+            results_text += "\nPositions candidates:\n"
+            for candidate in search['candidates']:
+                results_text += (f"  {candidate['latitude']:.4f}, {candidate['longitude']:.4f} "
+                                 f"(écart {candidate['misfit']:.2f})\n")
+        
         self.results_text.setPlainText(results_text)
         self.results_group.show()
         self.copy_btn.setEnabled(True)
+        self.map_btn.setEnabled(True)
         
         # Store coordinates for copying
         self.current_coordinates = f"{results['latitude']:.4f}, {results['longitude']:.4f}"
+        self.current_fix = (results['latitude'], results['longitude'])
     
     @pyqtSlot()
     def copy_coordinates(self):
@@ -462,18 +1044,58 @@ Coordonnées pour copie: {results['latitude']:.4f}, {results['longitude']:.4f}
     
     def reset_copy_button(self):
         self.copy_btn.setText("Copier les coordonnées")
+    
+    @pyqtSlot()
+    def send_to_map(self):
+        if not hasattr(self, 'current_fix'):
+            return
+        latitude, longitude = self.current_fix
+        if self.map_client is None:
+            self.map_client = map_server.OSMScoutClient()
+        
+        # The map is centered right away; the place name follows when found
+        self.geocode_runner.submit(nearest_place, self.map_client, latitude, longitude)
+        try:
+            map_server.center_map(latitude, longitude)
+        except map_server.MapServerError as e:
+            QMessageBox.warning(self, "Carte", str(e))
+    
+    @pyqtSlot(object)
+    def show_nearest_place(self, place):
+        if place is not None and place['name']:
+            distance = place['distance']
+            suffix = f" ({distance / 1000:.1f} km)" if isinstance(distance, (int, float)) else ""
+            self.results_text.append(f"Lieu le plus proche: {place['name']}{suffix}")
 
 
 class SolarShadowApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, low_memory=False, render_mode='opaque'):
         super().__init__()
         
+        # Tutoriel construit à la première ouverture puis réutilisé ;
+        # en mode économie de mémoire, il est détruit à chaque fermeture
+        self.low_memory = low_memory
+        self.tutorial_dialog = None
+        self.last_fix = None
+        self.control_server = None
+        
+        # Historique partagé par les ouvertures successives du tutoriel
+        try:
+            self.history_store = history.HistoryStore()
+        except history.HistoryError as error:
+            logger.warning("%s", error)
+            self.history_store = None
+        
         self.setFixedSize(120, 40)
         
         # Position sur la carte
         self.move(35, 10)
         
-        self.setAttribute(Qt.WA_TranslucentBackground, True)
+        # Le fond translucide impose un compositing alpha par pixel au-dessus
+        # de la carte GL ; les modes opaque et masque s'en passent
+        self.render_mode = render_mode
+        if render_mode == 'translucent':
+            self.setAttribute(Qt.WA_TranslucentBackground, True)
         self.setWindowFlags(
             Qt.WindowType.WindowStaysOnTopHint |
             Qt.WindowType.FramelessWindowHint |
@@ -481,13 +1103,20 @@ class SolarShadowApp(QMainWindow):
         )
         
         self.setup_ui()
+        
+        if render_mode == 'mask':
+            # Coins arrondis découpés par la forme de la fenêtre, sans canal alpha
+            path = QPainterPath()
+            path.addRoundedRect(QRectF(self.rect()), 8, 8)
+            self.setMask(QRegion(path.toFillPolygon().toPolygon()))
 
     def setup_ui(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         
-        central_widget.setAttribute(Qt.WA_TranslucentBackground, True)
-        central_widget.setStyleSheet("background: transparent;")
+        central_widget.setObjectName("overlay")
+        if self.render_mode == 'translucent':
+            central_widget.setAttribute(Qt.WA_TranslucentBackground, True)
         
         # Layout sans marges ni espacement
         main_layout = QVBoxLayout(central_widget)
@@ -497,49 +1126,144 @@ class SolarShadowApp(QMainWindow):
         # Bouton principal
         tutorial_btn = QPushButton("Tutoriel")
         tutorial_btn.clicked.connect(self.show_tutorial)
-        tutorial_btn.setStyleSheet("""
-            QPushButton {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
-                                          stop:0 #667eea, stop:1 #764ba2);
-                color: white;
-                border: none;
-                padding: 8px 16px;
-                font-size: 14px;
-                font-weight: bold;
-                min-height: 25px;
-                /* Supprimer toute marge ou border */
-                margin: 0px;
-                border: 0px;
-            }
-            QPushButton:hover {
-                background: qlineargradient(x1:0, y1:0, x2:1, y2:1, 
-                                          stop:0 #5a6fd8, stop:1 #6a4190);
-                transform: translateY(-1px);
-            }
-            QPushButton:pressed {
-                transform: translateY(1px);
-            }
-        """)
+        tutorial_btn.setObjectName("tutorial")
         main_layout.addWidget(tutorial_btn)
-        
-        self.setStyleSheet("""
-            QMainWindow {
-                background: transparent;
-                border: none;
-            }
-        """)
+    
+    def ensure_tutorial(self):
+        """Tutoriel existant, ou construit sans être affiché ; True s'il vient d'être construit"""
+        if self.tutorial_dialog is not None:
+            return False
+        self.tutorial_dialog = TutorialDialog(self, self.history_store)
+        self.tutorial_dialog.fix_computed.connect(self.remember_fix)
+        return True
+    
+    @pyqtSlot(object)
+    def remember_fix(self, fix):
+        self.last_fix = fix
+    
+    def release_tutorial(self, dialog):
+        """Libère un tutoriel construit pour une commande, sauf s'il a été ouvert entre-temps"""
+        if self.tutorial_dialog is dialog and not dialog.isVisible():
+            self.tutorial_dialog = None
+            dialog.deleteLater()
     
     @pyqtSlot()
     def show_tutorial(self):
-        dialog = TutorialDialog(self)
-        dialog.exec_()
+        start = time.perf_counter()
+        created = self.ensure_tutorial()
+        
+        # Logged once the dialog's event loop is running, i.e. it is on screen
+        QTimer.singleShot(0, lambda: logger.info(
+            "tutoriel ouvert en %.1f ms (%s), RSS %.1f Mo",
+            (time.perf_counter() - start) * 1000,
+            "construit" if created else "réutilisé",
+            process_rss() / 1048576
+        ))
+        self.tutorial_dialog.update_system_status()
+        self.tutorial_dialog.exec_()
+        
+        if self.low_memory:
+            self.tutorial_dialog.deleteLater()
+            self.tutorial_dialog = None
+            QTimer.singleShot(0, lambda: logger.info(
+                "tutoriel libéré, RSS %.1f Mo", process_rss() / 1048576
+            ))
+        else:
+            logger.info("tutoriel fermé, RSS %.1f Mo", process_rss() / 1048576)
+    
+    # Commandes du socket local (réponse immédiate, le travail suit dans la boucle Qt)
+    
+    def start_control_server(self, path=SOCKET_PATH):
+        self.control_server = ControlServer(path, self)
+        self.control_server.register('keyboard', toggle_keyboard, "affiche ou masque le clavier")
+        self.control_server.register('tutorial', self.command_tutorial, "ouvre le tutoriel")
+        self.control_server.register('observe', self.command_observe,
+                                     "HAUTEUR LONGUEUR AZIMUT [AAAA-MM-JJTHH:MM] [DÉCLINAISON] : calcule la position")
+        self.control_server.register('fix', self.command_fix, "dernière position calculée (JSON)")
+        return self.control_server.listen()
+    
+    def command_tutorial(self):
+        if self.tutorial_dialog is not None and self.tutorial_dialog.isVisible():
+            self.tutorial_dialog.raise_()
+            self.tutorial_dialog.activateWindow()
+            return "déjà ouvert"
+        # exec_() runs a nested event loop: open it once the reply is sent
+        QTimer.singleShot(0, self.show_tutorial)
+    
+    def command_observe(self, stick_height, shadow_length, shadow_azimuth, timestamp=None, declination=None):
+        try:
+            values = [float(stick_height), float(shadow_length), float(shadow_azimuth)]
+            if declination is not None:
+                declination = float(declination)
+            when = (np.datetime64(timestamp, 'm') if timestamp is not None
+                    else np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), 'm'))
+        except ValueError as error:
+            raise CommandError(f"valeur invalide : {error}")
+        if values[1] <= 0:
+            raise CommandError("la longueur d'ombre doit être positive")
+        
+        created = self.ensure_tutorial()
+        dialog = self.tutorial_dialog
+        fields = [dialog.stick_height, dialog.shadow_length, dialog.shadow_azimuth]
+        if declination is not None:
+            values.append(declination)
+            fields.append(dialog.magnetic_declination)
+        for field, value in zip(fields, values):
+            if not field.minimum() <= value <= field.maximum():
+                if created and self.low_memory:
+                    self.release_tutorial(dialog)
+                raise CommandError(f"{value:g} hors de [{field.minimum():g}, {field.maximum():g}]")
+        
+        if created and self.low_memory:
+            # Built only for this command: released once its calculation ends,
+            # like the tutorial closed in low-memory mode
+            for signal in (dialog.fix_computed, dialog.runner.failed, dialog.runner.cancelled):
+                signal.connect(lambda *_, dialog=dialog: self.release_tutorial(dialog))
+        for field, value in zip(fields, values):
+            field.setValue(value)
+        if declination is not None:
+            dialog.auto_declination.setChecked(False)
+        moment = when.astype(datetime)
+        dialog.date_edit.setDate(QDate(moment.year, moment.month, moment.day))
+        dialog.utc_time.setTime(QTime(moment.hour, moment.minute))
+        dialog.calculate_position()
+        return "calcul lancé (résultat : fix)"
+    
+    def command_fix(self):
+        if self.last_fix is None:
+            raise CommandError("aucune position calculée")
+        return json.dumps(self.last_fix)
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Overlay de géolocalisation solaire")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="libère le tutoriel à chaque fermeture au lieu de le garder en mémoire")
+    parser.add_argument('--render-mode', choices=RENDER_MODES, default='opaque',
+                        help="rendu du bouton au-dessus de la carte (défaut : %(default)s)")
+    parser.add_argument('--sample-frames', action='store_true',
+                        help="journalise temps de trame et charge CPU de l'overlay et de la carte")
+    parser.add_argument('--sample-repaint', action='store_true',
+                        help="avec --sample-frames, redessine l'overlay à chaque trame et mesure le coût")
+    parser.add_argument('--control-socket', default=SOCKET_PATH,
+                        help="socket Unix des commandes (défaut : %(default)s)")
+    args, qt_args = parser.parse_known_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle('Fusion')
+    app.setStyleSheet(APP_STYLESHEET)
     
-    window = SolarShadowApp()
+    window = SolarShadowApp(low_memory=args.low_memory, render_mode=args.render_mode)
     window.show()
+    window.start_control_server(args.control_socket)
+    app.aboutToQuit.connect(window.control_server.close)
+    if args.sample_frames:
+        sampler = FrameSampler(window, repaint=args.sample_repaint, parent=window)
+        sampler.start()
+    if window.history_store is not None:
+        # Last batch written before exit
+        app.aboutToQuit.connect(window.history_store.close)
     
     sys.exit(app.exec_())
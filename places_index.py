@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Index hors ligne des lieux habités, pour nommer une position sans réseau.
+
+L'index est construit une fois à partir d'un extrait OSM (.osm, .osm.bz2,
+.osm.gz, ou .osm.pbf si pyosmium est installé). Il est stocké dans un
+répertoire de tableaux .npy : coordonnées triées par case d'une grille de 1°,
+décalages de début de chaque case (format CSR) et noms UTF-8 concaténés.
+À l'ouverture, tout est projeté en mémoire (mmap) sans analyse : seules les
+pages des cases consultées sont lues, ce qui laisse la mémoire à Pure Maps.
+
+Exemple :
+    python3 places_index.py build france.osm.pbf
+    python3 places_index.py query 45.76 4.84
+"""
+
+import os
+import sys
+import bz2
+import gzip
+import math
+import argparse
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+from storage import DATA_DIR, atomic_path
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+INDEX_DIR = os.path.join(DATA_DIR, 'places')
+
+# Place kinds kept from OSM, by decreasing importance
+PLACE_KINDS = ('city', 'town', 'village', 'hamlet')
+
+# Within this distance a village or larger names a position better than a
+# nearer hamlet, which is rarely on the map at the zoom the overlay shows
+PREFERRED_DISTANCE_KM = 15.0
+PREFERRED_KIND = PLACE_KINDS.index('village')
+
+# Grid cell size in degrees
+CELL_SIZE = 1.0
+GRID_ROWS = int(180 / CELL_SIZE)
+GRID_COLUMNS = int(360 / CELL_SIZE)
+
+EARTH_RADIUS_KM = 6371.0
+
+COMPASS_POINTS = ('N', 'NE', 'E', 'SE', 'S', 'SO', 'O', 'NO')
+
+
+def _open_extract(path):
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def read_places_xml(path, kinds=PLACE_KINDS):
+    """Itère sur (latitude, longitude, nom, type) des nœuds place=* d'un fichier OSM XML"""
+    with _open_extract(path) as handle:
+        for event, element in ElementTree.iterparse(handle, events=('end',)):
+            if element.tag == 'node':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                if tags.get('place') in kinds and tags.get('name'):
+                    yield (float(element.get('lat')), float(element.get('lon')),
+                           tags['name'], tags['place'])
+            if element.tag in ('node', 'way', 'relation'):
+                # Keep memory flat on country-sized extracts
+                element.clear()
+
+
+def read_places_pbf(path, kinds=PLACE_KINDS):
+    """Même chose pour un fichier .osm.pbf, via pyosmium"""
+    if osmium is None:
+        raise RuntimeError("pyosmium est nécessaire pour lire les fichiers .pbf")
+    places = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, node):
+            kind = node.tags.get('place')
+            name = node.tags.get('name')
+            if kind in kinds and name:
+                places.append((node.location.lat, node.location.lon, name, kind))
+
+    Handler().apply_file(path)
+    return places
+
+
+def _cell_index(latitude, longitude):
+    row = np.clip(((np.asarray(latitude) + 90) // CELL_SIZE).astype(np.intp), 0, GRID_ROWS - 1)
+    column = ((np.asarray(longitude) + 180) // CELL_SIZE).astype(np.intp) % GRID_COLUMNS
+    return row, column
+
+
+def build_index(extract, path=INDEX_DIR, kinds=PLACE_KINDS):
+    """Construit l'index à partir d'un extrait OSM ; retourne le nombre de lieux"""
+    reader = read_places_pbf if extract.endswith('.pbf') else read_places_xml
+    places = list(reader(extract, kinds))
+    if not places:
+        raise ValueError("Aucun lieu habité trouvé dans l'extrait")
+
+    latitudes = np.array([place[0] for place in places])
+    longitudes = np.array([place[1] for place in places])
+    rank = np.array([PLACE_KINDS.index(place[3]) for place in places], dtype=np.uint8)
+    row, column = _cell_index(latitudes, longitudes)
+    cells = row * GRID_COLUMNS + column
+    order = np.lexsort((rank, cells))
+
+    encoded = [places[i][2].encode('utf-8') for i in order]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    name_offsets[1:] = np.cumsum([len(name) for name in encoded])
+    cell_offsets = np.searchsorted(cells[order], np.arange(GRID_ROWS * GRID_COLUMNS + 1)).astype(np.int32)
+
+    # Build beside the target, then swap, so readers never see a partial index
+    with atomic_path(path) as temporary:
+        os.makedirs(temporary)
+        np.save(os.path.join(temporary, 'coordinates.npy'),
+                np.column_stack((latitudes[order], longitudes[order])).astype(np.float32))
+        np.save(os.path.join(temporary, 'kinds.npy'), rank[order])
+        np.save(os.path.join(temporary, 'cell_offsets.npy'), cell_offsets)
+        np.save(os.path.join(temporary, 'name_offsets.npy'), name_offsets)
+        with open(os.path.join(temporary, 'names.bin'), 'wb') as handle:
+            handle.write(b''.join(encoded))
+    return len(encoded)
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes)
+    delta_lat = lat2 - lat1
+    delta_lon = np.radians(longitudes - longitude)
+    a = np.sin(delta_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def bearing(from_latitude, from_longitude, to_latitude, to_longitude):
+    """Cap initial (degrés) d'un point vers un autre"""
+    lat1, lat2 = math.radians(from_latitude), math.radians(to_latitude)
+    delta = math.radians(to_longitude - from_longitude)
+    y = math.sin(delta) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(delta)
+    return math.degrees(math.atan2(y, x)) % 360
+
+
+class PlacesIndex:
+    def __init__(self, path=INDEX_DIR):
+        self.coordinates = np.load(os.path.join(path, 'coordinates.npy'), mmap_mode='r')
+        self.kinds = np.load(os.path.join(path, 'kinds.npy'), mmap_mode='r')
+        self.cell_offsets = np.load(os.path.join(path, 'cell_offsets.npy'), mmap_mode='r')
+        self.name_offsets = np.load(os.path.join(path, 'name_offsets.npy'), mmap_mode='r')
+        self.names = np.memmap(os.path.join(path, 'names.bin'), dtype=np.uint8, mode='r')
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def name(self, index):
+        start, end = int(self.name_offsets[index]), int(self.name_offsets[index + 1])
+        return self.names[start:end].tobytes().decode('utf-8')
+
+    def _ring(self, row, column, radius):
+        # Cell ids on the square ring at Chebyshev distance `radius`
+        cells = set()
+        for delta_row in range(-radius, radius + 1):
+            for delta_column in range(-radius, radius + 1):
+                if max(abs(delta_row), abs(delta_column)) != radius:
+                    continue
+                ring_row = row + delta_row
+                if 0 <= ring_row < GRID_ROWS:
+                    cells.add(ring_row * GRID_COLUMNS + (column + delta_column) % GRID_COLUMNS)
+        return cells
+
+    def nearest(self, latitude, longitude, max_distance_km=100.0, max_kind=len(PLACE_KINDS) - 1):
+        """Lieu le plus proche (nom, type, distance en km, cap depuis le lieu) ou None"""
+        row, column = (int(value) for value in _cell_index(latitude, longitude))
+        best_index, best_distance = None, math.inf
+        # One cell spans this many km north-south, less east-west away from the equator
+        cell_km = EARTH_RADIUS_KM * math.radians(CELL_SIZE)
+        narrowest = max(math.cos(math.radians(min(abs(latitude), 89))), 0.05)
+        max_radius = min(int(math.ceil(max_distance_km / (cell_km * narrowest))) + 1, GRID_COLUMNS // 2)
+        for radius in range(max_radius + 1):
+            # Every point of ring `radius` is at least (radius - 1) cells away
+            if best_distance < (radius - 1) * cell_km * math.cos(math.radians(min(abs(latitude) + radius, 89))):
+                break
+            for cell in self._ring(row, column, radius):
+                start, end = int(self.cell_offsets[cell]), int(self.cell_offsets[cell + 1])
+                if start == end:
+                    continue
+                kinds = np.asarray(self.kinds[start:end])
+                points = np.asarray(self.coordinates[start:end], dtype=np.float64)
+                distances = haversine_km(latitude, longitude, points[:, 0], points[:, 1])
+                distances[kinds > max_kind] = math.inf
+                candidate = int(np.argmin(distances))
+                if distances[candidate] < best_distance:
+                    best_distance = float(distances[candidate])
+                    best_index = start + candidate
+        if best_index is None or best_distance > max_distance_km:
+            return None
+        place_latitude, place_longitude = (float(value) for value in self.coordinates[best_index])
+        return {
+            'name': self.name(best_index),
+            'kind': PLACE_KINDS[int(self.kinds[best_index])],
+            'latitude': place_latitude,
+            'longitude': place_longitude,
+            'distance': best_distance,
+            'bearing': bearing(place_latitude, place_longitude, latitude, longitude)
+        }
+
+    def describe(self, latitude, longitude, max_distance_km=100.0,
+                 preferred_distance_km=PREFERRED_DISTANCE_KM):
+        """Texte du type « ≈ 12 km NE de Lyon », ou None si aucun lieu n'est assez proche
+
+        Une ville ou un village à moins de preferred_distance_km l'emporte sur
+        un hameau plus proche.
+        """
+        place = self.nearest(latitude, longitude, min(preferred_distance_km, max_distance_km),
+                             max_kind=PREFERRED_KIND)
+        if place is None:
+            place = self.nearest(latitude, longitude, max_distance_km)
+        if place is None:
+            return None
+        if place['distance'] < 1:
+            return f"≈ à {place['name']}"
+        point = COMPASS_POINTS[int((place['bearing'] + 22.5) // 45) % 8]
+        return f"≈ {place['distance']:.0f} km {point} de {place['name']}"
+
+
+_index = None
+
+
+def default_index():
+    """Index partagé, ouvert au premier appel ; None s'il n'a pas été construit"""
+    global _index
+    if _index is None:
+        try:
+            _index = PlacesIndex()
+        except FileNotFoundError:
+            return None
+    return _index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index hors ligne des lieux habités")
+    parser.add_argument('--index', default=INDEX_DIR, help="répertoire de l'index (défaut : %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="construit l'index à partir d'un extrait OSM")
+    build.add_argument('extract')
+    build.add_argument('--kinds', nargs='+', default=list(PLACE_KINDS), choices=PLACE_KINDS)
+    query = commands.add_parser('query', help="lieu le plus proche d'une position")
+    query.add_argument('latitude', type=float)
+    query.add_argument('longitude', type=float)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        kinds = tuple(kind for kind in PLACE_KINDS if kind in args.kinds)
+        count = build_index(args.extract, args.index, kinds)
+        print(f"{count} lieux indexés dans {args.index}", file=sys.stderr)
+    else:
+        print(PlacesIndex(args.index).describe(args.latitude, args.longitude) or "Aucun lieu proche")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
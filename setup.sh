@@ -9,10 +9,12 @@ sudo apt install -y \
     onboard \
     unclutter \
     xdotool \
+    socat \
     python3 \
     python3-pip \
     python3-psutil \
-    python3-pyqt5
+    python3-pyqt5 \
+    python3-numpy
 
 
 
@@ -20,6 +22,18 @@ sudo apt install -y \
 mkdir -p ~/.config/i3
 mkdir -p /home/user/kiosk
 
+# Precompute the solar ephemeris table used by the overlay
+python3 ephemeris.py
+
+# Magnetic declination grid from the WMM.COF coefficients shipped with the repo
+if [ ! -f WMM.COF ]; then
+    echo "WMM.COF introuvable : récupérer le fichier de coefficients du dépôt" >&2
+    exit 1
+fi
+mkdir -p ~/.cache/kt2maps
+cp WMM.COF ~/.cache/kt2maps/
+python3 wmm.py || exit 1
+
 # Install the new .xinitrc
 cp kiosk_setup.sh ~/.xinitrc
 chmod +x ~/.xinitrc
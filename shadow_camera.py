@@ -0,0 +1,253 @@
+"""Mesure automatique de l'ombre du bâton à partir d'images.
+
+L'image est prise à la verticale, au-dessus du bâton. Une carte de repère est
+posée au sol : un disque rouge au pied du bâton et un disque bleu à
+MARKER_SPACING mètres, placé dans la direction du nord magnétique indiqué par
+la boussole. Le disque rouge donne le pied du bâton, l'écart rouge-bleu donne
+l'échelle (mètres par pixel) et la direction du nord dans l'image.
+
+Toutes les étapes (détection des repères, seuillage d'Otsu, recherche de la
+pointe de l'ombre) sont des opérations NumPy vectorisées sur une image
+sous-échantillonnée, assez rapides pour un flux caméra sur le processeur d'un
+Raspberry Pi. render_synthetic_scene() produit des images de synthèse pour
+vérifier la chaîne de traitement.
+"""
+
+import math
+from itertools import islice
+import numpy as np
+
+try:
+    from picamera2 import Picamera2
+except ImportError:
+    Picamera2 = None
+
+# Distance between the centres of the red and blue discs on the card (metres)
+MARKER_SPACING = 0.20
+
+# Minimum pixel count for a marker disc after downscaling
+MIN_MARKER_PIXELS = 6
+
+# Angular window (degrees) around the dominant shadow direction
+DIRECTION_WINDOW = 6.0
+
+# Largest gap (pixels) tolerated along the shadow before its tip
+MAX_SHADOW_GAP = 4
+
+# Camera burst: frames read at most, and smoothed measurements that end it early
+BURST_FRAMES = 60
+BURST_MEASUREMENTS = 16
+
+
+class ShadowMeasurementError(ValueError):
+    """Image inexploitable : repère ou ombre introuvable"""
+
+
+def _luminance(frame):
+    return frame[..., 0] * 0.299 + frame[..., 1] * 0.587 + frame[..., 2] * 0.114
+
+
+def otsu_threshold(values):
+    """Seuil d'Otsu d'un tableau de valeurs 0-255"""
+    histogram = np.bincount(np.clip(values, 0, 255).astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+    total = weights[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (means[-1] * weights - means * total) ** 2 / (weights * (total - weights))
+    return int(np.nanargmax(between))
+
+
+def _centroid(mask):
+    rows, columns = np.nonzero(mask)
+    if rows.size < MIN_MARKER_PIXELS:
+        return None
+    return np.array([columns.mean(), rows.mean()])
+
+
+def find_markers(frame):
+    """Centres (x, y) des disques rouge et bleu, en pixels de l'image fournie"""
+    red, green, blue = frame[..., 0], frame[..., 1], frame[..., 2]
+    red_mask = (red > 120) & (red > 1.6 * green) & (red > 1.6 * blue)
+    blue_mask = (blue > 120) & (blue > 1.4 * red) & (blue > 1.2 * green)
+    base = _centroid(red_mask)
+    north = _centroid(blue_mask)
+    if base is None or north is None:
+        raise ShadowMeasurementError("Carte de repère introuvable dans l'image")
+    return base, north, red_mask | blue_mask
+
+
+def measure_shadow(frame, marker_spacing=MARKER_SPACING, downscale=2):
+    """Longueur (m) et azimut magnétique (degrés) de l'ombre dans une image RGB.
+
+    frame est un tableau (hauteur, largeur, 3) d'entiers 0-255. Retourne un
+    dictionnaire avec shadow_length, shadow_azimuth, les positions du pied et
+    de la pointe en pixels de l'image d'origine et l'échelle en m/pixel.
+    """
+    small = np.asarray(frame)[::downscale, ::downscale, :3].astype(np.float32)
+    base, north, marker_mask = find_markers(small)
+    north_vector = north - base
+    spacing_pixels = float(np.hypot(*north_vector))
+    if spacing_pixels < 2:
+        raise ShadowMeasurementError("Repères trop proches pour fixer l'échelle")
+
+    # Shadow pixels: darker than the Otsu threshold of the ground luminance
+    luminance = _luminance(small)
+    threshold = otsu_threshold(luminance[~marker_mask])
+    shadow_mask = (luminance < threshold) & ~marker_mask
+    rows, columns = np.nonzero(shadow_mask)
+    if rows.size < MIN_MARKER_PIXELS:
+        raise ShadowMeasurementError("Ombre introuvable dans l'image")
+
+    # Dominant direction of the shadow as seen from the stick base
+    dx = columns - base[0]
+    dy = rows - base[1]
+    distance = np.hypot(dx, dy)
+    angle = np.degrees(np.arctan2(dy, dx)) % 360
+    histogram = np.bincount((angle // 2).astype(np.intp), weights=distance, minlength=180)
+    # Circular smoothing over neighbouring bins
+    histogram = histogram + np.roll(histogram, 1) + np.roll(histogram, -1)
+    direction = (np.argmax(histogram) * 2 + 1.0)
+    offset = (angle - direction + 180) % 360 - 180
+    in_corridor = np.abs(offset) <= DIRECTION_WINDOW
+
+    # Walk along the ray from the base up to the first wide gap; the red disc
+    # hides the start of the shadow, so the walk begins at the first hit
+    reach = np.round(distance[in_corridor]).astype(np.intp)
+    occupied = np.bincount(reach) > 0
+    empty_run = np.convolve(~occupied, np.ones(MAX_SHADOW_GAP, dtype=np.intp), 'valid') == MAX_SHADOW_GAP
+    ends = np.flatnonzero(empty_run)
+    ends = ends[ends > np.argmax(occupied)]
+    tip_reach = int(ends[0]) - 1 if ends.size else occupied.size - 1
+    selected = in_corridor.copy()
+    selected[in_corridor] = reach <= tip_reach
+    if not np.any(selected):
+        raise ShadowMeasurementError("Ombre introuvable dans l'image")
+    far = np.argmax(np.where(selected, distance, -1))
+    tip = np.array([columns[far], rows[far]], dtype=np.float64)
+
+    # Direction from all shadow pixels (less noisy than the single tip pixel)
+    shadow_vector = np.array([dx[selected].sum(), dy[selected].sum()])
+    metres_per_pixel = marker_spacing / spacing_pixels
+    cross = north_vector[0] * shadow_vector[1] - north_vector[1] * shadow_vector[0]
+    dot = north_vector[0] * shadow_vector[0] + north_vector[1] * shadow_vector[1]
+    return {
+        'shadow_length': float(np.hypot(*(tip - base))) * metres_per_pixel,
+        'shadow_azimuth': math.degrees(math.atan2(cross, dot)) % 360,
+        'base': tuple(base * downscale),
+        'tip': tuple(tip * downscale),
+        'metres_per_pixel': metres_per_pixel / downscale,
+        'shadow_pixels': int(np.count_nonzero(selected))
+    }
+
+
+def measure_stream(frames, marker_spacing=MARKER_SPACING, downscale=2, window=9):
+    """Mesures lissées (médiane glissante) sur un flux d'images ; ignore les images inexploitables"""
+    lengths = []
+    azimuths = []
+    for frame in frames:
+        try:
+            measurement = measure_shadow(frame, marker_spacing, downscale)
+        except ShadowMeasurementError:
+            continue
+        lengths = (lengths + [measurement['shadow_length']])[-window:]
+        azimuths = (azimuths + [measurement['shadow_azimuth']])[-window:]
+        # Circular median: unwrap around the latest azimuth first
+        reference = azimuths[-1]
+        unwrapped = [(a - reference + 180) % 360 - 180 for a in azimuths]
+        measurement['shadow_length'] = float(np.median(lengths))
+        measurement['shadow_azimuth'] = (reference + float(np.median(unwrapped))) % 360
+        yield measurement
+
+
+def measure_burst(frames, max_frames=BURST_FRAMES, measurements=BURST_MEASUREMENTS,
+                  progress=None, marker_spacing=MARKER_SPACING, downscale=2):
+    """Mesure lissée d'une rafale d'images (au plus max_frames).
+
+    S'arrête dès que measurements mesures lissées sont obtenues. progress(fraction)
+    est appelé avant chaque image ; une exception qu'il lève interrompt la rafale.
+    """
+    def counted():
+        for index, frame in enumerate(islice(frames, max_frames)):
+            if progress is not None:
+                progress(index / max_frames)
+            yield frame
+
+    measurement = None
+    for count, measurement in enumerate(measure_stream(counted(), marker_spacing, downscale), 1):
+        if count >= measurements:
+            break
+    if measurement is None:
+        raise ShadowMeasurementError("Ni repère ni ombre détectés par la caméra.")
+    if progress is not None:
+        progress(1.0)
+    return measurement
+
+
+def capture_measurement(progress=None):
+    """Rafale de la caméra du Pi mesurée hors du thread de l'interface (voir workers)"""
+    frames = camera_frames()
+    try:
+        return measure_burst(frames, progress=progress)
+    finally:
+        frames.close()
+
+
+def camera_available():
+    return Picamera2 is not None
+
+
+def camera_frames(size=(640, 480)):
+    """Images RGB de la caméra du Pi (picamera2), en basse résolution pour le temps réel"""
+    if Picamera2 is None:
+        raise ShadowMeasurementError("picamera2 n'est pas installé")
+    camera = Picamera2()
+    camera.configure(camera.create_video_configuration(main={'size': size, 'format': 'RGB888'}))
+    camera.start()
+    try:
+        while True:
+            # RGB888 in libcamera terms is stored as BGR
+            yield camera.capture_array()[..., ::-1]
+    finally:
+        camera.stop()
+        camera.close()
+
+
+def render_synthetic_scene(shadow_length, shadow_azimuth, width=640, height=480,
+                           metres_per_pixel=0.004, north_angle=0.0,
+                           marker_spacing=MARKER_SPACING, base=None, noise=8.0, seed=None):
+    """Image RGB de synthèse : sol texturé, ombre du bâton et carte de repère.
+
+    north_angle est la rotation (degrés, sens horaire) du nord par rapport au
+    haut de l'image ; shadow_azimuth est mesuré depuis ce nord.
+    """
+    rng = np.random.default_rng(seed)
+    image = np.clip(rng.normal(170, noise, (height, width, 3)), 0, 255)
+    if base is None:
+        base = (width / 2, height / 2)
+    base_x, base_y = base
+    rows, columns = np.mgrid[0:height, 0:width]
+
+    def direction(azimuth):
+        theta = math.radians(north_angle + azimuth)
+        return math.sin(theta), -math.cos(theta)
+
+    # Shadow: a dark strip as wide as the stick, from the base to the tip
+    shadow_x, shadow_y = direction(shadow_azimuth)
+    length_pixels = shadow_length / metres_per_pixel
+    along = (columns - base_x) * shadow_x + (rows - base_y) * shadow_y
+    across = np.abs((columns - base_x) * shadow_y - (rows - base_y) * shadow_x)
+    strip = (along >= 0) & (along <= length_pixels) & (across <= max(2.0, 0.015 / metres_per_pixel))
+    image[strip] = image[strip] * 0.35
+
+    # Marker card: red disc at the base, blue disc towards north
+    radius = max(3.0, 0.015 / metres_per_pixel)
+    north_x, north_y = direction(0.0)
+    spacing_pixels = marker_spacing / metres_per_pixel
+    for colour, (centre_x, centre_y) in (
+        ((220, 30, 30), (base_x, base_y)),
+        ((30, 60, 220), (base_x + north_x * spacing_pixels, base_y + north_y * spacing_pixels)),
+    ):
+        disc = (columns - centre_x) ** 2 + (rows - centre_y) ** 2 <= radius ** 2
+        image[disc] = colour
+    return image.astype(np.uint8)
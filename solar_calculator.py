@@ -0,0 +1,809 @@
+"""Calcul de position par ombre solaire, sans dépendance à Qt.
+
+Module pur Python/NumPy utilisé par l'interface (overlay.py) et par la ligne
+de commande (geolocate.py). Les heures sont des datetime UTC naïfs ou des
+datetime64.
+"""
+
+import math
+import os
+import functools
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import numpy as np
+import ephemeris
+import wmm
+
+# Mean Earth radius, used to express angular spreads in kilometres
+EARTH_RADIUS_KM = 6371.0
+
+# Chi-square quantile with 2 degrees of freedom for a 95% ellipse
+CHI2_2DOF_95 = 5.991
+
+# Coarse grid spacing (degrees) used to seed the multi-observation fit
+SEED_GRID_STEP = 5.0
+
+# Latitude bound of the refinement; a candidate stopped there is an artefact
+LATITUDE_LIMIT = 89.999
+
+# Global search candidates kept: misfit within this factor (or margin) of the best
+CANDIDATE_MISFIT_FACTOR = 10.0
+CANDIDATE_MISFIT_MARGIN = 25.0
+
+# A second exact solution of a single reading is reported when it converges
+# this far (degrees) from the first one, with a residual below the threshold
+ALTERNATIVE_MIN_SEPARATION = 0.01
+ALTERNATIVE_MAX_RESIDUAL = 1e-6
+
+# Monte Carlo draws solved per batch between two progress reports
+UNCERTAINTY_CHUNK = 2000
+
+# Distinct instants whose time terms are memoized for single solves
+TIME_TERMS_CACHE = 256
+
+# Record layout returned by the batch solver, one row per observation
+POSITION_DTYPE = np.dtype([
+    ('latitude', np.float64),
+    ('longitude', np.float64),
+    ('elevation', np.float64),
+    ('declination', np.float64),
+    ('equation_of_time', np.float64),
+    ('sun_azimuth', np.float64),
+    ('day_of_year', np.int16),
+    ('iterations', np.int16),
+    ('residual', np.float64),
+    ('converged', np.bool_),
+    # Other exact solution of the same reading, NaN when there is none
+    ('alternative_latitude', np.float64),
+    ('alternative_longitude', np.float64),
+])
+
+_pool = None
+_pool_workers = 0
+
+
+class CalculationCancelled(Exception):
+    """Levée par un rappel de progression pour interrompre un calcul long"""
+
+
+def _process_pool(workers):
+    """Pool de processus partagé, créé au premier besoin"""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def _misfit_band(latitudes, longitudes, terms):
+    # Runs in a worker process: one latitude band of the likelihood map,
+    # broadcasting rows against columns so trig terms are computed per axis
+    return SolarGeolocationCalculator.misfit(
+        latitudes[:, None], longitudes[None, :], terms
+    ).astype(np.float32)
+
+
+class SolverStatistics:
+    """Compteurs cumulés des résolutions, pour suivre le comportement du solveur"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        self.calls = 0
+        self.solves = 0
+        self.iterations = 0
+        self.converged = 0
+        self.wall_time = 0.0
+        self.histogram = Counter()
+    
+    def record(self, iterations, converged, wall_time):
+        iterations = np.asarray(iterations).reshape(-1)
+        counts = np.bincount(iterations)
+        with self.lock:
+            self.calls += 1
+            self.solves += iterations.size
+            self.iterations += int(iterations.sum())
+            self.converged += int(np.count_nonzero(converged))
+            self.wall_time += wall_time
+            self.histogram.update({count: int(n) for count, n in enumerate(counts) if n})
+    
+    def summary(self):
+        with self.lock:
+            solves = max(self.solves, 1)
+            return {
+                'calls': self.calls,
+                'solves': self.solves,
+                'mean_iterations': self.iterations / solves,
+                'converged_ratio': self.converged / solves,
+                'mean_solve_time': self.wall_time / max(self.calls, 1),
+                'iteration_histogram': dict(sorted(self.histogram.items()))
+            }
+
+
+class SolarGeolocationCalculator:
+    # Solves asked for by a caller; the Monte Carlo draws have their own counters
+    statistics = SolverStatistics()
+    monte_carlo_statistics = SolverStatistics()
+    
+    @staticmethod
+    def to_radians(degrees):
+        return degrees * math.pi / 180
+    
+    @staticmethod
+    def to_degrees(radians):
+        return radians * 180 / math.pi
+    
+    @staticmethod
+    def solar_time(timestamps):
+        """Termes dépendant de l'heure pour des datetime64 UTC.
+
+        Retourne (temps solaire vrai à Greenwich en heures, jour de l'année,
+        déclinaison en degrés, équation du temps en minutes), la déclinaison
+        et l'équation du temps venant de la table d'éphémérides.
+        """
+        timestamps = np.asarray(timestamps, dtype='datetime64[ms]')
+        days = timestamps.astype('datetime64[D]')
+        utc_decimal = (timestamps - days) / np.timedelta64(1, 'h')
+        day_of_year = (days - days.astype('datetime64[Y]')).astype(np.int64) + 1
+        declination, equation_of_time = ephemeris.lookup(timestamps)
+        return utc_decimal + equation_of_time / 60, day_of_year, declination, equation_of_time
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=TIME_TERMS_CACHE)
+    def time_terms(timestamp):
+        """solar_time() pour un seul datetime64, mémorisé : recalculer avec la
+        même date et la même heure ne relit pas la table d'éphémérides"""
+        solar_time, day_of_year, declination, equation_of_time = (
+            SolarGeolocationCalculator.solar_time(timestamp)
+        )
+        return float(solar_time), int(day_of_year), float(declination), float(equation_of_time)
+    
+    @staticmethod
+    def sun_model(latitude, longitude, solar_time, declination, jacobian=True):
+        """Modèle direct : élévation et azimut du soleil (degrés) et leurs dérivées.
+
+        solar_time est le temps solaire vrai à Greenwich (heures), d'où le même
+        angle horaire que calculate_position. Retourne (élévation, azimut,
+        d_elev/d_lat, d_elev/d_lon, d_az/d_lat, d_az/d_lon), ou seulement
+        (élévation, azimut) si jacobian est faux.
+        """
+        lat = np.radians(latitude)
+        dec = np.radians(declination)
+        hour_angle = np.radians(15 * (solar_time - 12) + longitude)
+        
+        sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+        sin_dec, cos_dec = np.sin(dec), np.cos(dec)
+        sin_ha, cos_ha = np.sin(hour_angle), np.cos(hour_angle)
+        
+        sin_elevation = np.clip(sin_lat * sin_dec + cos_lat * cos_dec * cos_ha, -1, 1)
+        elevation = np.arcsin(sin_elevation)
+        cos_elevation = np.cos(elevation)
+        
+        # Azimuth measured clockwise from north
+        x = sin_dec * cos_lat - cos_dec * sin_lat * cos_ha
+        y = -cos_dec * sin_ha
+        azimuth = np.degrees(np.arctan2(y, x)) % 360
+        if not jacobian:
+            return np.degrees(elevation), azimuth
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d_elev_dlat = (cos_lat * sin_dec - sin_lat * cos_dec * cos_ha) / cos_elevation
+            d_elev_dlon = -cos_lat * cos_dec * sin_ha / cos_elevation
+            
+            norm = x * x + y * y
+            dx_dlat = -sin_dec * sin_lat - cos_dec * cos_lat * cos_ha
+            dx_dlon = cos_dec * sin_lat * sin_ha
+            dy_dlon = -cos_dec * cos_ha
+            d_az_dlat = -y * dx_dlat / norm
+            d_az_dlon = (x * dy_dlon - y * dx_dlon) / norm
+        
+        return (np.degrees(elevation), azimuth,
+                d_elev_dlat, d_elev_dlon, d_az_dlat, d_az_dlon)
+    
+    @staticmethod
+    def confidence_ellipse(covariance):
+        """Demi-axes (km) et orientation (degrés) de l'ellipse à 95 % d'une covariance est/nord."""
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        eigenvalues = np.clip(eigenvalues, 0, None)
+        major = eigenvectors[:, 1]
+        return {
+            'semi_major': math.sqrt(CHI2_2DOF_95 * eigenvalues[1]),
+            'semi_minor': math.sqrt(CHI2_2DOF_95 * eigenvalues[0]),
+            'orientation': math.degrees(math.atan2(major[0], major[1])) % 180
+        }
+    
+    @staticmethod
+    def initial_guess(elevation, sun_azimuth, solar_time, declination, second_root=False):
+        """Position approchée, en forme fermée, à partir du point subsolaire.
+
+        Le soleil est vu à la distance zénithale z = 90° - élévation dans
+        l'azimut A : on résout sin(δ) = sin(φ)cos(z) + cos(φ)sin(z)cos(A) pour
+        la latitude, puis la différence de longitude avec le point subsolaire.
+        L'équation a deux racines ; avec second_root, retourne l'autre racine
+        là où les deux sont des latitudes valides, NaN ailleurs.
+        """
+        zenith = np.radians(90 - elevation)
+        azimuth = np.radians(sun_azimuth)
+        sin_dec = np.sin(np.radians(declination))
+        
+        a = np.cos(zenith)
+        b = np.sin(zenith) * np.cos(azimuth)
+        gamma = np.arctan2(b, a)
+        ratio = np.arcsin(np.clip(sin_dec / np.hypot(a, b), -1, 1))
+        first = ratio - gamma
+        second = (np.pi - ratio - gamma + np.pi) % (2 * np.pi) - np.pi
+        first_valid = np.abs(first) <= np.pi / 2
+        if second_root:
+            latitude = np.where(first_valid & (np.abs(second) <= np.pi / 2), second, np.nan)
+        else:
+            # Second root when the first one falls outside [-90°, 90°]
+            latitude = np.where(first_valid, first, second)
+        latitude = np.clip(latitude, -np.pi / 2, np.pi / 2)
+        
+        delta_longitude = np.arctan2(
+            np.sin(azimuth) * np.sin(zenith) * np.cos(latitude),
+            np.cos(zenith) - np.sin(latitude) * sin_dec
+        )
+        subsolar_longitude = -15 * (solar_time - 12)
+        longitude = (subsolar_longitude - np.degrees(delta_longitude) + 180) % 360 - 180
+        return np.degrees(latitude), longitude
+    
+    @staticmethod
+    def newton_solve(elevation, sun_azimuth, solar_time, declination,
+                     tolerance=1e-8, max_iterations=20, second_root=False):
+        """Newton sur (élévation, azimut) = modèle(latitude, longitude), élément par élément.
+
+        Part de initial_guess() (de sa seconde racine avec second_root) et
+        s'arrête, pour chaque élément, dès que le pas est inférieur à tolerance
+        (degrés) ou après max_iterations. Retourne (latitude, longitude,
+        itérations, résidu en degrés, convergé).
+        """
+        elevation, sun_azimuth, solar_time, declination = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(elevation, dtype=np.float64)),
+            np.atleast_1d(np.asarray(sun_azimuth, dtype=np.float64)),
+            np.atleast_1d(np.asarray(solar_time, dtype=np.float64)),
+            np.atleast_1d(np.asarray(declination, dtype=np.float64))
+        )
+        latitude, longitude = SolarGeolocationCalculator.initial_guess(
+            elevation, sun_azimuth, solar_time, declination, second_root
+        )
+        latitude = np.array(latitude, dtype=np.float64)
+        longitude = np.array(longitude, dtype=np.float64)
+        iterations = np.zeros(latitude.shape, dtype=np.int64)
+        converged = np.zeros(latitude.shape, dtype=bool)
+        active = np.flatnonzero(np.isfinite(latitude) & np.isfinite(longitude))
+        
+        flat_lat = latitude.reshape(-1)
+        flat_lon = longitude.reshape(-1)
+        flat_iterations = iterations.reshape(-1)
+        flat_converged = converged.reshape(-1)
+        flat_elevation = elevation.reshape(-1)
+        flat_azimuth = sun_azimuth.reshape(-1)
+        flat_time = solar_time.reshape(-1)
+        flat_declination = declination.reshape(-1)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for _ in range(max_iterations):
+                if active.size == 0:
+                    break
+                model = SolarGeolocationCalculator.sun_model(
+                    flat_lat[active], flat_lon[active], flat_time[active], flat_declination[active]
+                )
+                elevation_error = model[0] - flat_elevation[active]
+                azimuth_error = (model[1] - flat_azimuth[active] + 180) % 360 - 180
+                
+                # Explicit 2x2 inverse of the Jacobian
+                determinant = model[2] * model[5] - model[3] * model[4]
+                step_lat = -(model[5] * elevation_error - model[3] * azimuth_error) / determinant
+                step_lon = -(model[2] * azimuth_error - model[4] * elevation_error) / determinant
+                singular = ~(np.isfinite(step_lat) & np.isfinite(step_lon))
+                step_lat[singular] = 0
+                step_lon[singular] = 0
+                
+                flat_lat[active] = np.clip(flat_lat[active] + step_lat, -90, 90)
+                flat_lon[active] = (flat_lon[active] + step_lon + 180) % 360 - 180
+                flat_iterations[active] += 1
+                
+                done = np.maximum(np.abs(step_lat), np.abs(step_lon)) < tolerance
+                flat_converged[active] = done & ~singular
+                active = active[~done & ~singular]
+        
+        model = SolarGeolocationCalculator.sun_model(
+            latitude, longitude, solar_time, declination, jacobian=False
+        )
+        residual = np.hypot(model[0] - elevation, (model[1] - sun_azimuth + 180) % 360 - 180)
+        return latitude, longitude, iterations, residual, converged
+    
+    @staticmethod
+    def alternative_solve(elevation, sun_azimuth, solar_time, declination, latitude, longitude,
+                          tolerance=1e-8, max_iterations=20):
+        """Autre solution exacte d'une mesure unique, ou NaN.
+
+        Distance zénithale et azimut ne fixent la latitude qu'à deux racines
+        près : quand les deux sont valides, les deux positions expliquent
+        exactement la mesure. Newton repart de la seconde racine ; la
+        solution n'est retenue que si elle converge loin de (latitude, longitude).
+        """
+        other_lat, other_lon, _, residual, converged = SolarGeolocationCalculator.newton_solve(
+            elevation, sun_azimuth, solar_time, declination, tolerance, max_iterations, second_root=True
+        )
+        with np.errstate(invalid='ignore'):
+            separation = np.maximum(np.abs(other_lat - latitude),
+                                    np.abs((other_lon - longitude + 180) % 360 - 180))
+            distinct = (converged & (residual < ALTERNATIVE_MAX_RESIDUAL)
+                        & (separation > ALTERNATIVE_MIN_SEPARATION))
+        return np.where(distinct, other_lat, np.nan), np.where(distinct, other_lon, np.nan)
+    
+    @staticmethod
+    def calculate_position(stick_height, shadow_length, shadow_azimuth, 
+                          utc_time, date, magnetic_declination,
+                          tolerance=1e-8, max_iterations=20,
+                          refine_declination=False, declination_tolerance=0.01, max_passes=8):
+        """Position à partir d'une mesure ; utc_time est un datetime.time, date un datetime.date.
+
+        Avec refine_declination, magnetic_declination n'est qu'un point de
+        départ : la déclinaison du modèle WMM au point trouvé est réinjectée
+        jusqu'à ce que position et déclinaison concordent.
+        """
+        start = time.perf_counter()
+        
+        # Apparent solar time at Greenwich, day of year, declination and
+        # equation of time from the ephemeris table
+        timestamp = np.datetime64(datetime.combine(date, utc_time), 'ms')
+        solar_time, day_of_year, declination, equation_of_time = (
+            SolarGeolocationCalculator.time_terms(timestamp)
+        )
+        
+        # Sun elevation angle
+        elevation = math.atan(stick_height / shadow_length)
+        elevation_deg = SolarGeolocationCalculator.to_degrees(elevation)
+        
+        if refine_declination and wmm.default_model() is None:
+            raise wmm.MagneticModelError(f"Fichier {wmm.COEFFICIENTS_NAME} introuvable")
+        
+        passes = 0
+        while True:
+            passes += 1
+            # Correct azimuth for magnetic declination
+            true_azimuth = shadow_azimuth + magnetic_declination
+            # Shadow azimuth is opposite to sun azimuth
+            sun_azimuth = (true_azimuth + 180) % 360
+            
+            latitude, longitude, iterations, residual, converged = SolarGeolocationCalculator.newton_solve(
+                elevation_deg, sun_azimuth, solar_time, declination, tolerance, max_iterations
+            )
+            if not refine_declination or passes >= max_passes:
+                break
+            # The declination changes slowly with position, so this fixed
+            # point settles in a few passes
+            updated = float(wmm.declination(latitude[0], longitude[0], date))
+            if abs((updated - magnetic_declination + 180) % 360 - 180) < declination_tolerance:
+                break
+            magnetic_declination = updated
+        alternative_lat, alternative_lon = SolarGeolocationCalculator.alternative_solve(
+            elevation_deg, sun_azimuth, solar_time, declination, latitude, longitude,
+            tolerance, max_iterations
+        )
+        alternative = None
+        if np.isfinite(alternative_lat[0]):
+            alternative = {'latitude': float(alternative_lat[0]), 'longitude': float(alternative_lon[0])}
+        solve_time = time.perf_counter() - start
+        SolarGeolocationCalculator.statistics.record(iterations, converged, solve_time)
+        
+        return {
+            'latitude': float(latitude[0]),
+            'longitude': float(longitude[0]),
+            'elevation': elevation_deg,
+            'declination': float(declination),
+            'equation_of_time': float(equation_of_time),
+            'sun_azimuth': sun_azimuth,
+            'day_of_year': int(day_of_year),
+            'iterations': int(iterations[0]),
+            'residual': float(residual[0]),
+            'converged': bool(converged[0]),
+            'magnetic_declination': float(magnetic_declination),
+            'declination_passes': passes,
+            'alternative': alternative,
+            'ambiguous': alternative is not None,
+            'solve_time': solve_time
+        }
+    
+    @staticmethod
+    def calculate_positions(stick_heights, shadow_lengths, shadow_azimuths,
+                            timestamps, magnetic_declinations,
+                            tolerance=1e-8, max_iterations=20, alternatives=True, statistics=None):
+        """Version vectorisée de calculate_position pour des séries de mesures.
+
+        Les arguments sont des tableaux NumPy (ou des scalaires diffusés) ;
+        timestamps est un tableau de datetime64 en UTC. Retourne un tableau
+        structuré de type POSITION_DTYPE. Sans alternatives, la seconde
+        solution n'est pas cherchée (champs alternative_* à NaN). Les
+        résolutions sont comptées dans statistics (par défaut, les compteurs
+        de la classe).
+        """
+        start = time.perf_counter()
+        stick_heights, shadow_lengths, shadow_azimuths, magnetic_declinations = np.broadcast_arrays(
+            np.asarray(stick_heights, dtype=np.float64),
+            np.asarray(shadow_lengths, dtype=np.float64),
+            np.asarray(shadow_azimuths, dtype=np.float64),
+            np.asarray(magnetic_declinations, dtype=np.float64)
+        )
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype='datetime64[ms]'), stick_heights.shape)
+        
+        # Apparent solar time, day of year, declination and equation of time
+        solar_time, day_of_year, declination, equation_of_time = (
+            SolarGeolocationCalculator.solar_time(timestamps)
+        )
+        
+        # Sun elevation angle
+        elevation = np.degrees(np.arctan(stick_heights / shadow_lengths))
+        
+        # Correct azimuth for magnetic declination, shadow is opposite to sun
+        sun_azimuth = (shadow_azimuths + magnetic_declinations + 180) % 360
+        
+        # Same Newton solve as the scalar path, on every row at once
+        latitude, longitude, iterations, residual, converged = SolarGeolocationCalculator.newton_solve(
+            elevation, sun_azimuth, solar_time, declination, tolerance, max_iterations
+        )
+        
+        results = np.empty(elevation.shape, dtype=POSITION_DTYPE)
+        results['latitude'] = latitude.reshape(elevation.shape)
+        results['longitude'] = longitude.reshape(elevation.shape)
+        results['elevation'] = elevation
+        results['declination'] = declination
+        results['equation_of_time'] = equation_of_time
+        results['sun_azimuth'] = sun_azimuth
+        results['day_of_year'] = day_of_year
+        results['iterations'] = iterations.reshape(elevation.shape)
+        results['residual'] = residual.reshape(elevation.shape)
+        results['converged'] = converged.reshape(elevation.shape)
+        results['alternative_latitude'] = np.nan
+        results['alternative_longitude'] = np.nan
+        if alternatives:
+            alternative_lat, alternative_lon = SolarGeolocationCalculator.alternative_solve(
+                elevation, sun_azimuth, solar_time, declination,
+                latitude.reshape(elevation.shape), longitude.reshape(elevation.shape),
+                tolerance, max_iterations
+            )
+            results['alternative_latitude'] = alternative_lat.reshape(elevation.shape)
+            results['alternative_longitude'] = alternative_lon.reshape(elevation.shape)
+        
+        statistics = statistics or SolarGeolocationCalculator.statistics
+        statistics.record(iterations, converged, time.perf_counter() - start)
+        return results
+    
+    @staticmethod
+    def estimate_uncertainty(stick_height, shadow_length, shadow_azimuth,
+                             timestamp, magnetic_declination,
+                             length_error=0.01, azimuth_error=2.0, time_error=30.0,
+                             samples=20000, seed=None, progress=None):
+        """Propage les erreurs de mesure par tirage Monte Carlo.
+
+        Les erreurs sont des écarts-types : length_error en mètres (mètre ruban,
+        appliqué au bâton et à l'ombre), azimuth_error en degrés (boussole) et
+        time_error en secondes (montre). Les tirages sont résolus par paquets
+        vectorisés de calculate_positions ; progress(fraction) est appelé
+        après chaque paquet et peut lever CalculationCancelled.
+        """
+        rng = np.random.default_rng(seed)
+        
+        # Nominal fix, used as the centre of the local east/north frame
+        nominal = SolarGeolocationCalculator.calculate_positions(
+            stick_height, shadow_length, shadow_azimuth, timestamp, magnetic_declination,
+            statistics=SolarGeolocationCalculator.monte_carlo_statistics
+        )
+        
+        # Perturbed inputs
+        heights = stick_height + rng.normal(0, length_error, samples)
+        lengths = shadow_length + rng.normal(0, length_error, samples)
+        azimuths = shadow_azimuth + rng.normal(0, azimuth_error, samples)
+        offsets = np.rint(rng.normal(0, time_error * 1000, samples)).astype('timedelta64[ms]')
+        timestamps = np.datetime64(timestamp, 'ms') + offsets
+        
+        # Discard draws with non-physical lengths
+        valid = (heights > 0) & (lengths > 0)
+        heights, lengths, azimuths, timestamps = (
+            heights[valid], lengths[valid], azimuths[valid], timestamps[valid]
+        )
+        chunks = []
+        for start in range(0, heights.size, UNCERTAINTY_CHUNK):
+            batch = slice(start, start + UNCERTAINTY_CHUNK)
+            # Draws follow the nominal branch; the other root is not looked for
+            chunks.append(SolarGeolocationCalculator.calculate_positions(
+                heights[batch], lengths[batch], azimuths[batch], timestamps[batch], magnetic_declination,
+                alternatives=False, statistics=SolarGeolocationCalculator.monte_carlo_statistics
+            ))
+            if progress is not None:
+                progress(min(start + UNCERTAINTY_CHUNK, heights.size) / heights.size)
+        positions = np.concatenate(chunks) if chunks else np.zeros(0, dtype=POSITION_DTYPE)
+        latitudes = positions['latitude']
+        longitudes = positions['longitude']
+        finite = np.isfinite(latitudes) & np.isfinite(longitudes)
+        latitudes = latitudes[finite]
+        longitudes = longitudes[finite]
+        if latitudes.size < 2:
+            raise ValueError("Aucun tirage exploitable pour estimer l'incertitude")
+        
+        # Project samples on a local tangent plane around the nominal fix (km)
+        lat0 = float(nominal['latitude'])
+        lon0 = float(nominal['longitude'])
+        km_per_degree = EARTH_RADIUS_KM * math.pi / 180
+        delta_lon = (longitudes - lon0 + 180) % 360 - 180
+        east = delta_lon * math.cos(math.radians(lat0)) * km_per_degree
+        north = (latitudes - lat0) * km_per_degree
+        
+        covariance = np.cov(np.vstack((east, north)))
+        radii = np.hypot(east, north)
+        mean_east = float(east.mean())
+        mean_north = float(north.mean())
+        
+        results = {
+            'latitude': lat0 + mean_north / km_per_degree,
+            'longitude': lon0 + mean_east / (km_per_degree * math.cos(math.radians(lat0))),
+            'covariance': covariance,
+            'radius_50': float(np.percentile(radii, 50)),
+            'radius_95': float(np.percentile(radii, 95)),
+            'samples': int(latitudes.size)
+        }
+        results.update(SolarGeolocationCalculator.confidence_ellipse(covariance))
+        return results
+    
+    @staticmethod
+    def observation_terms(stick_heights, shadow_lengths, shadow_azimuths,
+                          timestamps, magnetic_declination,
+                          length_error=0.01, azimuth_error=2.0):
+        """Angles solaires observés, écarts-types et termes horaires de N relevés"""
+        stick_heights, shadow_lengths, shadow_azimuths = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(stick_heights, dtype=np.float64)),
+            np.atleast_1d(np.asarray(shadow_lengths, dtype=np.float64)),
+            np.atleast_1d(np.asarray(shadow_azimuths, dtype=np.float64))
+        )
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype='datetime64[ms]'), stick_heights.shape)
+        # One declination for every reading, or one per reading (as recorded in the history)
+        magnetic_declination = np.broadcast_to(
+            np.asarray(magnetic_declination, dtype=np.float64), stick_heights.shape)
+        if stick_heights.size == 0:
+            raise ValueError("Aucune mesure à ajuster")
+        
+        solar_time, day_of_year, declination, equation_of_time = (
+            SolarGeolocationCalculator.solar_time(timestamps)
+        )
+        
+        # Observed sun angles and their standard deviations (degrees)
+        elevation_sigma = np.degrees(length_error / np.hypot(stick_heights, shadow_lengths))
+        return {
+            'solar_time': solar_time,
+            'declination': declination,
+            'elevation': np.degrees(np.arctan(stick_heights / shadow_lengths)),
+            'azimuth': (shadow_azimuths + magnetic_declination + 180) % 360,
+            'elevation_sigma': np.maximum(elevation_sigma, 1e-3),
+            'azimuth_sigma': np.full(stick_heights.shape, max(azimuth_error, 1e-3))
+        }
+    
+    @staticmethod
+    def misfit(latitude, longitude, terms):
+        """Somme des résidus normalisés au carré, vectorisée sur une grille de positions"""
+        total = np.zeros(np.broadcast(latitude, longitude).shape)
+        for i in range(terms['elevation'].size):
+            elevation, azimuth = SolarGeolocationCalculator.sun_model(
+                latitude, longitude, terms['solar_time'][i], terms['declination'][i], jacobian=False
+            )
+            total += ((terms['elevation'][i] - elevation) / terms['elevation_sigma'][i]) ** 2
+            total += (((terms['azimuth'][i] - azimuth + 180) % 360 - 180) / terms['azimuth_sigma'][i]) ** 2
+        return total
+    
+    @staticmethod
+    def residuals(latitude, longitude, terms, mask=Ellipsis):
+        """Résidus normalisés (élévation, azimut) et jacobien pondéré des relevés sélectionnés"""
+        model = SolarGeolocationCalculator.sun_model(
+            latitude, longitude, terms['solar_time'][mask], terms['declination'][mask]
+        )
+        elevation_sigma = terms['elevation_sigma'][mask]
+        azimuth_sigma = terms['azimuth_sigma'][mask]
+        elevation_residual = (terms['elevation'][mask] - model[0]) / elevation_sigma
+        azimuth_residual = ((terms['azimuth'][mask] - model[1] + 180) % 360 - 180) / azimuth_sigma
+        jacobian = np.concatenate((
+            np.column_stack((model[2], model[3])) / elevation_sigma[:, None],
+            np.column_stack((model[4], model[5])) / azimuth_sigma[:, None]
+        ))
+        return elevation_residual, azimuth_residual, jacobian
+    
+    @staticmethod
+    def refine(latitude, longitude, terms, mask=Ellipsis, tolerance=1e-7, max_iterations=50):
+        """Levenberg-Marquardt depuis (latitude, longitude) ; retourne (lat, lon, coût, itérations)"""
+        damping = 1e-3
+        elevation_residual, azimuth_residual, jacobian = (
+            SolarGeolocationCalculator.residuals(latitude, longitude, terms, mask)
+        )
+        cost = np.sum(elevation_residual ** 2) + np.sum(azimuth_residual ** 2)
+        iterations = 0
+        while iterations < max_iterations:
+            iterations += 1
+            residual = np.concatenate((elevation_residual, azimuth_residual))
+            normal = jacobian.T @ jacobian
+            gradient = jacobian.T @ residual
+            step = np.linalg.solve(normal + damping * np.diag(np.diag(normal) + 1e-9), gradient)
+            
+            trial_latitude = float(np.clip(latitude + step[0], -LATITUDE_LIMIT, LATITUDE_LIMIT))
+            trial_longitude = float((longitude + step[1] + 180) % 360 - 180)
+            trial = SolarGeolocationCalculator.residuals(trial_latitude, trial_longitude, terms, mask)
+            trial_cost = np.sum(trial[0] ** 2) + np.sum(trial[1] ** 2)
+            if trial_cost < cost:
+                latitude, longitude = trial_latitude, trial_longitude
+                elevation_residual, azimuth_residual, jacobian = trial
+                converged = cost - trial_cost < tolerance * (1 + cost)
+                cost = trial_cost
+                damping = max(damping / 10, 1e-9)
+                if converged or np.max(np.abs(step)) < tolerance:
+                    break
+            else:
+                damping *= 10
+                if damping > 1e9:
+                    break
+        return latitude, longitude, float(cost), iterations
+    
+    @staticmethod
+    def fit_observations(stick_heights, shadow_lengths, shadow_azimuths,
+                         timestamps, magnetic_declination,
+                         length_error=0.01, azimuth_error=2.0,
+                         tolerance=1e-7, max_iterations=50, outlier_threshold=3.0):
+        """Ajuste conjointement latitude et longitude sur N relevés horodatés.
+
+        Moindres carrés non linéaires pondérés (Levenberg-Marquardt, jacobiens
+        analytiques de sun_model) sur les résidus d'élévation et d'azimut.
+        Les relevés dont le résidu normalisé dépasse outlier_threshold sont
+        rejetés un par un, en gardant au moins deux relevés.
+        magnetic_declination vaut pour tous les relevés, ou est un tableau
+        d'une valeur par relevé.
+        """
+        terms = SolarGeolocationCalculator.observation_terms(
+            stick_heights, shadow_lengths, shadow_azimuths, timestamps,
+            magnetic_declination, length_error, azimuth_error
+        )
+        count = terms['elevation'].size
+        
+        # Seed from a coarse global grid
+        grid_lat, grid_lon = np.meshgrid(
+            np.arange(-90 + SEED_GRID_STEP / 2, 90, SEED_GRID_STEP),
+            np.arange(-180, 180, SEED_GRID_STEP),
+            indexing='ij'
+        )
+        misfit = SolarGeolocationCalculator.misfit(grid_lat, grid_lon, terms)
+        best = np.unravel_index(np.argmin(misfit), misfit.shape)
+        latitude = float(grid_lat[best])
+        longitude = float(grid_lon[best])
+        
+        inliers = np.ones(count, dtype=bool)
+        iterations = 0
+        while True:
+            latitude, longitude, cost, used = SolarGeolocationCalculator.refine(
+                latitude, longitude, terms, inliers, tolerance, max_iterations
+            )
+            iterations += used
+            
+            # Reject the worst reading if it is an outlier
+            elevation_residual, azimuth_residual = SolarGeolocationCalculator.residuals(
+                latitude, longitude, terms
+            )[:2]
+            normalized = np.hypot(elevation_residual, azimuth_residual)
+            candidates = np.where(inliers, normalized, -np.inf)
+            worst = int(np.argmax(candidates))
+            if inliers.sum() <= 2 or candidates[worst] <= outlier_threshold:
+                break
+            inliers[worst] = False
+        
+        # Formal covariance of (lat, lon), rescaled to the east/north plane in km
+        jacobian = SolarGeolocationCalculator.residuals(latitude, longitude, terms, inliers)[2]
+        km_per_degree = EARTH_RADIUS_KM * math.pi / 180
+        scale = np.diag([km_per_degree * math.cos(math.radians(latitude)), km_per_degree])
+        covariance_deg = np.linalg.pinv(jacobian.T @ jacobian)
+        # Inflated by the reduced chi-square when the readings scatter more than
+        # the stated measurement errors, never shrunk below them
+        dof = 2 * int(inliers.sum()) - 2
+        reduced_chi2 = cost / dof if dof > 0 else float('nan')
+        if dof > 0:
+            covariance_deg = covariance_deg * max(reduced_chi2, 1.0)
+        # Order as (east, north) to match estimate_uncertainty
+        covariance = scale @ covariance_deg[::-1, ::-1] @ scale
+        
+        residual_table = np.empty(count, dtype=[('elevation', np.float64), ('azimuth', np.float64)])
+        residual_table['elevation'] = elevation_residual * terms['elevation_sigma']
+        residual_table['azimuth'] = azimuth_residual * terms['azimuth_sigma']
+        
+        results = {
+            'latitude': latitude,
+            'longitude': longitude,
+            'covariance': covariance,
+            'residuals': residual_table,
+            'inliers': inliers,
+            'iterations': iterations,
+            'chi2': cost,
+            'reduced_chi2': reduced_chi2
+        }
+        results.update(SolarGeolocationCalculator.confidence_ellipse(covariance))
+        return results
+    
+    @staticmethod
+    def global_search(stick_heights, shadow_lengths, shadow_azimuths,
+                      timestamps, magnetic_declination,
+                      length_error=0.01, azimuth_error=2.0,
+                      resolution=0.1, max_candidates=5, workers=None, progress=None):
+        """Carte de vraisemblance sur tout le globe et liste de toutes les positions candidates.
+
+        Le désaccord avec le modèle direct est évalué sur une grille
+        latitude/longitude découpée en bandes réparties sur un pool de
+        processus. Chaque minimum local est ensuite affiné par refine().
+        Retourne les candidats triés par désaccord croissant et un indicateur
+        d'ambiguïté (plusieurs candidats statistiquement indiscernables).
+        progress(fraction) est appelé à chaque bande terminée ; s'il lève
+        CalculationCancelled, les bandes pas encore commencées sont abandonnées.
+        """
+        terms = SolarGeolocationCalculator.observation_terms(
+            stick_heights, shadow_lengths, shadow_azimuths, timestamps,
+            magnetic_declination, length_error, azimuth_error
+        )
+        latitudes = np.arange(-90 + resolution / 2, 90, resolution)
+        longitudes = np.arange(-180, 180, resolution)
+        
+        # Latitude bands, several per worker to balance the load
+        workers = workers or os.cpu_count() or 1
+        pool = _process_pool(workers)
+        bands = np.array_split(latitudes, workers * 4)
+        futures = [pool.submit(_misfit_band, band, longitudes, terms) for band in bands]
+        try:
+            for done, _ in enumerate(as_completed(futures), 1):
+                if progress is not None:
+                    progress(done / len(futures))
+        finally:
+            # No-op once every band is done; drops the queued ones on cancel
+            for future in futures:
+                future.cancel()
+        misfit = np.vstack([future.result() for future in futures])
+        
+        # Local minima against the 8 neighbours, longitude wrapping around
+        padded = np.pad(misfit, ((1, 1), (0, 0)), constant_values=np.inf)
+        is_minimum = np.ones(misfit.shape, dtype=bool)
+        for lat_shift in (-1, 0, 1):
+            rows = padded[1 + lat_shift:padded.shape[0] - 1 + lat_shift]
+            for lon_shift in (-1, 0, 1):
+                if lat_shift or lon_shift:
+                    is_minimum &= misfit <= np.roll(rows, lon_shift, axis=1)
+        rows, columns = np.nonzero(is_minimum)
+        order = np.argsort(misfit[rows, columns])[:max_candidates * 4]
+        
+        candidates = []
+        for row, column in zip(rows[order], columns[order]):
+            latitude, longitude, cost, iterations = SolarGeolocationCalculator.refine(
+                float(latitudes[row]), float(longitudes[column]), terms
+            )
+            duplicate = any(
+                abs(latitude - other['latitude']) < resolution
+                and abs((longitude - other['longitude'] + 180) % 360 - 180) < resolution
+                for other in candidates
+            )
+            # Refinements that ran into the pole clamp did not find a minimum
+            if not duplicate and abs(latitude) < LATITUDE_LIMIT - 1e-6:
+                candidates.append({'latitude': latitude, 'longitude': longitude, 'misfit': cost,
+                                   'iterations': iterations})
+        candidates.sort(key=lambda candidate: candidate['misfit'])
+        if candidates:
+            best = candidates[0]['misfit']
+            limit = best + max(CANDIDATE_MISFIT_FACTOR * best, CANDIDATE_MISFIT_MARGIN)
+            candidates = [candidate for candidate in candidates if candidate['misfit'] <= limit]
+        candidates = candidates[:max_candidates]
+        
+        # Candidates within the 95% chi-square band of the best are indistinguishable
+        best = candidates[0]['misfit'] if candidates else np.inf
+        plausible = [c for c in candidates if c['misfit'] <= best + CHI2_2DOF_95]
+        return {
+            'candidates': candidates,
+            'ambiguous': len(plausible) > 1,
+            'grid_shape': misfit.shape
+        }
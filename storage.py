@@ -0,0 +1,69 @@
+"""Emplacement des fichiers générés et écriture atomique.
+
+Tables, grilles, index, historique et sockets vont dans un même répertoire,
+~/.cache/kt2maps par défaut, déplaçable avec KT2MAPS_DATA_DIR (images du
+kiosque en lecture seule). Les fichiers lus pendant qu'un autre processus
+peut les écrire sont d'abord écrits à côté puis substitués d'un coup : une
+coupure de courant laisse l'ancienne version ou la nouvelle, jamais un
+fichier tronqué.
+
+    with atomic_path(path) as temporary:
+        with open(temporary, 'wb') as handle:
+            np.save(handle, table)
+"""
+
+import os
+import shutil
+from contextlib import contextmanager
+
+DATA_DIR = os.environ.get('KT2MAPS_DATA_DIR', os.path.expanduser('~/.cache/kt2maps'))
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _fsync(path):
+    """Force sur le disque un fichier, ou un répertoire et les fichiers qu'il contient"""
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            child = os.path.join(path, name)
+            if os.path.isfile(child):
+                _fsync(child)
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+@contextmanager
+def atomic_path(path):
+    """Chemin temporaire à côté de path, substitué à path si le bloc se termine sans erreur.
+
+    Le bloc peut y écrire un fichier ou construire un répertoire.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    _remove(temporary)
+    try:
+        yield temporary
+    except BaseException:
+        _remove(temporary)
+        raise
+    # Data on the card before the rename, the rename itself after: a power cut
+    # can otherwise leave the new name pointing at an empty file
+    _fsync(temporary)
+    if os.path.isdir(temporary) and os.path.isdir(path):
+        # A directory cannot replace a non-empty one: move the old one aside first
+        previous = f"{path}.old"
+        _remove(previous)
+        os.replace(path, previous)
+        os.replace(temporary, path)
+        _remove(previous)
+    else:
+        os.replace(temporary, path)
+    _fsync(os.path.dirname(path) or '.')
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""Télémétrie des ressources du kiosque (psutil).
+
+Relève à intervalle fixe, pour Pure Maps, osmscout-server, onboard et
+l'overlay : charge CPU, mémoire résidente, débits d'entrées-sorties et
+nombre de threads, ainsi que la température du SoC et l'état de bridage
+(throttling) du Raspberry Pi. Les relevés sont écrits dans un fichier
+anneau de taille fixe (.npy projeté en mémoire) : chaque enregistrement
+porte son numéro de séquence, si bien qu'aucun en-tête n'est réécrit et
+qu'une coupure de courant ne coûte au pire que le dernier relevé.
+
+Le démon reste sous 1 % de CPU : les processus sont recherchés une fois par
+minute seulement (ou quand l'un d'eux disparaît), puis lus avec
+Process.oneshot(). L'overlay lit les résumés avec TelemetryReader.
+
+Exemple :
+    nice python3 telemetry.py run &
+    python3 telemetry.py summary --minutes 10
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import subprocess
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from storage import DATA_DIR, atomic_path
+
+RING_PATH = os.path.join(DATA_DIR, 'telemetry.npy')
+
+SAMPLE_INTERVAL = 5.0
+
+# 24 h of samples at the default interval
+RING_CAPACITY = 17280
+
+# Process table rescan period (s), the most expensive step of a sample
+RESCAN_INTERVAL = 60.0
+
+# Watched components and command-line fragments identifying their processes;
+# a process goes to the first group that matches
+GROUPS = (
+    ('osmscout', ('osmscout-server', 'OSMScoutServer')),
+    ('puremaps', ('PureMaps', 'pure-maps')),
+    ('onboard', ('onboard',)),
+    ('overlay', ('native_overlay.py', 'overlay.py')),
+    ('telemetry', ()),
+)
+GROUP_NAMES = tuple(name for name, _ in GROUPS)
+
+RECORD_DTYPE = np.dtype([
+    ('sequence', np.uint64),
+    ('time', np.float64),
+    ('temperature', np.float32),
+    ('throttled', np.uint32),
+    ('processes', np.uint8, len(GROUPS)),
+    ('cpu', np.float32, len(GROUPS)),
+    ('rss', np.float32, len(GROUPS)),
+    ('read_rate', np.float32, len(GROUPS)),
+    ('write_rate', np.float32, len(GROUPS)),
+    ('threads', np.uint16, len(GROUPS)),
+])
+
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+THROTTLED_SYSFS = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+
+# Bits of the firmware throttling word that are set right now
+THROTTLE_FLAGS = {
+    0x1: "sous-tension",
+    0x2: "fréquence ARM plafonnée",
+    0x4: "bridage",
+    0x8: "limite thermique",
+}
+
+logger = logging.getLogger('kt2maps.telemetry')
+
+_reader = None
+
+
+class TelemetryError(RuntimeError):
+    """Télémétrie indisponible (psutil absent ou fichier anneau illisible)"""
+
+
+def soc_temperature():
+    """Température du SoC en °C, ou NaN si le capteur est absent"""
+    try:
+        with open(THERMAL_ZONE) as handle:
+            return int(handle.read()) / 1000
+    except (OSError, ValueError):
+        return float('nan')
+
+
+def _read_throttled_sysfs():
+    with open(THROTTLED_SYSFS) as handle:
+        return int(handle.read().strip(), 16)
+
+
+def _read_throttled_vcgencmd():
+    output = subprocess.run(['vcgencmd', 'get_throttled'], capture_output=True,
+                            text=True, timeout=1).stdout
+    return int(output.strip().split('=')[1], 16)
+
+
+THROTTLED_SOURCES = (_read_throttled_sysfs, _read_throttled_vcgencmd)
+THROTTLED_ERRORS = (OSError, subprocess.SubprocessError, IndexError, ValueError)
+
+# Source of the throttling word, looked for at the first sample only
+_throttled_source = None
+_throttled_detected = False
+
+
+def throttled_state():
+    """Mot d'état de bridage du firmware (0 si indisponible)
+
+    La source (sysfs, sinon vcgencmd) est cherchée au premier appel puis
+    gardée ; si aucune ne répond, ou si la source retenue échoue, le relevé
+    s'arrête plutôt que de relancer vcgencmd toutes les cinq secondes.
+    """
+    global _throttled_source, _throttled_detected
+    if not _throttled_detected:
+        _throttled_detected = True
+        for source in THROTTLED_SOURCES:
+            try:
+                state = source()
+            except THROTTLED_ERRORS:
+                continue
+            _throttled_source = source
+            return state
+        logger.info("État de bridage indisponible, relevé désactivé")
+    if _throttled_source is None:
+        return 0
+    try:
+        return _throttled_source()
+    except THROTTLED_ERRORS as error:
+        logger.warning("Lecture de l'état de bridage impossible, relevé désactivé : %s", error)
+        _throttled_source = None
+        return 0
+
+
+def describe_throttling(state):
+    return [label for bit, label in THROTTLE_FLAGS.items() if state & bit]
+
+
+def open_ring(path=RING_PATH, capacity=RING_CAPACITY, writable=False):
+    """Fichier anneau projeté en mémoire, créé à la taille fixe s'il n'existe pas"""
+    if writable and not os.path.exists(path):
+        with atomic_path(path) as temporary:
+            ring = np.lib.format.open_memmap(temporary, mode='w+', dtype=RECORD_DTYPE, shape=(capacity,))
+            ring.flush()
+            del ring
+    ring = np.load(path, mmap_mode='r+' if writable else 'r')
+    if ring.dtype != RECORD_DTYPE:
+        raise TelemetryError(f"Format de télémétrie inattendu dans {path}")
+    return ring
+
+
+class TelemetrySampler:
+    def __init__(self, path=RING_PATH, capacity=RING_CAPACITY):
+        if psutil is None:
+            raise TelemetryError("psutil est nécessaire pour la télémétrie")
+        self.ring = open_ring(path, capacity, writable=True)
+        # Continue the sequence after the last record already in the file
+        self.sequence = int(self.ring['sequence'].max()) + 1
+        self.own = psutil.Process()
+        self.members = {}
+        self.last_scan = 0.0
+        self.last_io = {}
+        self.last_time = None
+
+    def scan(self):
+        """Rattache les processus en cours aux groupes surveillés"""
+        members = {}
+        own_pid = self.own.pid
+        for process in psutil.process_iter(['pid', 'cmdline']):
+            if process.info['pid'] == own_pid:
+                continue
+            command = ' '.join(process.info['cmdline'] or ())
+            for index, (_, fragments) in enumerate(GROUPS):
+                if any(fragment in command for fragment in fragments):
+                    # Keep the Process objects already seen: cpu_percent()
+                    # measures from the previous call on the same object
+                    members[process.pid] = (index, self.members.get(process.pid, (None, process))[1])
+                    break
+        members[own_pid] = (GROUP_NAMES.index('telemetry'), self.own)
+        self.members = members
+        self.last_scan = time.monotonic()
+
+    def sample(self):
+        now = time.time()
+        if time.monotonic() - self.last_scan > RESCAN_INTERVAL:
+            self.scan()
+        elapsed = now - self.last_time if self.last_time else None
+        self.last_time = now
+
+        record = np.zeros((), dtype=RECORD_DTYPE)
+        record['sequence'] = self.sequence
+        record['time'] = now
+        record['temperature'] = soc_temperature()
+        record['throttled'] = throttled_state()
+        vanished = []
+        for pid, (index, process) in self.members.items():
+            try:
+                with process.oneshot():
+                    cpu = process.cpu_percent(None)
+                    rss = process.memory_info().rss
+                    threads = process.num_threads()
+                    try:
+                        io = process.io_counters()
+                        io = (io.read_bytes, io.write_bytes)
+                    except (psutil.AccessDenied, AttributeError):
+                        io = None
+            except psutil.NoSuchProcess:
+                vanished.append(pid)
+                continue
+            except psutil.AccessDenied:
+                continue
+            record['processes'][index] += 1
+            record['cpu'][index] += cpu
+            record['rss'][index] += rss / 1048576
+            record['threads'][index] += threads
+            if io is not None:
+                previous = self.last_io.get(pid)
+                self.last_io[pid] = io
+                if previous is not None and elapsed:
+                    record['read_rate'][index] += (io[0] - previous[0]) / 1024 / elapsed
+                    record['write_rate'][index] += (io[1] - previous[1]) / 1024 / elapsed
+        if vanished:
+            # A component restarted: look for its new process at the next sample
+            for pid in vanished:
+                self.last_io.pop(pid, None)
+            self.last_scan = 0.0
+
+        self.ring[self.sequence % len(self.ring)] = record
+        self.sequence += 1
+        return record
+
+    def run(self, interval=SAMPLE_INTERVAL):
+        self.scan()
+        next_sample = time.monotonic()
+        while True:
+            self.sample()
+            next_sample += interval
+            time.sleep(max(next_sample - time.monotonic(), 0))
+
+
+class TelemetryReader:
+    """Lecture des relevés récents, pour l'overlay et la ligne de commande"""
+
+    def __init__(self, path=RING_PATH):
+        self.path = path
+        self.ring = open_ring(path)
+
+    def head(self):
+        """Position du relevé le plus récent, par dichotomie sur les numéros de séquence"""
+        sequence = self.ring['sequence']
+        # Slot i holds sequence cycle * capacity + i: the slots written since
+        # the last wraparound share the cycle of slot 0, the older ones are behind
+        cycle = int(sequence[0])
+        low, high = 0, len(sequence) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if int(sequence[middle]) - middle == cycle:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def recent(self, seconds=300.0):
+        """Relevés des dernières secondes, du plus ancien au plus récent"""
+        head = self.head()
+        capacity = len(self.ring)
+        count = 64
+        while True:
+            count = min(count, capacity)
+            # Copy only the tail of the ring, newest first, doubling it until
+            # it covers the window
+            tail = self.ring[(head - np.arange(count)) % capacity]
+            tail = tail[tail['time'] > 0]
+            if (not tail.size or count == capacity or tail.size < count
+                    or tail['time'][-1] < tail['time'][0] - seconds):
+                break
+            count *= 2
+        window = tail[tail['time'] >= tail['time'][0] - seconds] if tail.size else tail
+        return window[::-1]
+
+    def summary(self, seconds=300.0):
+        samples = self.recent(seconds)
+        if not samples.size:
+            return None
+        last = samples[-1]
+        components = {}
+        for index, name in enumerate(GROUP_NAMES):
+            components[name] = {
+                'processes': int(last['processes'][index]),
+                'cpu_mean': float(samples['cpu'][:, index].mean()),
+                'cpu_max': float(samples['cpu'][:, index].max()),
+                'rss': float(last['rss'][index]),
+                'rss_max': float(samples['rss'][:, index].max()),
+                'read_rate': float(samples['read_rate'][:, index].mean()),
+                'write_rate': float(samples['write_rate'][:, index].mean()),
+                'threads': int(last['threads'][index]),
+            }
+        throttled = int(np.bitwise_or.reduce(samples['throttled']))
+        return {
+            'samples': int(samples.size),
+            'age': time.time() - float(last['time']),
+            'temperature': float(last['temperature']),
+            'temperature_max': float(np.nanmax(samples['temperature']))
+            if np.isfinite(samples['temperature']).any() else float('nan'),
+            'throttled': describe_throttling(throttled),
+            'components': components,
+        }
+
+
+def default_reader():
+    """Lecteur partagé, ouvert au premier appel ; None si le démon n'a encore rien écrit"""
+    global _reader
+    if _reader is None:
+        try:
+            _reader = TelemetryReader()
+        except (FileNotFoundError, TelemetryError):
+            return None
+    return _reader
+
+
+def format_summary(summary):
+    lines = [f"{summary['samples']} relevés, SoC {summary['temperature']:.0f} °C "
+             f"(max {summary['temperature_max']:.0f} °C)"]
+    if summary['throttled']:
+        lines.append("Bridage : " + ", ".join(summary['throttled']))
+    for name, component in summary['components'].items():
+        if component['processes']:
+            lines.append(
+                f"{name}: CPU {component['cpu_mean']:.0f} % (max {component['cpu_max']:.0f} %), "
+                f"{component['rss']:.0f} Mo, E/S {component['read_rate']:.0f}/{component['write_rate']:.0f} Ko/s, "
+                f"{component['threads']} threads"
+            )
+    return "\n".join(lines)
+
+
+# Short labels of the components shown in the overlay status line
+STATUS_LABELS = (('puremaps', "carte"), ('osmscout', "serveur"), ('onboard', "clavier"), ('overlay', "overlay"))
+
+
+def status_line(summary):
+    """Résumé d'une ligne pour l'overlay"""
+    parts = [f"SoC {summary['temperature']:.0f} °C"]
+    for name, label in STATUS_LABELS:
+        component = summary['components'][name]
+        if component['processes']:
+            parts.append(f"{label} {component['cpu_mean']:.0f} % CPU, {component['rss']:.0f} Mo")
+    if summary['throttled']:
+        parts.append("bridage : " + ", ".join(summary['throttled']))
+    return " · ".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Télémétrie des ressources du kiosque")
+    parser.add_argument('--ring', default=RING_PATH, help="fichier anneau (défaut : %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="relève en continu")
+    run.add_argument('--interval', type=float, default=SAMPLE_INTERVAL, help="période (s)")
+    run.add_argument('--capacity', type=int, default=RING_CAPACITY, help="relevés conservés")
+    summary = commands.add_parser('summary', help="résumé des dernières minutes")
+    summary.add_argument('--minutes', type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    if args.command == 'run':
+        try:
+            TelemetrySampler(args.ring, args.capacity).run(args.interval)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    try:
+        result = TelemetryReader(args.ring).summary(args.minutes * 60)
+    except FileNotFoundError:
+        result = None
+    print(format_summary(result) if result else "Aucun relevé")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# Generated tables (ephemeris, grids, history) go to a scratch directory,
+# set before any module reads KT2MAPS_DATA_DIR at import time
+os.environ['KT2MAPS_DATA_DIR'] = tempfile.mkdtemp(prefix='kt2maps-tests-')
+# Qt widgets are built without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer(ThreadingHTTPServer):
+    """Serveur HTTP local : compte les connexions et les requêtes reçues"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.connections = 0
+        self.paths = []
+        # Body of each answer, from the request path
+        self.respond = lambda path: b'{}'
+        # Drop the connection after each answer, like an idle keep-alive timeout
+        self.drop_connections = False
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.paths.append(self.path)
+        body = self.server.respond(self.path)
+        # One write: headers and body in separate segments stall on delayed ACKs
+        self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+        if self.server.drop_connections:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    yield app
+
+
+@pytest.fixture
+def wait_until(qapp):
+    """wait_until(condition, timeout) : traite les événements Qt jusqu'à ce que condition() soit vraie"""
+    def wait(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            qapp.processEvents()
+            time.sleep(0.005)
+        return True
+    return wait
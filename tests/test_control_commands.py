@@ -0,0 +1,56 @@
+import pytest
+
+from control_commands import CommandError, CommandTable
+
+
+@pytest.fixture
+def table():
+    table = CommandTable()
+    calls = []
+
+    def observe(stick_height, shadow_length, shadow_azimuth, timestamp=None):
+        calls.append((stick_height, shadow_length, shadow_azimuth, timestamp))
+
+    def refuse():
+        raise CommandError("aucune position calculée")
+
+    def crash():
+        raise ZeroDivisionError("division by zero")
+
+    table.register('observe', observe, "ajoute une mesure")
+    table.register('fix', refuse)
+    table.register('crash', crash)
+    table.register('version', lambda: "1.2")
+    table.calls = calls
+    return table
+
+
+@pytest.mark.parametrize('line', ['', ' ', '\t \n', '\n'])
+def test_empty_line(table, line):
+    assert table.execute(line) == "ERR commande vide"
+
+
+def test_arguments_are_passed_as_words(table):
+    assert table.execute("observe 1.0  0.8\t132\n") == "OK"
+    assert table.execute("observe 1.0 0.8 132 2026-06-21T10:00") == "OK"
+    assert table.calls == [('1.0', '0.8', '132', None), ('1.0', '0.8', '132', '2026-06-21T10:00')]
+
+
+@pytest.mark.parametrize('line', ['observe', 'observe 1.0 0.8', 'observe 1 2 3 4 5', 'version now'])
+def test_wrong_argument_count(table, line):
+    assert table.execute(line) == f"ERR arguments invalides pour {line.split()[0]}"
+    assert table.calls == []
+
+
+def test_results_and_errors(table):
+    assert table.execute("version") == "OK 1.2"
+    assert table.execute("fix") == "ERR aucune position calculée"
+    assert table.execute("crash") == "ERR division by zero"
+    assert table.execute("unknown 1") == "ERR commande inconnue : unknown (voir help)"
+
+
+def test_help_lists_commands(table):
+    reply = table.execute("help")
+    assert reply.startswith("OK ")
+    assert "observe: ajoute une mesure" in reply
+    assert "help: liste des commandes" in reply
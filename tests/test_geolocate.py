@@ -0,0 +1,61 @@
+import json
+import pytest
+import numpy as np
+import geolocate
+
+VALID = {'stick_height': 1.0, 'shadow_length': 1.25, 'shadow_azimuth': 180.0,
+         'timestamp': '2024-06-21T12:00:00', 'id': 'a'}
+
+
+def test_decode_valid_jsonl_record():
+    decoded = geolocate.decode_record(json.dumps(VALID), 'jsonl', 1.5)
+    assert decoded[:3] == (1.0, 1.25, 180.0)
+    assert decoded[3] == np.datetime64('2024-06-21T12:00:00', 'ms')
+    assert decoded[4] == 1.5
+    assert decoded[5] == 'a'
+
+
+def test_decode_converts_timezone_to_utc():
+    record = dict(VALID, timestamp='2024-06-21T14:00:00+02:00', magnetic_declination='-2')
+    decoded = geolocate.decode_record(record, 'csv', 0.0)
+    assert decoded[3] == np.datetime64('2024-06-21T12:00:00', 'ms')
+    assert decoded[4] == -2.0
+
+
+@pytest.mark.parametrize('field, value', [
+    ('shadow_length', 0), ('shadow_length', -1), ('stick_height', 0), ('stick_height', -0.5),
+    ('shadow_length', 'nan'), ('stick_height', 'inf'), ('shadow_azimuth', 'nan'),
+    ('magnetic_declination', 'inf'),
+])
+def test_decode_rejects_non_positive_or_non_finite(field, value):
+    with pytest.raises(ValueError):
+        geolocate.decode_record(dict(VALID, **{field: value}), 'csv', 0.0)
+
+
+def test_decode_rejects_missing_fields():
+    record = dict(VALID)
+    del record['timestamp']
+    with pytest.raises(ValueError, match='timestamp'):
+        geolocate.decode_record(record, 'csv', 0.0)
+
+
+def test_invalid_rows_are_skipped_with_a_warning(capsys):
+    lines = [json.dumps(VALID), json.dumps(dict(VALID, shadow_length=0)), '{not json']
+    rows, fixes = geolocate.solve_chunk(list(enumerate(lines, 1)), 'jsonl', 0.0)
+    assert [row[0] for row in rows] == [1]
+    assert len(fixes) == 1
+    errors = capsys.readouterr().err
+    assert 'ligne 2 ignorée' in errors and 'ligne 3 ignorée' in errors
+
+
+def test_main_streams_only_valid_rows(tmp_path, capsys):
+    source = tmp_path / 'releves.jsonl'
+    source.write_text('\n'.join([json.dumps(VALID), json.dumps(dict(VALID, stick_height=-1))]) + '\n')
+    assert geolocate.main([str(source)]) in (None, 0)
+    lines = capsys.readouterr().out.splitlines()
+    output = [json.loads(line) for line in lines]
+    assert [record['line'] for record in output] == [1]
+    assert output[0]['converged']
+    # No second solution: null rather than a NaN, which is not JSON
+    assert 'NaN' not in lines[0]
+    assert 'alternative_latitude' in output[0]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from benchmark import distance_km, generate_observations
+from history import HistoryStore
+from solar_calculator import SolarGeolocationCalculator
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.sqlite3'), flush_interval=0.05)
+    yield store
+    store.close()
+
+
+def test_observations_round_trip(store):
+    session = store.start_session()
+    store.record_observation(session, 1.0, 0.8, 132.5, np.datetime64('2026-06-21T10:00'), 1.234, 'simple')
+    store.flush()
+    data = store.load_observations(session)
+    assert data['timestamps'][0] == np.datetime64('2026-06-21T10:00', 'ms')
+    assert data['magnetic_declinations'][0] == pytest.approx(1.234)
+    assert data['sources'] == ['simple']
+
+
+def test_fix_keeps_the_declination_of_the_solve(store):
+    session = store.start_session()
+    # A fit's results carry no declination; the one passed in is the one used
+    results = {'latitude': 45.2, 'longitude': 5.7, 'converged': True, 'iterations': 4,
+               'semi_major': 3.0, 'semi_minor': 1.5, 'inliers': np.array([True, False])}
+    store.record_fix(session, results, 'fit_observations', magnetic_declination=2.345678)
+    store.record_fix(session, dict(results, magnetic_declination=2.3), 'newton_solve',
+                     magnetic_declination=2.345678)
+    store.flush()
+    fixes = store.fixes(session)
+    assert len(fixes) == 2
+    for fix in fixes:
+        diagnostics = fix['diagnostics']
+        assert diagnostics['magnetic_declination'] == 2.345678
+        assert diagnostics['inliers'] == [True, False]
+        assert fix['semi_major'] == 3.0
+
+
+def test_session_replay_with_recorded_declinations(store):
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(1, seed=4, readings=3)
+    declinations = np.array([1.5, -2.0, 3.25])
+    session = store.start_session()
+    for length, azimuth, stamp, declination in zip(lengths[0], azimuths[0], stamps[0], declinations):
+        # The compass reads the true azimuth minus the declination
+        store.record_observation(session, 1.0, length, azimuth - declination, stamp, declination, 'combinée')
+    store.flush()
+
+    # The replay shown in the module docstring
+    data = store.load_observations(session)
+    fix = SolarGeolocationCalculator.fit_observations(
+        data['stick_heights'], data['shadow_lengths'], data['shadow_azimuths'],
+        data['timestamps'], data['magnetic_declinations'])
+    assert distance_km(fix['latitude'], fix['longitude'], latitudes[0], longitudes[0]) < 5
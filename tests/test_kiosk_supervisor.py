@@ -0,0 +1,55 @@
+import json
+import sys
+import threading
+import time
+
+from kiosk_supervisor import Component, Supervisor
+
+
+def run_components(supervisor, timeout=10.0):
+    supervisor.start_time = time.monotonic()
+    threads = [threading.Thread(target=supervisor._supervise, args=(component,), daemon=True)
+               for component in supervisor.components.values()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout)
+        assert not thread.is_alive()
+
+
+def read_timeline(path):
+    with open(path) as handle:
+        return [json.loads(line) for line in handle]
+
+
+def test_launch_failure_is_recorded(tmp_path):
+    timeline_path = str(tmp_path / 'startup.jsonl')
+    broken = Component('osmscout', ['/nonexistent/osmscout-server'], restart=False)
+    map_view = Component('puremaps', [sys.executable, '-c', 'pass'], after=('osmscout',), restart=False)
+    supervisor = Supervisor([broken, map_view], timeline_path)
+    run_components(supervisor)
+
+    assert broken.ready_event.is_set()
+    assert broken.failed
+    # The dependent component started anyway
+    assert map_view.started_at is not None and map_view.failed is None
+    # A failed map server means the map never became usable
+    assert supervisor.usable_at is None
+    timeline, = read_timeline(timeline_path)
+    assert timeline['usable'] is None
+    assert timeline['components']['osmscout']['failed'] == broken.failed
+    assert timeline['components']['osmscout']['started'] is None
+    assert timeline['components']['puremaps']['failed'] is None
+    assert timeline['components']['puremaps']['ready'] is not None
+
+
+def test_timeline_of_a_clean_start(tmp_path):
+    timeline_path = str(tmp_path / 'startup.jsonl')
+    components = [Component(name, [sys.executable, '-c', 'pass'], restart=False)
+                  for name in ('osmscout', 'puremaps')]
+    supervisor = Supervisor(components, timeline_path)
+    run_components(supervisor)
+
+    timeline, = read_timeline(timeline_path)
+    assert timeline['usable'] is not None
+    assert all(times['failed'] is None for times in timeline['components'].values())
@@ -0,0 +1,61 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from map_server import GUIDE_PATH, MapServerError, OSMScoutClient
+
+
+def guide_reply(path):
+    query = parse_qs(urlsplit(path).query)
+    return json.dumps({'results': [{'title': f"lieu {query['lat'][0]}", 'lat': float(query['lat'][0]),
+                                    'lng': float(query['lng'][0]), 'distance': 1200}]}).encode()
+
+
+@pytest.fixture
+def client(stub_server):
+    stub_server.respond = guide_reply
+    client = OSMScoutClient(port=stub_server.port, cache_size=2)
+    yield client
+    client.close()
+
+
+def test_reverse_geocode_reuses_connection(client, stub_server):
+    for latitude in (45.1, 45.2, 45.3):
+        place = client.reverse_geocode(latitude, 5.7)
+        assert place['name'] == f"lieu {latitude:.6f}"
+        assert place['distance'] == 1200
+    assert len(stub_server.paths) == 3
+    assert all(path.startswith(GUIDE_PATH) for path in stub_server.paths)
+    assert stub_server.connections == 1
+
+
+def test_reverse_geocode_reconnects_after_server_close(client, stub_server):
+    stub_server.drop_connections = True
+    client.reverse_geocode(45.1, 5.7)
+    # The client does not know yet that the server closed the connection
+    place = client.reverse_geocode(45.2, 5.7)
+    assert place['name'] == "lieu 45.200000"
+    assert len(stub_server.paths) == 2
+    assert stub_server.connections == 2
+
+
+def test_reverse_geocode_cache_is_lru(client, stub_server):
+    client.reverse_geocode(45.1, 5.7)
+    client.reverse_geocode(45.2, 5.7)
+    # Close enough to hit the first entry, which becomes the most recent
+    client.reverse_geocode(45.1001, 5.7)
+    client.reverse_geocode(45.3, 5.7)
+    assert (client.hits, client.misses) == (1, 3)
+    assert list(client.cache) == [(45.1, 5.7), (45.3, 5.7)]
+    # 45.2 was evicted and is asked again
+    client.reverse_geocode(45.2, 5.7)
+    client.reverse_geocode(45.3, 5.7)
+    assert (client.hits, client.misses) == (2, 4)
+    assert len(stub_server.paths) == 4
+
+
+def test_reverse_geocode_server_down():
+    client = OSMScoutClient(port=1, timeout=0.5)
+    with pytest.raises(MapServerError):
+        client.reverse_geocode(45.1, 5.7)
@@ -0,0 +1,101 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+import overlay
+from overlay import LIVE_DELAY_MS, TutorialDialog, calculation_key, live_inputs
+
+
+@pytest.fixture
+def dialog(qapp):
+    dialog = TutorialDialog()
+    dialog.auto_declination.setChecked(False)
+    yield dialog
+    dialog.runner.wait()
+    dialog.deleteLater()
+
+
+def test_calculation_key_ignores_unused_inputs(dialog):
+    inputs = dialog.read_inputs()
+    without_uncertainty = dict(inputs, uncertainty=False)
+    # Measurement errors only count when the uncertainty is estimated
+    assert (calculation_key(dict(without_uncertainty, azimuth_error=5.0))
+            == calculation_key(without_uncertainty))
+    assert calculation_key(dict(inputs, uncertainty=True, azimuth_error=5.0)) != calculation_key(inputs)
+    # The automatic declination overwrites the value shown
+    automatic = dict(inputs, auto_declination=True)
+    assert calculation_key(dict(automatic, magnetic_declination=3.0)) == calculation_key(automatic)
+    assert calculation_key(dict(inputs, magnetic_declination=3.0)) != calculation_key(inputs)
+    observations = dict(inputs, observations=[(1.0, 0.8, 130.0, inputs['timestamp'])])
+    assert calculation_key(observations) != calculation_key(inputs)
+    hash(calculation_key(observations))
+
+
+def test_live_inputs_skip_slow_steps(dialog):
+    inputs = live_inputs(dict(dialog.read_inputs(), uncertainty=True, global_search=True))
+    assert not inputs['uncertainty'] and not inputs['global_search']
+
+
+def test_changes_are_debounced(dialog, qapp, wait_until, monkeypatch):
+    calls = []
+    monkeypatch.setattr(dialog, 'start_calculation', lambda live: calls.append(live))
+    for length in (0.5, 0.6, 0.7, 0.8):
+        dialog.shadow_length.setValue(length)
+        qapp.processEvents()
+    assert calls == []
+    assert wait_until(lambda: calls, timeout=LIVE_DELAY_MS / 1000 + 2)
+    # One recalculation for the whole burst of changes
+    wait_until(lambda: False, timeout=LIVE_DELAY_MS / 1000)
+    assert calls == [True]
+
+
+def test_live_preview_is_point_solve_only(dialog, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(dialog.runner, 'submit', lambda job, inputs: submitted.append((job, inputs)))
+    dialog.uncertainty_enabled.setChecked(True)
+    dialog.global_search_enabled.setChecked(True)
+    dialog.shadow_length.setValue(0.8)
+    dialog.live_timer.stop()
+    dialog.start_calculation(live=True)
+    (job, inputs), = submitted
+    assert job is overlay.solve_single
+    assert not inputs['uncertainty'] and not inputs['global_search']
+    dialog.start_calculation(live=False)
+    assert submitted[-1][1]['uncertainty'] and submitted[-1][1]['global_search']
+
+
+def test_live_preview_uses_cached_results(dialog, wait_until, monkeypatch):
+    dialog.uncertainty_enabled.setChecked(False)
+    dialog.shadow_length.setValue(0.8)
+    dialog.live_timer.stop()
+    dialog.start_calculation(live=False)
+    assert wait_until(lambda: not dialog.runner.running, timeout=20)
+    assert len(dialog.result_cache) == 1
+
+    submitted = []
+    monkeypatch.setattr(dialog.runner, 'submit', lambda job, inputs: submitted.append(inputs))
+    dialog.start_calculation(live=True)
+    dialog.start_calculation(live=False)
+    assert submitted == []
+    # Another value is solved again
+    dialog.shadow_length.setValue(0.9)
+    dialog.live_timer.stop()
+    dialog.start_calculation(live=True)
+    assert len(submitted) == 1
+
+
+def test_low_memory_observe_releases_tutorial(qapp, wait_until):
+    window = overlay.SolarShadowApp(low_memory=True)
+    assert window.command_observe('1.0', '0.8', '132', '2026-06-21T10:00') == "calcul lancé (résultat : fix)"
+    dialog = window.tutorial_dialog
+    destroyed = []
+    dialog.destroyed.connect(lambda: destroyed.append(True))
+    assert wait_until(lambda: destroyed)
+    assert window.tutorial_dialog is None
+    assert window.last_fix is not None
+
+    # Rejected values do not leave a dialog behind either
+    with pytest.raises(overlay.CommandError):
+        window.command_observe('1.0', '0.8', '999')
+    assert window.tutorial_dialog is None
+    window.deleteLater()
@@ -0,0 +1,91 @@
+import gzip
+import numpy as np
+import pytest
+
+from places_index import PlacesIndex, build_index
+
+PLACES = [
+    (45.7640, 4.8357, 'Lyon', 'city'),
+    (45.7719, 4.8902, 'Villeurbanne', 'town'),
+    (45.4397, 4.3872, 'Saint-Étienne', 'city'),
+    (45.8260, 4.9540, 'Miribel', 'village'),
+    (45.8010, 5.0010, 'Le Hameau', 'hamlet'),
+    (46.2044, 6.1432, 'Genève', 'city'),
+]
+
+
+def osm_extract(places):
+    nodes = []
+    for number, (latitude, longitude, name, kind) in enumerate(places, 1):
+        nodes.append(f'<node id="{number}" lat="{latitude}" lon="{longitude}">'
+                     f'<tag k="place" v="{kind}"/><tag k="name" v="{name}"/></node>')
+    # Ignored: no name, a kind that is not kept, and a way
+    nodes.append('<node id="90" lat="45.8" lon="5.0"><tag k="place" v="village"/></node>')
+    nodes.append('<node id="91" lat="45.8" lon="5.0"><tag k="place" v="suburb"/>'
+                 '<tag k="name" v="Quartier"/></node>')
+    nodes.append('<way id="92"><nd ref="1"/><tag k="place" v="city"/><tag k="name" v="Chemin"/></way>')
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n'
+            + '\n'.join(nodes) + '\n</osm>\n')
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    extract = tmp_path / 'extrait.osm.gz'
+    with gzip.open(extract, 'wt', encoding='utf-8') as handle:
+        handle.write(osm_extract(PLACES))
+    path = str(tmp_path / 'places')
+    assert build_index(str(extract), path) == len(PLACES)
+    return path
+
+
+def test_index_is_memory_mapped(index_path):
+    index = PlacesIndex(index_path)
+    assert len(index) == len(PLACES)
+    assert isinstance(index.coordinates, np.memmap)
+    assert isinstance(index.names, np.memmap)
+    names = sorted(index.name(i) for i in range(len(index)))
+    assert names == sorted(place[2] for place in PLACES)
+
+
+def test_nearest_place(index_path):
+    index = PlacesIndex(index_path)
+    place = index.nearest(45.45, 4.40)
+    assert place['name'] == 'Saint-Étienne' and place['kind'] == 'city'
+    assert place['distance'] == pytest.approx(1.6, abs=0.2)
+    # Restricted to cities and towns
+    assert index.nearest(45.8011, 5.0011, max_kind=1)['name'] == 'Villeurbanne'
+    assert index.nearest(10.0, 10.0) is None
+
+
+def test_nearest_across_cells(index_path):
+    # Genève is in the next 1° cell, nearer than anything in the query's own
+    place = PlacesIndex(index_path).nearest(45.99, 5.99)
+    assert place['name'] == 'Genève'
+    assert place['distance'] == pytest.approx(26.5, abs=1)
+
+
+def test_describe_prefers_villages_over_hamlets(index_path):
+    index = PlacesIndex(index_path)
+    assert index.nearest(45.8011, 5.0011)['name'] == 'Le Hameau'
+    assert index.describe(45.8011, 5.0011) == "≈ 5 km SE de Miribel"
+    assert index.describe(45.8011, 5.0011, preferred_distance_km=1) == "≈ à Le Hameau"
+    # No village or larger close by: the nearest place of any kind
+    assert index.describe(45.99, 5.99).endswith("de Genève")
+    assert index.describe(10.0, 10.0) is None
+
+
+def test_rebuild_replaces_index(tmp_path, index_path):
+    extract = tmp_path / 'autre.osm'
+    extract.write_text(osm_extract([(45.8260, 4.9540, 'Miribel', 'village')]), encoding='utf-8')
+    assert build_index(str(extract), index_path, kinds=('city', 'village')) == 1
+    index = PlacesIndex(index_path)
+    assert len(index) == 1
+    # Kinds keep their global rank when only some are indexed
+    assert index.nearest(45.80, 4.95)['kind'] == 'village'
+
+
+def test_empty_extract(tmp_path):
+    extract = tmp_path / 'vide.osm'
+    extract.write_text(osm_extract([]), encoding='utf-8')
+    with pytest.raises(ValueError):
+        build_index(str(extract), str(tmp_path / 'places'))
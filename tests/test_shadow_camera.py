@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import shadow_camera
+from shadow_camera import ShadowMeasurementError, measure_burst, measure_shadow, render_synthetic_scene
+from solar_calculator import CalculationCancelled
+
+
+def angle_difference(first, second):
+    return abs((first - second + 180) % 360 - 180)
+
+
+@pytest.mark.parametrize('length, azimuth, north_angle', [
+    (0.6, 45.0, 0.0),
+    (0.4, 200.0, 0.0),
+    (0.8, 300.0, 30.0),
+    (0.5, 10.0, -75.0),
+])
+def test_measure_shadow_recovers_synthetic_scene(length, azimuth, north_angle):
+    frame = render_synthetic_scene(length, azimuth, north_angle=north_angle, seed=1)
+    measurement = measure_shadow(frame)
+    assert measurement['shadow_length'] == pytest.approx(length, rel=0.05)
+    assert angle_difference(measurement['shadow_azimuth'], azimuth) < 2.0
+
+
+def test_measure_shadow_without_markers():
+    blank = np.full((480, 640, 3), 170, dtype=np.uint8)
+    with pytest.raises(ShadowMeasurementError):
+        measure_shadow(blank)
+
+
+def synthetic_frames(count, length=0.6, azimuth=120.0, blank_every=3):
+    blank = np.full((480, 640, 3), 170, dtype=np.uint8)
+    for index in range(count):
+        if index % blank_every == 0:
+            yield blank
+        else:
+            yield render_synthetic_scene(length, azimuth, seed=index)
+
+
+def test_measure_burst_skips_unusable_frames():
+    fractions = []
+    measurement = measure_burst(synthetic_frames(30), max_frames=30, measurements=6,
+                                progress=fractions.append)
+    assert measurement['shadow_length'] == pytest.approx(0.6, rel=0.05)
+    assert angle_difference(measurement['shadow_azimuth'], 120.0) < 2.0
+    # Stopped after six measurements, nine frames in (every third one is blank)
+    assert len(fractions) == 10
+    assert fractions[-1] == 1.0
+
+
+def test_measure_burst_stops_at_max_frames():
+    frames = synthetic_frames(100, blank_every=1)
+    with pytest.raises(ShadowMeasurementError):
+        measure_burst(frames, max_frames=5)
+    # Only the first five frames were read
+    assert len(list(frames)) == 95
+
+
+def test_measure_burst_cancelled_from_progress():
+    def progress(fraction):
+        if fraction > 0.1:
+            raise CalculationCancelled()
+
+    frames = synthetic_frames(60)
+    with pytest.raises(CalculationCancelled):
+        measure_burst(frames, max_frames=60, progress=progress)
+
+
+def test_capture_measurement_closes_camera(monkeypatch):
+    closed = []
+
+    def camera_frames():
+        try:
+            yield from synthetic_frames(60, blank_every=60)
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(shadow_camera, 'camera_frames', camera_frames)
+    measurement = shadow_camera.capture_measurement()
+    assert measurement['shadow_length'] == pytest.approx(0.6, rel=0.05)
+    assert closed == [True]
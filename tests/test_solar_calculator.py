@@ -0,0 +1,123 @@
+import numpy as np
+from datetime import datetime
+from solar_calculator import EARTH_RADIUS_KM, SolarGeolocationCalculator
+from benchmark import generate_observations, distance_km
+
+
+def test_calculate_position_round_trip():
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(20, seed=1)
+    for i in range(len(latitudes)):
+        moment = stamps[i, 0].astype('datetime64[us]').astype(datetime)
+        fix = SolarGeolocationCalculator.calculate_position(
+            1.0, lengths[i, 0], azimuths[i, 0], moment.time(), moment.date(), 0.0
+        )
+        assert fix['converged']
+        assert distance_km(fix['latitude'], fix['longitude'], latitudes[i], longitudes[i]) < 5
+
+
+def test_fit_observations_round_trip():
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(5, seed=2, readings=3)
+    for i in range(len(latitudes)):
+        fix = SolarGeolocationCalculator.fit_observations(1.0, lengths[i], azimuths[i], stamps[i], 0.0)
+        assert distance_km(fix['latitude'], fix['longitude'], latitudes[i], longitudes[i]) < 5
+
+
+def test_fit_ellipse_follows_residuals():
+    _, _, lengths, azimuths, stamps = generate_observations(1, seed=3, readings=3)
+
+    def fit(scatter):
+        noisy_azimuths = azimuths[0] + scatter * np.array([1.0, -1.0, 1.0])
+        return SolarGeolocationCalculator.fit_observations(1.0, lengths[0], noisy_azimuths, stamps[0], 0.0,
+                                                           outlier_threshold=np.inf)
+
+    small, large = fit(4.0), fit(8.0)
+    # Scaled by the reduced chi-square: twice the scatter, about twice the ellipse
+    assert large['reduced_chi2'] > small['reduced_chi2'] > 1
+    assert 1.5 < large['semi_major'] / small['semi_major'] < 3
+
+
+def test_global_search_drops_clamped_candidates():
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(3, seed=4)
+    for i in range(len(latitudes)):
+        search = SolarGeolocationCalculator.global_search(
+            1.0, lengths[i, :1], azimuths[i, :1], stamps[i, :1], 0.0, resolution=1.0, workers=2
+        )
+        candidates = search['candidates']
+        assert all(abs(candidate['latitude']) < 89.99 for candidate in candidates)
+        best = candidates[0]['misfit']
+        assert all(candidate['misfit'] <= best + max(10 * best, 25) for candidate in candidates)
+        assert min(distance_km(c['latitude'], c['longitude'], latitudes[i], longitudes[i])
+                   for c in candidates) < 5
+
+
+def test_fit_ellipse_not_below_measurement_errors():
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(3, seed=5, readings=3)
+    for i in range(len(latitudes)):
+        for readings in (2, 3):
+            fix = SolarGeolocationCalculator.fit_observations(
+                1.0, lengths[i, :readings], azimuths[i, :readings], stamps[i, :readings], 0.0
+            )
+            # Noise-free readings: far less scatter than the stated errors
+            assert fix['reduced_chi2'] < 1e-3
+            terms = SolarGeolocationCalculator.observation_terms(
+                1.0, lengths[i, :readings], azimuths[i, :readings], stamps[i, :readings], 0.0
+            )
+            jacobian = SolarGeolocationCalculator.residuals(fix['latitude'], fix['longitude'], terms)[2]
+            km_per_degree = EARTH_RADIUS_KM * np.pi / 180
+            scale = np.diag([km_per_degree * np.cos(np.radians(fix['latitude'])), km_per_degree])
+            a_priori = scale @ np.linalg.pinv(jacobian.T @ jacobian)[::-1, ::-1] @ scale
+            expected = SolarGeolocationCalculator.confidence_ellipse(a_priori)
+            assert fix['semi_major'] >= 0.99 * expected['semi_major']
+            assert fix['semi_minor'] >= 0.99 * expected['semi_minor']
+            assert fix['semi_minor'] > 0.1
+
+
+def test_single_reading_with_two_exact_solutions():
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(400, seed=6)
+    fixes = SolarGeolocationCalculator.calculate_positions(1.0, lengths[:, 0], azimuths[:, 0], stamps[:, 0], 0.0)
+    ambiguous = np.flatnonzero(np.isfinite(fixes['alternative_latitude']))
+    assert ambiguous.size
+    i = int(ambiguous[0])
+    moment = stamps[i, 0].astype('datetime64[us]').astype(datetime)
+    fix = SolarGeolocationCalculator.calculate_position(
+        1.0, lengths[i, 0], azimuths[i, 0], moment.time(), moment.date(), 0.0
+    )
+    assert fix['ambiguous'] and fix['converged']
+    alternative = fix['alternative']
+    assert distance_km(fix['latitude'], fix['longitude'], alternative['latitude'], alternative['longitude']) > 1
+    # Both positions see the sun exactly where the reading puts it
+    solar_time, _, declination, _ = SolarGeolocationCalculator.solar_time(stamps[i, :1])
+    for position in (fix, alternative):
+        elevation, azimuth = SolarGeolocationCalculator.sun_model(
+            position['latitude'], position['longitude'], solar_time, declination, jacobian=False
+        )[:2]
+        assert abs(elevation[0] - fix['elevation']) < 1e-6
+        assert abs((azimuth[0] - fix['sun_azimuth'] + 180) % 360 - 180) < 1e-6
+
+
+def test_wrong_root_is_always_flagged():
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(2000, seed=7)
+    fixes = SolarGeolocationCalculator.calculate_positions(1.0, lengths[:, 0], azimuths[:, 0], stamps[:, 0], 0.0)
+    wrong = distance_km(fixes['latitude'], fixes['longitude'], latitudes, longitudes) > 5
+    assert wrong.any()
+    assert np.isfinite(fixes['alternative_latitude'][wrong]).all()
+    # Monte Carlo draws skip the second solve
+    draws = SolarGeolocationCalculator.calculate_positions(1.0, lengths[:5, 0], azimuths[:5, 0], stamps[:5, 0], 0.0,
+                                                           alternatives=False)
+    assert np.isnan(draws['alternative_latitude']).all()
+
+
+def test_monte_carlo_has_its_own_statistics():
+    latitudes, longitudes, lengths, azimuths, stamps = generate_observations(1, seed=8)
+    moment = stamps[0, 0].astype('datetime64[us]').astype(datetime)
+    statistics = SolarGeolocationCalculator.statistics
+    monte_carlo = SolarGeolocationCalculator.monte_carlo_statistics
+    statistics.reset()
+    monte_carlo.reset()
+    SolarGeolocationCalculator.calculate_position(1.0, lengths[0, 0], azimuths[0, 0], moment.time(), moment.date(), 0.0)
+    SolarGeolocationCalculator.estimate_uncertainty(1.0, lengths[0, 0], azimuths[0, 0], stamps[0, 0], 0.0,
+                                                    samples=5000, seed=1)
+    # Only the user's solve is counted with the solver statistics
+    assert statistics.summary()['calls'] == 1
+    assert statistics.summary()['solves'] == 1
+    assert monte_carlo.summary()['solves'] > 4000
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from storage import atomic_path
+
+
+def test_atomic_path_replaces_file(tmp_path):
+    path = str(tmp_path / 'sub' / 'table.bin')
+    for content in (b'first', b'second'):
+        with atomic_path(path) as temporary:
+            with open(temporary, 'wb') as handle:
+                handle.write(content)
+        with open(path, 'rb') as handle:
+            assert handle.read() == content
+    assert os.listdir(tmp_path / 'sub') == ['table.bin']
+
+
+def test_atomic_path_keeps_previous_file_on_error(tmp_path):
+    path = str(tmp_path / 'table.bin')
+    with open(path, 'wb') as handle:
+        handle.write(b'previous')
+    with pytest.raises(RuntimeError):
+        with atomic_path(path) as temporary:
+            with open(temporary, 'wb') as handle:
+                handle.write(b'trunc')
+            raise RuntimeError("coupure")
+    with open(path, 'rb') as handle:
+        assert handle.read() == b'previous'
+    assert os.listdir(tmp_path) == ['table.bin']
+
+
+def test_atomic_path_swaps_directory(tmp_path):
+    path = str(tmp_path / 'index')
+    for name in ('first', 'second'):
+        with atomic_path(path) as temporary:
+            os.makedirs(temporary)
+            open(os.path.join(temporary, name), 'w').close()
+    assert os.listdir(path) == ['second']
+    assert os.listdir(tmp_path) == ['index']
+
+
+def test_atomic_path_syncs_data_then_directory(tmp_path, monkeypatch):
+    synced = []
+    fsync = os.fsync
+
+    def record(descriptor):
+        synced.append(os.readlink(f'/proc/self/fd/{descriptor}'))
+        fsync(descriptor)
+
+    monkeypatch.setattr(os, 'fsync', record)
+    path = str(tmp_path / 'index')
+    with atomic_path(path) as temporary:
+        os.makedirs(temporary)
+        open(os.path.join(temporary, 'names.bin'), 'w').close()
+    temporary = f"{path}.{os.getpid()}.tmp"
+    assert synced == [os.path.join(temporary, 'names.bin'), temporary, str(tmp_path)]
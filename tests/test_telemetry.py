@@ -0,0 +1,94 @@
+import subprocess
+import numpy as np
+import pytest
+
+import telemetry
+
+
+def write_records(path, sequences, capacity, start=1000.0, interval=5.0):
+    """Écrit des relevés comme le démon : à la case sequence % capacity"""
+    ring = telemetry.open_ring(path, capacity, writable=True)
+    for sequence in sequences:
+        record = np.zeros((), dtype=telemetry.RECORD_DTYPE)
+        record['sequence'] = sequence
+        record['time'] = start + sequence * interval
+        record['temperature'] = 40 + sequence % 7
+        record['cpu'][0] = sequence
+        ring[sequence % capacity] = record
+    ring.flush()
+    del ring
+
+
+def test_ring_file_format(tmp_path):
+    path = str(tmp_path / 'telemetry.npy')
+    ring = telemetry.open_ring(path, capacity=50, writable=True)
+    assert ring.shape == (50,)
+    assert ring.dtype == telemetry.RECORD_DTYPE
+    del ring
+    # A plain .npy file, readable without the daemon
+    assert np.load(path).dtype == telemetry.RECORD_DTYPE
+    assert not telemetry.TelemetryReader(path).recent().size
+
+
+def test_ring_rejects_other_formats(tmp_path):
+    path = str(tmp_path / 'telemetry.npy')
+    np.save(path, np.zeros(10))
+    with pytest.raises(telemetry.TelemetryError):
+        telemetry.open_ring(path)
+
+
+@pytest.mark.parametrize('first, last', [(1, 30), (1, 50), (1, 137), (40, 320)])
+def test_recent_across_wraparound(tmp_path, first, last):
+    path = str(tmp_path / 'telemetry.npy')
+    write_records(path, range(first, last), capacity=50)
+    reader = telemetry.TelemetryReader(path)
+    assert reader.head() == (last - 1) % 50
+
+    samples = reader.recent(seconds=60.0)
+    expected = list(range(max(first, last - 13), last))
+    assert list(samples['sequence']) == expected
+
+    # A window longer than the ring returns every record kept, oldest first
+    everything = reader.recent(seconds=1e6)
+    assert list(everything['sequence']) == list(range(max(first, last - 50), last))
+
+
+def test_summary_of_recent_records(tmp_path):
+    path = str(tmp_path / 'telemetry.npy')
+    write_records(path, range(1, 100), capacity=50)
+    summary = telemetry.TelemetryReader(path).summary(seconds=20.0)
+    assert summary['samples'] == 5
+    assert summary['components']['osmscout']['cpu_max'] == 99
+    assert summary['temperature'] == 40 + 99 % 7
+
+
+def test_throttled_source_detected_once(monkeypatch):
+    calls = []
+
+    def missing(*args, **kwargs):
+        calls.append(args)
+        raise FileNotFoundError('vcgencmd')
+
+    monkeypatch.setattr(telemetry, 'THROTTLED_SYSFS', '/nonexistent/get_throttled')
+    monkeypatch.setattr(telemetry.subprocess, 'run', missing)
+    monkeypatch.setattr(telemetry, '_throttled_detected', False)
+    monkeypatch.setattr(telemetry, '_throttled_source', None)
+    assert [telemetry.throttled_state() for _ in range(5)] == [0] * 5
+    assert len(calls) == 1
+
+
+def test_throttled_source_kept(monkeypatch):
+    calls = []
+
+    def vcgencmd(*args, **kwargs):
+        calls.append(args)
+        return subprocess.CompletedProcess(args, 0, stdout='throttled=0x50005\n')
+
+    monkeypatch.setattr(telemetry, 'THROTTLED_SYSFS', '/nonexistent/get_throttled')
+    monkeypatch.setattr(telemetry.subprocess, 'run', vcgencmd)
+    monkeypatch.setattr(telemetry, '_throttled_detected', False)
+    monkeypatch.setattr(telemetry, '_throttled_source', None)
+    assert telemetry.throttled_state() == 0x50005
+    assert telemetry.throttled_state() == 0x50005
+    assert len(calls) == 2
+    assert telemetry.describe_throttling(0x50005) == ["sous-tension", "bridage"]
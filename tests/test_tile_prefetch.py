@@ -0,0 +1,92 @@
+import logging
+import math
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pytest
+
+from tile_prefetch import MIN_RADIUS_KM, TILE_PATH, TilePrefetcher, tile_coordinates, tiles_around
+
+
+def test_tiles_around_order_and_counts():
+    tiles = tiles_around(45.19, 5.72, 5.0, zooms=(10, 12, 14), max_tiles=16)
+    zooms = [zoom for zoom, _, _ in tiles]
+    # Coarse levels first, each one capped
+    assert zooms == sorted(zooms)
+    assert set(zooms) == {10, 12, 14}
+    assert all(zooms.count(zoom) <= 16 for zoom in (10, 12, 14))
+    # A 5 km disc covers few tiles at zoom 10, more than the cap at zoom 14
+    assert zooms.count(10) < 16 and zooms.count(14) == 16
+    assert len(set(tiles)) == len(tiles)
+    for zoom in (10, 12, 14):
+        level = [(x, y) for z, x, y in tiles if z == zoom]
+        center_x, center_y = tile_coordinates(45.19, 5.72, zoom)
+        # The tile under the fix comes first, then outwards
+        assert level[0] == (math.floor(center_x), math.floor(center_y))
+        distance = [math.hypot(x + 0.5 - center_x, y + 0.5 - center_y) for x, y in level]
+        assert distance == sorted(distance)
+
+
+def test_tiles_around_minimum_radius():
+    assert tiles_around(45.19, 5.72, 0.0) == tiles_around(45.19, 5.72, MIN_RADIUS_KM)
+
+
+def test_tiles_around_wraps_the_antimeridian():
+    tiles = tiles_around(-17.7, 179.99, 20.0, zooms=(12,))
+    xs = {x for _, x, _ in tiles}
+    assert all(0 <= x < 2 ** 12 for x in xs)
+    assert 0 in xs and 2 ** 12 - 1 in xs
+
+
+def tile_of(path):
+    query = parse_qs(urlsplit(path).query)
+    return tuple(int(query[name][0]) for name in ('z', 'x', 'y'))
+
+
+@pytest.fixture
+def prefetcher(stub_server):
+    prefetcher = TilePrefetcher(port=stub_server.port, zooms=(12, 14), max_tiles=8)
+    yield prefetcher
+    prefetcher.stop()
+
+
+def test_prefetch_warms_tiles_once(prefetcher, stub_server):
+    stub_server.respond = lambda path: b'png'
+    count = prefetcher.prefetch(45.19, 5.72, 2.0)
+    assert prefetcher.wait(10)
+    assert sorted(tile_of(path) for path in stub_server.paths) == sorted(tiles_around(45.19, 5.72, 2.0, (12, 14), 8))
+    assert all(path.startswith(TILE_PATH.split('?')[0]) for path in stub_server.paths)
+    # Two workers, each on its own keep-alive connection
+    assert stub_server.connections <= 2
+
+    assert prefetcher.prefetch(45.19, 5.72, 2.0) == count
+    assert prefetcher.wait(10)
+    metrics = prefetcher.metrics()
+    assert len(stub_server.paths) == count
+    assert (metrics['requested'], metrics['fetched'], metrics['already_warm'], metrics['failed']) == (2 * count, count, count, 0)
+    assert metrics['warm_rate'] == 0.5
+    assert np.isfinite(metrics['latency_p95'])
+
+
+def test_superseded_prefetch_is_reported(prefetcher, stub_server, caplog):
+    def slow(path):
+        time.sleep(0.05)
+        return b'png'
+
+    stub_server.respond = slow
+    caplog.set_level(logging.INFO, logger='kt2maps.tiles')
+    prefetcher.prefetch(45.19, 5.72, 2.0)
+    first = prefetcher.current
+    time.sleep(0.02)
+    count = prefetcher.prefetch(-33.9, 18.4, 2.0)
+    # The first batch is finished as soon as it is superseded
+    assert first['done'].is_set()
+    assert first['dropped'] > 0
+    assert any("interrompu" in record.getMessage() for record in caplog.records)
+
+    assert prefetcher.wait(20)
+    second = prefetcher.current
+    assert second['fetched'] == count and second['dropped'] == 0
+    # Tiles of the first batch still in flight left its report untouched
+    assert first['fetched'] + first['warm'] + first['failed'] + first['dropped'] <= 16
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pytest
+
+import wmm
+
+# Test values published with WMM2025 (NOAA reference implementation):
+# year, height above the ellipsoid (km), latitude, longitude, X, Y, Z (nT), D (degrees)
+TEST_VALUES = [
+    (2025.0, 0, 80, 0, 6521.6, 145.9, 54791.5, 1.28),
+    (2025.0, 0, 0, 120, 39677.8, -109.6, -10580.2, -0.16),
+    (2025.0, 0, -80, -120, 6117.5, 15751.9, -52022.5, 68.78),
+    (2025.0, 100, 80, 0, 6216.0, 92.4, 52598.8, 0.85),
+    (2025.0, 100, 0, 120, 37688.6, -96.2, -10152.1, -0.15),
+    (2025.0, 100, -80, -120, 5907.6, 14780.3, -49540.7, 68.21),
+    (2027.5, 0, 80, 0, 6500.8, 294.5, 54869.4, 2.59),
+    (2027.5, 0, 0, 120, 39701.6, -167.4, -10381.8, -0.24),
+    (2027.5, 0, -80, -120, 6200.7, 15730.3, -51783.7, 68.49),
+    (2027.5, 100, 80, 0, 6196.7, 233.8, 52670.5, 2.16),
+    (2027.5, 100, 0, 120, 37711.5, -148.7, -9969.8, -0.23),
+    (2027.5, 100, -80, -120, 5984.0, 14760.1, -49317.7, 67.93),
+]
+
+
+@pytest.fixture(scope='module')
+def model():
+    return wmm.MagneticModel(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'WMM.COF'))
+
+
+def test_shipped_coefficients(model):
+    assert model.name == 'WMM-2025'
+    assert model.epoch == 2025.0
+    assert model.degree == 12
+    assert wmm.coefficients_path() is not None
+
+
+@pytest.mark.parametrize('year, height, latitude, longitude, x, y, z, declination', TEST_VALUES)
+def test_synthesis_matches_test_values(model, year, height, latitude, longitude, x, y, z, declination):
+    north, east, down = model.field(latitude, longitude, year, height)
+    assert float(north) == pytest.approx(x, abs=0.1)
+    assert float(east) == pytest.approx(y, abs=0.1)
+    assert float(down) == pytest.approx(z, abs=0.1)
+    assert float(model.declination(latitude, longitude, year, height)) == pytest.approx(declination, abs=0.01)
+
+
+def test_grid_interpolation_close_to_synthesis(model, tmp_path):
+    grid = np.load(wmm.build_grid(model, 2025.5, path=str(tmp_path / 'grid.npy')))
+    latitudes = np.array([45.76, -33.9, 64.1, 0.5])
+    longitudes = np.array([4.84, 151.2, -21.9, -179.5])
+    exact = model.declination(latitudes, longitudes, 2025.5)
+    assert np.allclose(wmm.interpolate(grid, latitudes, longitudes), exact, atol=0.2)
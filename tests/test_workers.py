@@ -0,0 +1,101 @@
+import threading
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from solar_calculator import CalculationCancelled
+from workers import CalculationRunner, scaled_progress
+
+
+@pytest.fixture
+def runner(qapp):
+    runner = CalculationRunner()
+    signals = {'progress': [], 'finished': [], 'failed': [], 'cancelled': []}
+    runner.progress.connect(signals['progress'].append)
+    runner.finished.connect(signals['finished'].append)
+    runner.failed.connect(signals['failed'].append)
+    runner.cancelled.connect(lambda: signals['cancelled'].append(True))
+    runner.signals = signals
+    yield runner
+    runner.wait()
+    runner.deleteLater()
+
+
+def test_result_delivered_after_ordered_progress(runner, wait_until):
+    def job(value, progress):
+        for fraction in (0.25, 0.5, 1.0):
+            progress(fraction)
+        return value * 2
+
+    runner.submit(job, 21)
+    assert runner.running
+    assert wait_until(lambda: runner.signals['finished'])
+    assert runner.signals['finished'] == [42]
+    # Relayed in the order the job reported them, all before the result
+    assert runner.signals['progress'] == [0.0, 0.25, 0.5, 1.0]
+    assert not runner.running
+    assert not runner.signals['failed'] and not runner.signals['cancelled']
+
+
+def test_cancel_mid_job(runner, wait_until):
+    started, stopped = threading.Event(), []
+
+    def job(progress):
+        started.set()
+        try:
+            while True:
+                progress(0.5)
+                threading.Event().wait(0.01)
+        except CalculationCancelled:
+            stopped.append(True)
+            raise
+
+    runner.submit(job)
+    assert started.wait(5)
+    runner.cancel()
+    assert runner.signals['cancelled'] == [True]
+    assert not runner.running
+    # The job stops at its next progress call and its result is never delivered
+    assert wait_until(lambda: stopped)
+    assert runner.pool.waitForDone(2000)
+    wait_until(lambda: False, timeout=0.1)
+    assert not runner.signals['finished'] and not runner.signals['failed']
+    # Cancelling again, with nothing running, is silent
+    runner.cancel()
+    assert runner.signals['cancelled'] == [True]
+
+
+def test_superseded_job_is_ignored(runner, wait_until):
+    release = threading.Event()
+
+    def slow(progress):
+        release.wait(5)
+        return 'ancien'
+
+    runner.submit(slow)
+    runner.submit(lambda progress: 'nouveau')
+    release.set()
+    assert wait_until(lambda: runner.signals['finished'])
+    assert runner.pool.waitForDone(2000)
+    wait_until(lambda: False, timeout=0.1)
+    assert runner.signals['finished'] == ['nouveau']
+    assert not runner.signals['cancelled']
+
+
+def test_failure_reported(runner, wait_until):
+    def job(progress):
+        raise ValueError("mesure invalide")
+
+    runner.submit(job)
+    assert wait_until(lambda: runner.signals['failed'])
+    assert runner.signals['failed'] == ["mesure invalide"]
+    assert not runner.running and not runner.signals['finished']
+
+
+def test_scaled_progress():
+    fractions = []
+    step = scaled_progress(fractions.append, 0.2, 0.6)
+    step(0.0)
+    step(0.5)
+    step(1.0)
+    assert fractions == pytest.approx([0.2, 0.4, 0.6])
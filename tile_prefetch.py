@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Préchargement des tuiles autour d'une position calculée.
+
+Juste après un calcul, l'utilisateur se déplace vers la position sur la
+carte et osmscout-server doit alors rendre les premières tuiles à la
+demande. Le préchargeur les demande à l'avance, en arrière-plan : les
+tuiles couvrant le rayon d'incertitude, sur plusieurs niveaux de zoom, du
+plus large au plus fin et du centre vers l'extérieur. Deux requêtes au plus
+sont en cours, depuis des threads de priorité minimale, pour ne jamais
+concurrencer le rendu interactif ; un nouveau calcul abandonne les tuiles
+encore en attente.
+
+Les tuiles déjà préchargées ne sont pas redemandées ; leur part (warm_rate)
+ne dit rien du cache de la carte, seulement des requêtes évitées. L'effet
+sur la carte se mesure à la latence du serveur : la ligne de commande charge
+deux fois la même zone, avec deux préchargeurs distincts, et compare les
+latences du premier passage (serveur à froid) et du second :
+
+    python3 tile_prefetch.py 48.85 2.35 --radius 5
+"""
+
+import os
+import sys
+import math
+import time
+import queue
+import logging
+import argparse
+import threading
+import http.client
+from collections import OrderedDict, deque
+import numpy as np
+from map_server import DEFAULT_HOST, DEFAULT_PORT
+
+# Raster tiles of osmscout-server, rendered on demand (the ones worth warming)
+TILE_PATH = '/v1/tile?style=default&daylight=1&shift=0&scale=1&z={z}&x={x}&y={y}'
+
+# Coarse levels first: they are shown first when panning to the fix
+ZOOM_LEVELS = (10, 12, 14, 16)
+MAX_TILES_PER_ZOOM = 64
+
+# Smallest area warmed around a fix, even with a tight uncertainty (km)
+MIN_RADIUS_KM = 1.0
+
+# Concurrent requests; few enough to leave the server to the map
+WORKERS = 2
+WORKER_NICENESS = 19
+
+# Tiles remembered as already warm
+WARM_TILES = 4096
+
+# Request latencies kept for the statistics
+LATENCY_WINDOW = 1024
+
+EARTH_KM_PER_DEGREE = 111.32
+
+logger = logging.getLogger('kt2maps.tiles')
+
+_prefetcher = None
+
+
+def tile_coordinates(latitude, longitude, zoom):
+    """Coordonnées de tuile (fractionnaires) en projection Web Mercator"""
+    scale = 2 ** zoom
+    latitude = np.clip(np.radians(latitude), -1.4844, 1.4844)
+    x = (np.asarray(longitude) + 180) / 360 * scale
+    y = (1 - np.arcsinh(np.tan(latitude)) / math.pi) / 2 * scale
+    return x, y
+
+
+def tiles_around(latitude, longitude, radius_km, zooms=ZOOM_LEVELS, max_tiles=MAX_TILES_PER_ZOOM):
+    """Tuiles (z, x, y) couvrant le disque, par zoom croissant puis du centre vers le bord"""
+    radius_km = max(radius_km, MIN_RADIUS_KM)
+    delta_latitude = radius_km / EARTH_KM_PER_DEGREE
+    delta_longitude = radius_km / (EARTH_KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    tiles = []
+    for zoom in zooms:
+        scale = 2 ** zoom
+        center_x, center_y = tile_coordinates(latitude, longitude, zoom)
+        west, north = tile_coordinates(min(latitude + delta_latitude, 85.0), longitude - delta_longitude, zoom)
+        east, south = tile_coordinates(max(latitude - delta_latitude, -85.0), longitude + delta_longitude, zoom)
+        xs = np.arange(math.floor(west), math.floor(east) + 1)
+        ys = np.arange(max(math.floor(north), 0), min(math.floor(south), scale - 1) + 1)
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        grid_x, grid_y = grid_x.ravel(), grid_y.ravel()
+        distance = np.hypot(grid_x + 0.5 - center_x, grid_y + 0.5 - center_y)
+        nearest = np.argsort(distance, kind='stable')[:max_tiles]
+        tiles.extend((zoom, int(x) % scale, int(y)) for x, y in zip(grid_x[nearest], grid_y[nearest]))
+    return tiles
+
+
+class TilePrefetcher:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=TILE_PATH, workers=WORKERS,
+                 zooms=ZOOM_LEVELS, max_tiles=MAX_TILES_PER_ZOOM, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.zooms = tuple(zooms)
+        self.max_tiles = max_tiles
+        self.timeout = timeout
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.current = None
+        self.warm = OrderedDict()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requested = 0
+        self.already_warm = 0
+        self.fetched = 0
+        self.failed = 0
+        self.threads = [threading.Thread(target=self._work, name=f'tile-prefetch-{index}', daemon=True)
+                        for index in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def prefetch(self, latitude, longitude, radius_km):
+        """Planifie le préchargement autour de la position ; abandonne le précédent"""
+        tiles = tiles_around(latitude, longitude, radius_km, self.zooms, self.max_tiles)
+        with self.lock:
+            self.generation += 1
+            previous = self.current
+            batch = {'generation': self.generation, 'remaining': len(tiles), 'warm': 0,
+                     'fetched': 0, 'failed': 0, 'dropped': 0, 'started': time.perf_counter(),
+                     'latencies': [], 'finished': False, 'done': threading.Event()}
+            self.current = batch
+            superseded = previous is not None and self._finish(previous)
+        if superseded:
+            self._report(previous)
+        # Tiles of the previous fix still waiting are dropped
+        try:
+            while True:
+                self.pending.get_nowait()
+        except queue.Empty:
+            pass
+        for tile in tiles:
+            self.pending.put((batch, tile))
+        if not tiles:
+            with self.lock:
+                self._finish(batch)
+        return len(tiles)
+
+    def stop(self):
+        with self.lock:
+            self.generation += 1
+            batch = self.current
+            stopped = batch is not None and self._finish(batch)
+        if stopped:
+            self._report(batch)
+        for _ in self.threads:
+            self.pending.put(None)
+
+    def _finish(self, batch):
+        """Clôt le lot (appelé sous le verrou) ; False s'il l'était déjà"""
+        if batch['finished']:
+            return False
+        batch['finished'] = True
+        # Tiles not fetched yet are given up: the report is partial
+        batch['dropped'] = batch['remaining']
+        batch['done'].set()
+        return True
+
+    def _work(self):
+        try:
+            # Linux schedules threads separately: only the prefetch threads are niced
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WORKER_NICENESS)
+        except (OSError, AttributeError):
+            pass
+        connection = None
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            batch, tile = item
+            if batch['generation'] != self.generation:
+                # Superseded while waiting: settled without a request
+                self._record(batch, tile, None, None)
+                continue
+            with self.lock:
+                self.requested += 1
+                warm = tile in self.warm
+                if warm:
+                    self.warm.move_to_end(tile)
+                    self.already_warm += 1
+            latency = None
+            if not warm:
+                connection, latency = self._fetch(connection, tile)
+            self._record(batch, tile, warm, latency)
+        if connection is not None:
+            connection.close()
+
+    def _fetch(self, connection, tile):
+        """(connexion à réutiliser, latence en ms ou None en cas d'échec)"""
+        zoom, x, y = tile
+        url = self.path.format(z=zoom, x=x, y=y)
+        for attempt in range(2):
+            if connection is None:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            start = time.perf_counter()
+            try:
+                connection.request('GET', url, headers={'Connection': 'keep-alive'})
+                response = connection.getresponse()
+                response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                connection = None
+                # The server may have closed an idle keep-alive connection
+                continue
+            latency = (time.perf_counter() - start) * 1000
+            if response.will_close:
+                connection.close()
+                connection = None
+            return connection, latency if response.status == 200 else None
+        return connection, None
+
+    def _record(self, batch, tile, warm, latency):
+        """Résultat d'une tuile ; warm None pour une tuile abandonnée sans requête"""
+        with self.lock:
+            if warm is None:
+                pass
+            elif warm:
+                self._count(batch, 'warm')
+            elif latency is None:
+                self._count(batch, 'failed')
+                self.failed += 1
+            else:
+                if self._count(batch, 'fetched'):
+                    batch['latencies'].append(latency)
+                self.fetched += 1
+                self.latencies.append(latency)
+                self.warm[tile] = True
+                while len(self.warm) > WARM_TILES:
+                    self.warm.popitem(last=False)
+            # A batch already finished (superseded) was reported; only the cache counts
+            finished = False
+            if not batch['finished']:
+                batch['remaining'] -= 1
+                finished = batch['remaining'] == 0 and self._finish(batch)
+        if finished:
+            self._report(batch)
+
+    @staticmethod
+    def _count(batch, field):
+        if batch['finished']:
+            return False
+        batch[field] += 1
+        return True
+
+    def _report(self, batch):
+        latencies = batch['latencies']
+        p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (float('nan'),) * 2
+        metrics = self.metrics()
+        if batch['dropped']:
+            logger.info("préchargement interrompu : %d tuiles chargées, %d déjà prêtes, %d en échec, "
+                        "%d abandonnées en %.1f s (p50 %.0f ms, p95 %.0f ms) ; %.0f %% des tuiles "
+                        "déjà préchargées depuis le démarrage",
+                        batch['fetched'], batch['warm'], batch['failed'], batch['dropped'],
+                        time.perf_counter() - batch['started'], p50, p95, 100 * metrics['warm_rate'])
+            return
+        logger.info("préchargement : %d tuiles chargées, %d déjà prêtes, %d en échec en %.1f s "
+                    "(p50 %.0f ms, p95 %.0f ms) ; %.0f %% des tuiles déjà préchargées depuis le démarrage",
+                    batch['fetched'], batch['warm'], batch['failed'],
+                    time.perf_counter() - batch['started'], p50, p95, 100 * metrics['warm_rate'])
+
+    def metrics(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            requested = self.requested
+            # Share of tiles skipped because this prefetcher already loaded
+            # them: requests saved, not hits of the map's own cache
+            metrics = {'requested': requested, 'already_warm': self.already_warm, 'fetched': self.fetched,
+                       'failed': self.failed,
+                       'warm_rate': self.already_warm / requested if requested else 0.0}
+        p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (float('nan'),) * 2
+        metrics['latency_p50'] = float(p50)
+        metrics['latency_p95'] = float(p95)
+        return metrics
+
+    def wait(self, timeout=None):
+        """Attend la fin du préchargement en cours (pour les mesures)"""
+        with self.lock:
+            batch = self.current
+        return batch is None or batch['done'].wait(timeout)
+
+
+def default_prefetcher():
+    """Préchargeur partagé, démarré au premier appel"""
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = TilePrefetcher()
+    return _prefetcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Préchargement des tuiles autour d'une position")
+    parser.add_argument('latitude', type=float)
+    parser.add_argument('longitude', type=float)
+    parser.add_argument('--radius', type=float, default=5.0, help="rayon d'incertitude (km)")
+    parser.add_argument('--zooms', type=int, nargs='+', default=list(ZOOM_LEVELS))
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--path', default=TILE_PATH, help="modèle d'URL des tuiles")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    # Two passes over the same tiles: the first one finds the server cold,
+    # the second one measures what a warmed tile costs the map
+    for label in ("1er passage (à froid)", "2e passage (préchargé)"):
+        prefetcher = TilePrefetcher(args.host, args.port, args.path, zooms=args.zooms)
+        count = prefetcher.prefetch(args.latitude, args.longitude, args.radius)
+        prefetcher.wait()
+        prefetcher.stop()
+        metrics = prefetcher.metrics()
+        print(f"{label} : {count} tuiles, {metrics['failed']} en échec, "
+              f"p50 {metrics['latency_p50']:.1f} ms, p95 {metrics['latency_p95']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
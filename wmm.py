@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Déclinaison magnétique d'après le World Magnetic Model (WMM).
+
+Le champ est évalué par le développement en harmoniques sphériques du WMM
+(degré 12, coefficients de Gauss et variation séculaire), après conversion
+des coordonnées géodésiques WGS84 en coordonnées géocentriques. Les
+coefficients sont lus dans le fichier officiel WMM.COF publié par la NOAA
+(NCEI), fourni à côté de ce module (WMM2025, domaine public) ; un fichier
+plus récent déposé dans le répertoire de données le remplace.
+
+Le développement complet coûte trop cher pour être répété à chaque calcul :
+la déclinaison est précalculée sur une grille mondiale de 1°, mise en cache
+en .npy (projetée en mémoire) pour chaque dixième d'année, et lue par
+interpolation bilinéaire.
+
+Exemple :
+    python3 wmm.py                  # précalcule la grille de l'année
+    python3 wmm.py 45.76 4.84       # déclinaison en un point
+"""
+
+import os
+import sys
+import math
+import argparse
+from datetime import date
+import numpy as np
+from storage import DATA_DIR, atomic_path
+
+COEFFICIENTS_NAME = 'WMM.COF'
+
+# WGS84 ellipsoid and geomagnetic reference radius (km)
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+REFERENCE_RADIUS = 6371.2
+
+# Grid step (degrees) and time resolution (years) of the cached grids
+GRID_STEP = 1.0
+GRID_YEAR_STEP = 0.1
+GRID_VERSION = 1
+
+
+class MagneticModelError(RuntimeError):
+    """Coefficients du modèle absents ou illisibles"""
+
+
+def coefficients_path():
+    """Premier WMM.COF trouvé : KT2MAPS_WMM_COF, répertoire de données, puis à côté du module"""
+    candidates = [
+        os.environ.get('KT2MAPS_WMM_COF'),
+        os.path.join(DATA_DIR, COEFFICIENTS_NAME),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), COEFFICIENTS_NAME),
+    ]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def decimal_year(moment):
+    """Année décimale d'une date, d'un datetime ou d'un datetime64"""
+    if isinstance(moment, np.datetime64):
+        moment = moment.astype('datetime64[D]').astype(object)
+    start = date(moment.year, 1, 1).toordinal()
+    length = date(moment.year + 1, 1, 1).toordinal() - start
+    return moment.year + (moment.toordinal() - start) / length
+
+
+class MagneticModel:
+    def __init__(self, path=None):
+        path = path or coefficients_path()
+        if path is None:
+            raise MagneticModelError(f"Fichier {COEFFICIENTS_NAME} introuvable")
+        self.path = path
+        self._load(path)
+
+    def _load(self, path):
+        # WMM.COF: header "epoch name date", then "n m g h gdot hdot" rows,
+        # terminated by a line of 9s
+        rows = []
+        try:
+            with open(path, encoding='ascii') as handle:
+                header = handle.readline().split()
+                self.epoch = float(header[0])
+                self.name = header[1]
+                for line in handle:
+                    fields = line.split()
+                    if not fields or fields[0].startswith('9999'):
+                        break
+                    rows.append([float(value) for value in fields[:6]])
+        except (OSError, ValueError, IndexError) as error:
+            raise MagneticModelError(f"Coefficients illisibles : {error}") from error
+        if not rows:
+            raise MagneticModelError("Aucun coefficient dans le fichier du modèle")
+
+        rows = np.array(rows)
+        self.degree = int(rows[:, 0].max())
+        size = self.degree + 1
+        self.g, self.h, self.g_dot, self.h_dot = (np.zeros((size, size)) for _ in range(4))
+        n, m = rows[:, 0].astype(np.intp), rows[:, 1].astype(np.intp)
+        self.g[n, m], self.h[n, m], self.g_dot[n, m], self.h_dot[n, m] = rows[:, 2:6].T
+
+        # Schmidt semi-normalisation factors, applied once to the coefficients
+        # so that the Gauss-normalised Legendre recursion can be used below
+        schmidt = np.zeros((size, size))
+        schmidt[0, 0] = 1.0
+        for degree in range(1, size):
+            schmidt[degree, 0] = schmidt[degree - 1, 0] * (2 * degree - 1) / degree
+            for order in range(1, degree + 1):
+                factor = 2 if order == 1 else 1
+                schmidt[degree, order] = schmidt[degree, order - 1] * math.sqrt(
+                    (degree - order + 1) * factor / (degree + order))
+        self.schmidt = schmidt
+
+        # Recursion constants of the Gauss-normalised associated Legendre functions
+        self.recursion = np.zeros((size, size))
+        for degree in range(2, size):
+            for order in range(degree):
+                self.recursion[degree, order] = ((degree - 1) ** 2 - order ** 2) / (
+                    (2 * degree - 1) * (2 * degree - 3))
+
+    def field(self, latitude, longitude, year, altitude_km=0.0):
+        """Composantes nord, est et verticale (nT, repère géodésique) du champ principal"""
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        latitude, longitude = np.broadcast_arrays(latitude, longitude)
+        dt = year - self.epoch
+        g = (self.g + dt * self.g_dot) * self.schmidt
+        h = (self.h + dt * self.h_dot) * self.schmidt
+
+        # Geodetic to geocentric spherical coordinates
+        phi = np.radians(latitude)
+        sin_phi = np.sin(phi)
+        curvature = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_phi ** 2)
+        p = (curvature + altitude_km) * np.cos(phi)
+        z = (curvature * (1 - WGS84_E2) + altitude_km) * sin_phi
+        radius = np.hypot(p, z)
+        geocentric = np.arcsin(z / radius)
+
+        # Colatitude, kept off the poles where the east component is singular
+        cos_theta = np.sin(geocentric)
+        sin_theta = np.maximum(np.cos(geocentric), 1e-10)
+        lam = np.radians(longitude)
+        orders = np.arange(self.degree + 1)
+        cos_m = np.cos(orders[:, None] * lam.ravel()[None, :]).reshape((-1,) + lam.shape)
+        sin_m = np.sin(orders[:, None] * lam.ravel()[None, :]).reshape((-1,) + lam.shape)
+
+        size = self.degree + 1
+        legendre = [[None] * size for _ in range(size)]
+        derivative = [[None] * size for _ in range(size)]
+        legendre[0][0] = np.ones_like(cos_theta)
+        derivative[0][0] = np.zeros_like(cos_theta)
+        north = np.zeros_like(cos_theta)
+        east = np.zeros_like(cos_theta)
+        down = np.zeros_like(cos_theta)
+        ratio = REFERENCE_RADIUS / radius
+        for n in range(1, size):
+            scale = ratio ** (n + 2)
+            for m in range(n + 1):
+                if n == m:
+                    legendre[n][m] = sin_theta * legendre[n - 1][m - 1]
+                    derivative[n][m] = sin_theta * derivative[n - 1][m - 1] + cos_theta * legendre[n - 1][m - 1]
+                else:
+                    legendre[n][m] = cos_theta * legendre[n - 1][m]
+                    derivative[n][m] = cos_theta * derivative[n - 1][m] - sin_theta * legendre[n - 1][m]
+                    if n > 1 and m <= n - 2:
+                        legendre[n][m] = legendre[n][m] - self.recursion[n, m] * legendre[n - 2][m]
+                        derivative[n][m] = derivative[n][m] - self.recursion[n, m] * derivative[n - 2][m]
+                harmonic = g[n, m] * cos_m[m] + h[n, m] * sin_m[m]
+                down -= (n + 1) * scale * harmonic * legendre[n][m]
+                north += scale * harmonic * derivative[n][m]
+                east += scale * m * (g[n, m] * sin_m[m] - h[n, m] * cos_m[m]) * legendre[n][m]
+        east = east / sin_theta
+
+        # Rotate from geocentric to geodetic axes
+        psi = geocentric - phi
+        return (north * np.cos(psi) - down * np.sin(psi),
+                east,
+                north * np.sin(psi) + down * np.cos(psi))
+
+    def declination(self, latitude, longitude, year, altitude_km=0.0):
+        """Déclinaison (degrés, positive vers l'est) par le développement complet"""
+        north, east, _ = self.field(latitude, longitude, year, altitude_km)
+        return np.degrees(np.arctan2(east, north))
+
+
+def grid_path(model, year, step=GRID_STEP):
+    return os.path.join(DATA_DIR, f"declination_{model.name}_{year:.1f}_{step:g}deg_v{GRID_VERSION}.npy")
+
+
+def build_grid(model, year, step=GRID_STEP, path=None):
+    """Précalcule la grille de déclinaison (float32, latitude × longitude) et l'écrit"""
+    path = path or grid_path(model, year, step)
+    latitudes = np.linspace(-90, 90, int(round(180 / step)) + 1)
+    longitudes = np.linspace(-180, 180, int(round(360 / step)) + 1)
+    grid = model.declination(latitudes[:, None], longitudes[None, :], year).astype(np.float32)
+
+    with atomic_path(path) as temporary:
+        with open(temporary, 'wb') as handle:
+            np.save(handle, grid)
+    return path
+
+
+def interpolate(grid, latitude, longitude, step=GRID_STEP):
+    """Interpolation bilinéaire dans une grille de déclinaison, en tenant compte du saut ±180°"""
+    row = (np.clip(np.asarray(latitude, dtype=np.float64), -90, 90) + 90) / step
+    column = ((np.asarray(longitude, dtype=np.float64) + 180) % 360) / step
+    row0 = np.minimum(np.floor(row).astype(np.intp), grid.shape[0] - 2)
+    column0 = np.minimum(np.floor(column).astype(np.intp), grid.shape[1] - 2)
+    u = row - row0
+    v = column - column0
+    corner = grid[row0, column0].astype(np.float64)
+
+    def relative(values):
+        # Near the magnetic poles neighbouring cells can straddle ±180°
+        return (values.astype(np.float64) - corner + 180) % 360 - 180
+
+    value = (corner
+             + (1 - u) * v * relative(grid[row0, column0 + 1])
+             + u * (1 - v) * relative(grid[row0 + 1, column0])
+             + u * v * relative(grid[row0 + 1, column0 + 1]))
+    return (value + 180) % 360 - 180
+
+
+_model = None
+_grids = {}
+
+
+def default_model():
+    """Modèle partagé, chargé au premier appel ; None si WMM.COF est absent"""
+    global _model
+    if _model is None:
+        try:
+            _model = MagneticModel()
+        except MagneticModelError:
+            return None
+    return _model
+
+
+def load_grid(model, year):
+    """Grille projetée en mémoire pour le dixième d'année voisin, construite si nécessaire"""
+    year = round(year / GRID_YEAR_STEP) * GRID_YEAR_STEP
+    if year not in _grids:
+        path = grid_path(model, year)
+        if not os.path.exists(path):
+            build_grid(model, year, path=path)
+        _grids[year] = np.load(path, mmap_mode='r')
+    return _grids[year]
+
+
+def declination(latitude, longitude, when=None):
+    """Déclinaison magnétique (degrés) par la grille précalculée ; None sans modèle"""
+    model = default_model()
+    if model is None:
+        return None
+    year = decimal_year(date.today() if when is None else when)
+    return interpolate(load_grid(model, year), latitude, longitude)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Déclinaison magnétique (World Magnetic Model)")
+    parser.add_argument('latitude', type=float, nargs='?')
+    parser.add_argument('longitude', type=float, nargs='?')
+    parser.add_argument('--year', type=float, help="année décimale (défaut : aujourd'hui)")
+    parser.add_argument('--coefficients', help="fichier WMM.COF")
+    args = parser.parse_args()
+
+    model = MagneticModel(args.coefficients)
+    year = args.year or decimal_year(date.today())
+    if args.latitude is None or args.longitude is None:
+        print(build_grid(model, round(year / GRID_YEAR_STEP) * GRID_YEAR_STEP), file=sys.stderr)
+    else:
+        exact = float(model.declination(args.latitude, args.longitude, year))
+        grid = float(interpolate(load_grid(model, year), args.latitude, args.longitude))
+        print(f"{model.name} {year:.2f} : {exact:+.2f}° (grille : {grid:+.2f}°)")
@@ -0,0 +1,136 @@
+"""Calculs longs hors du thread de l'interface.
+
+Les calculs lourds (incertitude Monte Carlo, recherche globale, ajustement
+de plusieurs mesures) tournent dans un QThreadPool ; la recherche globale
+répartit en plus son travail sur le pool de processus de solar_calculator.
+La fonction exécutée reçoit un argument progress(fraction) : chaque appel
+publie l'avancement et lève CalculationCancelled si le calcul a été annulé,
+ce qui l'interrompt à l'étape suivante.
+
+Un seul calcul compte à la fois : en lancer un nouveau, ou annuler, rend le
+précédent obsolète et ses résultats sont ignorés.
+"""
+
+import logging
+import itertools
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from solar_calculator import CalculationCancelled
+
+logger = logging.getLogger('kt2maps.workers')
+
+
+def scaled_progress(progress, start, end):
+    """Avancement d'une étape ramené à l'intervalle [start, end] du calcul complet"""
+    return lambda fraction: progress(start + (end - start) * fraction)
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int, float)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class CalculationJob(QRunnable):
+    def __init__(self, job_id, function, args, kwargs):
+        super().__init__()
+        self.job_id = job_id
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+        self.signals = WorkerSignals()
+        # The runner keeps the Python reference; Qt must not delete it under us
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report(self, fraction):
+        if self.cancel_event.is_set():
+            raise CalculationCancelled()
+        self.signals.progress.emit(self.job_id, fraction)
+
+    def run(self):
+        try:
+            self.report(0.0)
+            result = self.function(*self.args, progress=self.report, **self.kwargs)
+        except CalculationCancelled:
+            logger.info("calcul %d annulé", self.job_id)
+            return
+        except Exception as error:
+            logger.exception("calcul %d en échec", self.job_id)
+            self.signals.failed.emit(self.job_id, str(error))
+            return
+        self.signals.finished.emit(self.job_id, result)
+
+
+class CalculationRunner(QObject):
+    """Exécute un calcul à la fois en arrière-plan et relaie ses signaux s'il est toujours d'actualité"""
+
+    progress = pyqtSignal(float)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # One thread: a superseded job stops at its next progress call, and
+        # the next one starts right after instead of competing for the CPU
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.job_ids = itertools.count(1)
+        self.current = None
+
+    @property
+    def running(self):
+        return self.current is not None
+
+    def submit(self, function, *args, **kwargs):
+        """Lance function(*args, progress=..., **kwargs) et abandonne le calcul en cours"""
+        self._drop_current()
+        job = CalculationJob(next(self.job_ids), function, args, kwargs)
+        job.signals.progress.connect(self._on_progress)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        self.current = job
+        self.pool.start(job)
+        return job.job_id
+
+    def _drop_current(self):
+        if self.current is None:
+            return False
+        self.current.cancel()
+        self.current = None
+        # Jobs still waiting for the thread are dropped without running
+        self.pool.clear()
+        return True
+
+    @pyqtSlot()
+    def cancel(self):
+        if self._drop_current():
+            self.cancelled.emit()
+
+    def wait(self, timeout=2000):
+        self._drop_current()
+        return self.pool.waitForDone(timeout)
+
+    def _is_current(self, job_id):
+        return self.current is not None and self.current.job_id == job_id
+
+    @pyqtSlot(int, float)
+    def _on_progress(self, job_id, fraction):
+        if self._is_current(job_id):
+            self.progress.emit(fraction)
+
+    @pyqtSlot(int, object)
+    def _on_finished(self, job_id, result):
+        if self._is_current(job_id):
+            self.current = None
+            self.finished.emit(result)
+
+    @pyqtSlot(int, str)
+    def _on_failed(self, job_id, message):
+        if self._is_current(job_id):
+            self.current = None
+            self.failed.emit(message)